@@ -0,0 +1,245 @@
+# 解析速度のベンチマーク
+# hand_generator.py で決定的なデータを作り、段階ごとに別プロセスで計測する
+# (ピークRSSを段階ごとに分けるため)。
+#   python benchmark.py --sizes 1k,100k,10M --workers 8 --json bench.json
+#   python benchmark.py --sizes 100k --baseline bench.json # 遅くなっていたら終了コード 1
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import hand_generator
+
+BENCH_STAGES = ("parse", "aggregate", "render", "export")
+DEFAULT_SIZES = "1k,100k" # 数分で終わる大きさ。10M は --sizes で明示する (生成に数時間と数GB)
+RENDER_WINDOW_GEOMETRY = "1280x960" # render 段階のウィンドウの大きさ (全画面に近い大きさで描画を計測する)
+DEFAULT_MAX_REGRESSION = 0.2 # --baseline と比べてこの割合以上 hands/s が落ちたら失敗
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def format_size(hands):
+    if hands >= 1000000 and hands % 1000000 == 0:
+        return f"{hands // 1000000}M"
+    if hands >= 1000 and hands % 1000 == 0:
+        return f"{hands // 1000}k"
+    return str(hands)
+
+
+def peak_rss_mb():
+    """(this process, largest child process) peak RSS in MiB, or (None, None) where unsupported."""
+    try:
+        import resource
+    except ImportError: # Windows
+        return None, None
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024 # ru_maxrss: macOS はバイト、Linux は KiB
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor)
+
+
+def ensure_dataset(data_root, hands, args):
+    # 同じ条件のデータは使い回す (生成済みの印に .complete を置く)
+    name = (f"{format_size(hands)}_{args.format}_{args.table_size}max_{args.hands_per_file}perfile"
+            f"_{args.hero}_seed{args.seed}")
+    data_dir = os.path.join(data_root, name)
+    stamp = os.path.join(data_dir, ".complete")
+    if os.path.exists(stamp):
+        return data_dir, 0.0
+    start = time.perf_counter()
+    hand_generator.write_hand_histories(data_dir, hands, args.hands_per_file, args.format, args.table_size,
+                                        args.hero, args.seed)
+    with open(stamp, "w") as f:
+        f.write("ok\n")
+    return data_dir, time.perf_counter() - start
+
+
+# --- 各段階 (子プロセスで実行される) ---
+
+def _stage_parse(data_dir, hero_name, workers):
+    # 分割 + 字句解析だけ (集計なし、1プロセス)
+    from range_analyzer import list_hand_history_files, parse_hand_history_file
+    filepaths = list_hand_history_files(data_dir)
+    hands = 0
+    for filepath in filepaths:
+        for _ in parse_hand_history_file(filepath, hero_name):
+            hands += 1
+    return {"hands": hands, "files": len(filepaths)}
+
+
+def _stage_aggregate(data_dir, hero_name, workers):
+    # GUI の analyze_data と同じ経路 (キャッシュなし)
+    from range_analyzer import list_hand_history_files, process_directory
+    data, hands = process_directory(data_dir, hero_name, workers)
+    return {"hands": hands, "files": len(list_hand_history_files(data_dir)), "total_spots": data.total_hands()}
+
+
+def _stage_render(data_dir, hero_name, workers):
+    # 3bet/ALL の全タブを create_matrix_tab で描画する (ディスプレイが必要)
+    try:
+        import tkinter as tk
+    except ImportError as e:
+        return {"skipped": f"tkinter unavailable ({e})"}
+    from range_analyzer import process_directory
+    import gui_analyzer
+
+    data, hands = process_directory(data_dir, hero_name, workers)
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return {"skipped": f"no display ({e})"}
+    # Canvas に実際の大きさが付くように、ウィンドウを表示してから計測する
+    root.geometry(RENDER_WINDOW_GEOMETRY)
+    gui = gui_analyzer.PokerRangeGUI(root)
+    root.update()
+    gui.data = data
+    gui.action_type_var.set("3bet")
+    gui.position_var.set("ALL")
+    start = time.perf_counter()
+    gui.display_results_in_gui()
+    tabs = [tab for tab in gui.notebook.tabs() if tab != str(gui.initial_tab)]
+    canvases_drawn = 0
+    for tab in tabs:
+        gui.notebook.select(tab)
+        gui._ensure_tab_built(tab)
+        root.update() # 配置が決まり <Configure> で再描画が予約される
+        canvases_drawn += gui.flush_matrix_redraws() # 予約された描画をこの計測の中で実行する
+        root.update_idletasks()
+    elapsed = time.perf_counter() - start
+    root.destroy()
+    return {"tabs": len(tabs), "canvases_drawn": canvases_drawn, "hands": hands, "render_seconds": elapsed}
+
+
+def _stage_export(data_dir, hero_name, workers):
+    # 全マトリクスを Tk なしで SVG/PNG/HTML に書き出す (PNG は Pillow があるときだけ)
+    from range_analyzer import export_matrices, process_directory
+    try:
+        import PIL # noqa: F401
+        formats = ("svg", "png", "html")
+    except ImportError:
+        formats = ("svg", "html")
+    data, hands = process_directory(data_dir, hero_name, workers)
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        matrices = export_matrices(data, output_dir, formats, workers)
+        elapsed = time.perf_counter() - start
+    return {"tabs": matrices, "hands": hands, "render_seconds": elapsed}
+
+
+STAGE_FUNCTIONS = {"parse": _stage_parse, "aggregate": _stage_aggregate, "render": _stage_render,
+                   "export": _stage_export}
+
+
+def run_stage_in_child(stage, data_dir, hero_name, workers):
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-stage", stage, "--data-dir", data_dir,
+         "--hero", hero_name, "--workers", str(workers)],
+        capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result["wall_seconds"] = wall
+    return result
+
+
+def _run_stage_here(args):
+    start = time.perf_counter()
+    result = STAGE_FUNCTIONS[args.run_stage](args.data_dir, args.hero, args.workers)
+    result["seconds"] = time.perf_counter() - start
+    if result.get("render_seconds") is not None:
+        result["seconds"] = result.pop("render_seconds")
+    result["peak_rss_mb"], result["peak_child_rss_mb"] = peak_rss_mb()
+    if result.get("hands") and result["seconds"] > 0 and "tabs" not in result:
+        result["hands_per_sec"] = result["hands"] / result["seconds"]
+        result["files_per_sec"] = result["files"] / result["seconds"]
+    print(json.dumps(result))
+    return 0
+
+
+# --- 表示と比較 ---
+
+def _format_result(size_label, stage, result):
+    if "error" in result or "skipped" in result:
+        return f"{size_label:>6} {stage:<10} {result.get('error') or result.get('skipped')}"
+    rss = result.get("peak_rss_mb")
+    child_rss = result.get("peak_child_rss_mb")
+    rss_text = "n/a" if rss is None else f"{rss:.0f} MiB" + (f" (workers {child_rss:.0f} MiB)" if child_rss else "")
+    if stage in ("render", "export"):
+        per_tab = result["seconds"] / result["tabs"] * 1000 if result.get("tabs") else 0
+        rate = f"{result.get('tabs', 0)} {'tabs' if stage == 'render' else 'matrices'}, {per_tab:.1f} ms each"
+    else:
+        rate = f"{result.get('hands_per_sec', 0):,.0f} hands/s, {result.get('files_per_sec', 0):,.1f} files/s"
+    return f"{size_label:>6} {stage:<10} {result['seconds']:9.2f} s  {rate:<40} peak RSS {rss_text}"
+
+
+def compare_with_baseline(results, baseline, max_regression):
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key, {}).get("hands_per_sec")
+        after = result.get("hands_per_sec")
+        if before and after and after < before * (1 - max_regression):
+            regressions.append(f"{key}: {after:,.0f} hands/s vs baseline {before:,.0f} ({after / before - 1:+.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark hand-history parsing, aggregation and rendering.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma-separated hand counts (default: {DEFAULT_SIZES})")
+    parser.add_argument("--stages", default=",".join(BENCH_STAGES), help="comma-separated subset of "
+                        + ", ".join(BENCH_STAGES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--data-root", default=os.path.join(tempfile.gettempdir(), "poker_range_bench"),
+                        help="where generated hand histories are kept between runs")
+    parser.add_argument("--format", choices=hand_generator.HAND_FORMATS, default="pokerstars")
+    parser.add_argument("--table-size", type=int, default=6)
+    parser.add_argument("--hands-per-file", type=int, default=2000)
+    parser.add_argument("--hero", default="Hero")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON from an earlier run; exit 1 if hands/s regressed")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION)
+    parser.add_argument("--run-stage", choices=BENCH_STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_stage:
+        return _run_stage_here(args)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    for stage in stages:
+        if stage not in BENCH_STAGES:
+            parser.error(f"unknown stage {stage!r}")
+    results = {}
+    for hands in (parse_size(size) for size in args.sizes.split(",")):
+        size_label = format_size(hands)
+        data_dir, generate_seconds = ensure_dataset(args.data_root, hands, args)
+        if generate_seconds:
+            print(f"{size_label:>6} generate   {generate_seconds:9.2f} s  ({data_dir})")
+        for stage in stages:
+            result = run_stage_in_child(stage, data_dir, args.hero, args.workers)
+            results[f"{size_label}/{stage}"] = result
+            print(_format_result(size_label, stage, result), flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"workers": args.workers, "format": args.format, "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_with_baseline(results, baseline, args.max_regression)
+        for line in regressions:
+            print("REGRESSION " + line)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,161 +1,103 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+import cProfile
 import os
-import glob
-from collections import Counter, defaultdict
-
-# utils_judge.py と range_analyzer.py (の解析部分) から必要な関数をインポート
-# これらは同じディレクトリにあるか、Pythonのパスが通っている必要がある
-from utils_judge import (
-    determine_position,
-    extract_hero_cards,
-    check_bb_defense,
-    extract_preflop_actions,
-    get_first_raise_info,
-    normalize_hole_cards,
-    had_opportunity_to_open
+import sqlite3
+from collections import OrderedDict
+import queue
+import threading
+import time
+
+import numpy as np
+
+# 解析ロジックは tkinter に依存しない range_analyzer.py にある
+from range_analyzer import (
+    MATRIX_BG_COLOR,
+    NUM_HAND_CLASSES,
+    PROFILE_DIR,
+    RANKS,
+    SECONDS_PER_DAY,
+    SNAPSHOT_FILE_EXTENSION,
+    HAND_CLASS_NAMES,
+    TIME_BUCKETS,
+    AnalysisCache,
+    HandHistoryTailer,
+    HandIdIndex,
+    HandLocationIndex,
+    HandStore,
+    RangeTimeline,
+    ReferenceChart,
+    RangeMatrix,
+    RangeSnapshot,
+    StageProfile,
+    add_parsed_hand_to_aggregates,
+    compute_matrix_cells,
+    detect_hero_from_files,
+    iter_file_aggregates,
+    iter_matrix_views,
+    load_preflop_equity_table,
+    score_deviations,
+    list_hand_history_files,
+    matrix_cell_bars,
+    merge_snapshots,
+    parse_hand_texts,
+    read_located_hand_texts,
 )
-# range_analyzer.py から解析ロジックを移植またはインポートする必要がある
-# ここでは、主要な解析関数を直接 gui_analyzer.py に含めるか、
-# range_analyzer.py をリファクタリングしてインポート可能にすることを想定
-
-# --- range_analyzer.py から持ってくる解析関連の関数 ---
-# (実際には range_analyzer.py をリファクタリングしてインポートするのが望ましい)
-
-def detect_hero_from_files_for_gui(history_dir):
-    # (range_analyzer.py の detect_hero_from_files と同様のロジック)
-    # GUI用に少し調整（printを避けるなど）
-    import re
-    player_counts = Counter()
-    dealt_to_regex = re.compile(r"Dealt to (.+?) \[(?:..).?\]")
-    found_files = False
-    for filepath in glob.glob(os.path.join(history_dir, "*.txt")):
-        found_files = True
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            for line in content.splitlines():
-                match = dealt_to_regex.search(line)
-                if match:
-                    player_name = match.group(1).strip()
-                    if player_name.endswith(" (observer)"):
-                        player_name = player_name[:-11].strip()
-                    if player_name:
-                        player_counts[player_name] += 1
-        except Exception:
-            pass # GUIではエラーはmessageboxなどで表示する方が良い
-    
-    if not found_files: return None # ファイルが見つからなかった場合
-    if not player_counts: return None
-
-    sorted_players = player_counts.most_common()
-    if not sorted_players: return None
-    
-    most_common_name, _ = sorted_players[0]
-    if most_common_name.upper() == "HERO": # "HERO" (大文字・小文字問わず) が最も一般的であれば、それを優先
-        for name, _ in sorted_players:
-            if name.upper() == "HERO":
-                return name
-    return most_common_name
-
-
-def parse_hand_history_file_for_gui(filepath, hero_name):
-    # (range_analyzer.py の parse_hand_history_file と同様のロジック)
-    # GUI用に調整
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except Exception:
-        return #ジェネレータなのでエラー時はここで終了
-
-    primary_delimiter = None
-    if "PokerStars Zoom Hand #" in content:
-        primary_delimiter = "PokerStars Zoom Hand #"
-    elif "PokerStars Hand #" in content:
-        primary_delimiter = "PokerStars Hand #"
-    elif "Poker Hand #" in content:
-        primary_delimiter = "Poker Hand #"
-
-    hand_texts_to_process = []
-    if primary_delimiter:
-        segments = content.split(primary_delimiter)
-        for i in range(1, len(segments)):
-            segment_content = segments[i]
-            if segment_content.strip():
-                hand_texts_to_process.append(primary_delimiter + segment_content)
-    elif content.strip():
-        hand_texts_to_process.append(content)
-    
-    if not hand_texts_to_process:
-        return
-
-    for current_hand_text in hand_texts_to_process:
-        hero_cards_raw = extract_hero_cards(current_hand_text.splitlines(), hero_name)
-        if not hero_cards_raw: continue
-        normalized_hand = normalize_hole_cards(hero_cards_raw)
-        if not normalized_hand: continue
-        hero_position = determine_position(hero_name, current_hand_text)
-        if hero_position == "Other": continue
-
-        lines = current_hand_text.splitlines()
-        preflop_lines = []
-        preflop_started = False
-        for line in lines:
-            if "*** HOLE CARDS ***" in line: preflop_started = True; continue
-            if "*** FLOP ***" in line or "*** SUMMARY ***" in line or "*** TURN ***" in line or "*** RIVER ***" in line: break
-            if preflop_started and line.strip(): preflop_lines.append(line)
-        
-        if not preflop_lines: continue
-        preflop_actions = extract_preflop_actions(preflop_lines)
-        if not preflop_actions: continue
-
-        is_hero_opener = False
-        first_raiser, _, is_open_raise = get_first_raise_info(preflop_actions)
-        if first_raiser == hero_name and is_open_raise: is_hero_opener = True
-
-        hero_had_open_opportunity_flag = had_opportunity_to_open(preflop_actions, hero_name)
-        hero_action_in_open_spot = None
-        if hero_had_open_opportunity_flag:
-            for player, action_type_spot in preflop_actions:
-                if player == hero_name: hero_action_in_open_spot = action_type_spot; break
-        
-        # Modified BB defense logic
-        bb_defense_action_type = None
-        vs_position_bb = None
-        if hero_position == "BB":
-            # Check for an open raise by someone other than the hero
-            if first_raiser and is_open_raise and first_raiser != hero_name:
-                # check_bb_defense now returns (action_type, opponent_pos)
-                # action_type can be "call", "raise", "fold", or None
-                bb_defense_action_type, vs_position_bb_temp = check_bb_defense(current_hand_text, hero_name)
-                if vs_position_bb_temp: # Ensure opponent position was determined
-                    vs_position_bb = vs_position_bb_temp
-                # If check_bb_defense returned (None, some_pos) or (None, None), 
-                # bb_defense_action_type will be None. This case should ideally be handled
-                # by earlier returns in check_bb_defense if no open raise or hero not BB.
-                # If it's "fold", that's a valid action type.
-        
-        yield {
-            "hand": normalized_hand, "position": hero_position,
-            "is_hero_opener": is_hero_opener,
-            "had_open_opportunity": hero_had_open_opportunity_flag,
-            "hero_action_in_open_spot": hero_action_in_open_spot,
-            # Replace old flags with new specific action
-            "bb_defense_action": bb_defense_action_type, # "call", "raise", "fold", or None
-            "vs_position_bb": vs_position_bb,
-            # Add preflop_actions for 3bet analysis in analyze_data
-            "preflop_actions": preflop_actions,
-            "hand_history_text": current_hand_text,
-        }
+
 
 # --- GUI アプリケーションクラス ---
+
+ANALYSIS_POLL_INTERVAL_MS = 100 # 解析スレッドの進捗をポーリングする間隔
+PARTIAL_REFRESH_HANDS = 5000 # 解析中はこのハンド数ごとに表示中のマトリクスを更新
+TAIL_POLL_INTERVAL_MS = 2000 # ライブ追跡でディレクトリを確認する間隔
+PROFILE_MODES = ("Off", "Timers", "cProfile")
+PROFILE_RENDER_SETTLE_MS = 500 # 解析完了後、この時間までのタブ描画をプロファイルに含める
+MAX_CACHED_TABS = 300 # フィルタを切り替えても再利用するタブの数 (3bet/ALL の全タブが収まる数)
+RESIZE_REDRAW_DELAY_MS = 50 # ウィンドウのリサイズが落ち着いてからマトリクスを再描画する
+MATRIX_HEADER_SIZE = 24 # マトリクスの行・列見出しの幅/高さ (px)
+MATRIX_MIN_CELL_WIDTH = 40
+MATRIX_MIN_CELL_HEIGHT = 30
+DRILL_DOWN_MAX_HANDS = 1000 # セルをクリックしたときに一覧に読み込むハンド数の上限
+LEAKS_LIST_SIZE = 100 # リーク一覧に出す数
+# 期間フィルタ: (表示名, 最新のハンドから遡る日数)。None は全期間
+DATA_PERIODS = (("All", None), ("Last 7 days", 7), ("Last 30 days", 30), ("Last 90 days", 90),
+                ("Last 365 days", 365))
+ALL_CHOICE = "All"
+PERIOD_CUSTOM = "Custom" # スライダーで期間を動かしたとき
+TIME_BUCKET_CHOICES = tuple(TIME_BUCKETS)
+
 class PokerRangeGUI:
     def __init__(self, master):
         self.master = master
         master.title("Poker Hand Range Analyzer")
         master.geometry("800x600")
 
-        self.data = {} # 解析結果を保持
+        self.data = None # 解析結果を保持 (RangeMatrix)
+        self._analysis = None # 実行中の解析の状態 (バックグラウンドスレッド)
+        self._tab_specs = {} # タブID -> {"make_tab_args": 引数を作る関数, "built_version": 作成時の _data_version}
+        self._tab_cache = OrderedDict() # (アクション, ポジション, タイトル) -> タブ (LRU)
+        self._current_filter_key = None
+        self._data_version = 0 # self.data が変わるたびに増える
+        self._pending_redraws = {} # Canvas ID -> 保留中の再描画 (after ID, 再描画する関数)
+        self._hero_detection = None # 実行中のヒーロー名検出
+        self._tailer = None # ライブ追跡 (HandHistoryTailer)
+        self._tail_after_id = None
+        self._analyzed_source = None # 現在の self.data の (history_dir, hero_name)
+        self._data_info = None # 現在の self.data の出どころ (スナップショット保存用)
+        self._render_profile = None # プロファイル中はタブの作成・描画時間をここに加える
+        self._hand_locations = None # 解析したハンドの位置索引 (セルのドリルダウン用、スナップショットには無い)
+        self._hand_store = None # 解析したスポットの行 (期間・ステークなどのフィルタ用、スナップショットには無い)
+        self._view_cache = None # ((_data_version, フィルタ), 絞り込んだ RangeMatrix, ハンド数)
+        self._latest_hand_time = 0 # 期間フィルタの基準 (解析した最新のハンドの日時)
+        self._bucket_starts = np.zeros(0, dtype=np.int64) # スライダーの各目盛りの開始日時 (HandStore.time_buckets)
+        self._timelines = {} # 人数・ステークのフィルタ -> RangeTimeline
+        self._window = (0, 0) # スライダーで選んだ (最初, 最後) の目盛り
+        self._window_after_id = None
+        self._equity_table = None # PreflopEquityTable (エクイティのタブを最初に開いたときに読む)
+        self._equity_loader = None # 読み込み中の (スレッド, 結果)
+        self._chart = None # ReferenceChart
+        self._deviation_cache = None # ((id(data), _data_version), DeviationReport)
+        self._leaks_view = None # 開いているリーク一覧の Treeview
 
         # --- 入力フレーム ---
         input_frame = ttk.LabelFrame(master, text="Input")
@@ -173,8 +115,40 @@ class PokerRangeGUI:
         self.hero_name_entry.grid(row=1, column=1, padx=5, pady=5, sticky="w")
         # 自動検出ボタンは後で追加も検討
 
-        self.analyze_button = ttk.Button(input_frame, text="Analyze Hands", command=self.analyze_data)
-        self.analyze_button.grid(row=2, column=0, columnspan=3, padx=5, pady=10)
+        # 並列解析のワーカー数 (1 = 従来どおりの逐次解析)
+        ttk.Label(input_frame, text="Workers:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        self.workers_var = tk.IntVar(value=os.cpu_count() or 1)
+        self.workers_spinbox = ttk.Spinbox(input_frame, from_=1, to=max(1, (os.cpu_count() or 1) * 2),
+                                           textvariable=self.workers_var, width=5)
+        self.workers_spinbox.grid(row=2, column=1, padx=5, pady=5, sticky="w")
+        # 変更のないファイルは前回の解析結果を再利用する
+        self.use_cache_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(input_frame, text="Use analysis cache", variable=self.use_cache_var).grid(
+            row=2, column=2, padx=5, pady=5, sticky="w")
+        # 同じハンド ID は1回だけ数える (自動保存とトラッカーの再エクスポートが混在していても)
+        self.skip_duplicates_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(input_frame, text="Skip duplicate hands", variable=self.skip_duplicates_var).grid(
+            row=1, column=2, padx=5, pady=5, sticky="w")
+
+        button_frame = ttk.Frame(input_frame)
+        button_frame.grid(row=3, column=0, columnspan=3, padx=5, pady=10)
+        self.analyze_button = ttk.Button(button_frame, text="Analyze Hands", command=self.analyze_data)
+        self.analyze_button.pack(side="left", padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel_analysis, state="disabled")
+        self.cancel_button.pack(side="left", padx=5)
+        # 解析結果を保存・読み込み (複数選択すると結合して開く)
+        self.save_snapshot_button = ttk.Button(button_frame, text="Save Snapshot", command=self.save_snapshot)
+        self.save_snapshot_button.pack(side="left", padx=5)
+        self.open_snapshot_button = ttk.Button(button_frame, text="Open Snapshots", command=self.open_snapshots)
+        self.open_snapshot_button.pack(side="left", padx=5)
+        # 参照チャート (JSON) と比べる: 差のヒートマップのタブと、大きいリークの一覧
+        ttk.Button(button_frame, text="Load Chart", command=self.load_chart).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Leaks", command=self.show_leaks).pack(side="left", padx=5)
+        # 解析の段階ごとの時間を計測する (Timers) / cProfile も取る (ワーカー数は1になる)
+        ttk.Label(button_frame, text="Profile:").pack(side="left", padx=(15, 2))
+        self.profile_mode_var = tk.StringVar(value=PROFILE_MODES[0])
+        ttk.Combobox(button_frame, textvariable=self.profile_mode_var, values=PROFILE_MODES,
+                     state="readonly", width=9).pack(side="left")
         
         input_frame.columnconfigure(1, weight=1) # Directory entry expands
 
@@ -194,10 +168,46 @@ class PokerRangeGUI:
         self.position_combo = ttk.Combobox(filter_frame, textvariable=self.position_var, state="readonly")
         self.position_combo.grid(row=0, column=3, padx=5, pady=5, sticky="w")
         self.position_combo.bind("<<ComboboxSelected>>", self.on_filter_change)
-        
+
+        # ライブ追跡: プレイ中に追記されたハンドだけを読み込んで集計に反映する
+        self.live_tail_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame, text="Live tail", variable=self.live_tail_var,
+                        command=self.toggle_live_tail).grid(row=0, column=4, padx=5, pady=5, sticky="w")
+
+        # 解析したハンドの絞り込み (HandStore の行から集計し直す。スナップショットでは使えない)
+        self.period_var = tk.StringVar(value=ALL_CHOICE)
+        self.table_size_var = tk.StringVar(value=ALL_CHOICE)
+        self.stakes_var = tk.StringVar(value=ALL_CHOICE)
+        self.time_bucket_var = tk.StringVar(value=TIME_BUCKET_CHOICES[0])
+        self._data_filter_combos = []
+        for column, (label, variable, values, width, command) in enumerate((
+                ("Period:", self.period_var, [name for name, _ in DATA_PERIODS], 13, self.on_period_change),
+                ("Table size:", self.table_size_var, [ALL_CHOICE], 8, self.on_data_filter_change),
+                ("Stakes (BB):", self.stakes_var, [ALL_CHOICE], 8, self.on_data_filter_change),
+                ("Buckets:", self.time_bucket_var, TIME_BUCKET_CHOICES, 8, self.on_time_bucket_change))):
+            ttk.Label(filter_frame, text=label).grid(row=1, column=column * 2, padx=5, pady=5, sticky="w")
+            combo = ttk.Combobox(filter_frame, textvariable=variable, values=values, state="disabled", width=width)
+            combo.grid(row=1, column=column * 2 + 1, padx=5, pady=5, sticky="w")
+            combo.bind("<<ComboboxSelected>>", command)
+            self._data_filter_combos.append(combo)
+
+        # 日付の範囲 (From/To のスライダー)。ドラッグ中も表示中のマトリクスを更新する
+        self._window_scales = []
+        self._window_labels = []
+        for column, (label, which) in enumerate((("From:", 0), ("To:", 1))):
+            ttk.Label(filter_frame, text=label).grid(row=2, column=column * 4, padx=5, pady=5, sticky="w")
+            scale = ttk.Scale(filter_frame, from_=0, to=0, orient="horizontal", state="disabled",
+                              command=lambda value, which=which: self.on_window_slide(which, value))
+            scale.grid(row=2, column=column * 4 + 1, columnspan=2, padx=5, pady=5, sticky="ew")
+            window_label = ttk.Label(filter_frame, width=17)
+            window_label.grid(row=2, column=column * 4 + 3, padx=5, pady=5, sticky="w")
+            self._window_scales.append(scale)
+            self._window_labels.append(window_label)
+
         # --- 結果表示エリア (タブ) ---
         self.notebook = ttk.Notebook(master)
         self.notebook.pack(padx=10, pady=10, expand=True, fill="both")
+        self.notebook.bind("<<NotebookTabChanged>>", self._on_tab_changed)
         
         # 初期メッセージ用タブ
         self.initial_tab = ttk.Frame(self.notebook)
@@ -217,9 +227,136 @@ class PokerRangeGUI:
     def on_filter_change(self, event): # event is passed by a binding, can be None if called manually
         self._update_position_selector()
         # If data is already analyzed, refresh the displayed tabs
-        if self.data:
+        if self.data is not None:
             self.display_results_in_gui()
 
+    def on_data_filter_change(self, event):
+        if self.data is not None:
+            self._refresh_current_results()
+            if self.view_data is not self.data:
+                self.status_var.set(f"Filtered: {self._view_cache[2]} hands "
+                                    f"(live-tail hands are not included).")
+
+    def on_period_change(self, event):
+        # 期間の選択はスライダーを動かす近道 (最新のハンドから遡った日を含む期間から最後まで)
+        days = dict(DATA_PERIODS).get(self.period_var.get())
+        if not len(self._bucket_starts): # 日時の分かるハンドが無い
+            self._set_window(0, 0)
+            self.on_data_filter_change(event)
+            return
+        first = 0 if days is None else int(np.searchsorted(
+            self._bucket_starts, self._latest_hand_time - days * SECONDS_PER_DAY, side='right')) - 1
+        self._set_window(max(0, first), len(self._bucket_starts) - 1)
+        self.on_data_filter_change(event)
+
+    def on_time_bucket_change(self, event):
+        period = self.period_var.get() # 目盛りの数が変わってスライダーが動いても期間の選択は残す
+        self._bucket_starts = self._hand_store.time_buckets(TIME_BUCKETS[self.time_bucket_var.get()])
+        self._timelines = {}
+        self._window_scales[0].config(to=max(0, len(self._bucket_starts) - 1))
+        self._window_scales[1].config(to=max(0, len(self._bucket_starts) - 1))
+        self.period_var.set(period if period in dict(DATA_PERIODS) else ALL_CHOICE)
+        self.on_period_change(event)
+
+    def on_window_slide(self, which, value):
+        first, last = self._window
+        if which == 0:
+            first = int(round(float(value)))
+            last = max(first, last)
+        else:
+            last = int(round(float(value)))
+            first = min(first, last)
+        if (first, last) == self._window:
+            return
+        self._set_window(first, last)
+        if self.period_var.get() != PERIOD_CUSTOM:
+            self.period_var.set(PERIOD_CUSTOM)
+        # ドラッグ中のイベントはまとめて、アイドル時に1回だけ描き直す
+        if self._window_after_id is None:
+            self._window_after_id = self.master.after_idle(self._apply_window)
+
+    def _apply_window(self):
+        self._window_after_id = None
+        self.on_data_filter_change(None)
+
+    def _set_window(self, first, last):
+        self._window = (first, last)
+        for scale, label, bucket in zip(self._window_scales, self._window_labels, (first, last)):
+            scale.set(bucket)
+            label.config(text=self._format_bucket(bucket))
+
+    def _format_bucket(self, bucket):
+        if not len(self._bucket_starts):
+            return ""
+        date_format = "%Y-%m-%d" if self.time_bucket_var.get() == "Day" else "%Y-%m-%d %H:%M"
+        return time.strftime(date_format, time.gmtime(int(self._bucket_starts[bucket])))
+
+    def _reset_data_filters(self, hand_store=None):
+        # 解析が終わったら、行にある値だけを選択肢にして有効にする (hand_store が None なら無効)
+        for variable in (self.period_var, self.table_size_var, self.stakes_var):
+            variable.set(ALL_CHOICE)
+        self.time_bucket_var.set(TIME_BUCKET_CHOICES[0])
+        self._bucket_starts = np.zeros(0, dtype=np.int64)
+        self._timelines = {}
+        self._window = (0, 0)
+        period_combo, table_size_combo, stakes_combo, _ = self._data_filter_combos
+        if hand_store is None or len(hand_store) == 0:
+            for widget in self._data_filter_combos + self._window_scales:
+                widget.config(state="disabled")
+            for label in self._window_labels:
+                label.config(text="")
+            return
+        self._latest_hand_time = int(hand_store.rows["timestamp"].max())
+        table_size_combo["values"] = [ALL_CHOICE] + [f"{size}-max" for size in hand_store.distinct("table_size")]
+        stakes_combo["values"] = [ALL_CHOICE] + [f"{big_blind / 100:g}" for big_blind in hand_store.distinct("big_blind")]
+        for combo in self._data_filter_combos:
+            combo.config(state="readonly")
+        self._bucket_starts = hand_store.time_buckets(TIME_BUCKETS[self.time_bucket_var.get()])
+        for scale in self._window_scales:
+            scale.config(to=max(0, len(self._bucket_starts) - 1),
+                         state="normal" if len(self._bucket_starts) > 1 else "disabled")
+        self._set_window(0, max(0, len(self._bucket_starts) - 1))
+
+    def _data_filters(self):
+        # 選択中の人数・ステークを HandStore.mask の引数にする (どちらも "All" なら None)
+        filters = {}
+        if self.table_size_var.get() != ALL_CHOICE:
+            filters["table_sizes"] = [int(self.table_size_var.get().split("-")[0])]
+        if self.stakes_var.get() != ALL_CHOICE:
+            filters["big_blinds"] = [round(float(self.stakes_var.get()) * 100)]
+        return filters or None
+
+    def _timeline(self, filters):
+        # 人数・ステークの組み合わせごとに累積和を一度だけ作る (期間の区切りは共通)
+        key = self._filters_key(filters)
+        if key not in self._timelines:
+            mask = None if filters is None else self._hand_store.mask(**filters)
+            self._timelines[key] = RangeTimeline(self._hand_store, self._bucket_starts, mask)
+        return self._timelines[key]
+
+    @staticmethod
+    def _filters_key(filters):
+        return tuple(sorted((name, str(value)) for name, value in (filters or {}).items()))
+
+    @property
+    def view_data(self):
+        """The RangeMatrix to display: self.data, or the hands matching the date range and filters."""
+        if self._hand_store is None or self._analysis is not None:
+            return self.data # 解析中は行がまだ揃っていない
+        filters = self._data_filters()
+        whole_range = not len(self._bucket_starts) or self._window == (0, len(self._bucket_starts) - 1)
+        if filters is None and whole_range:
+            return self.data
+        key = (self._data_version, self._filters_key(filters), None if whole_range else self._window)
+        if self._view_cache is None or self._view_cache[0] != key:
+            if whole_range: # 日時の分からないハンドも含める
+                mask = self._hand_store.mask(**filters)
+                self._view_cache = (key, self._hand_store.range_matrix(mask), self._hand_store.hand_count(mask))
+            else:
+                timeline = self._timeline(filters)
+                self._view_cache = (key, timeline.window(*self._window), timeline.hand_count(*self._window))
+        return self._view_cache[1]
+
     def _update_position_selector(self):
         action = self.action_type_var.get()
         if action == "Open":
@@ -243,15 +380,39 @@ class PokerRangeGUI:
         if directory:
             self.dir_entry_var.set(directory)
             self.status_var.set(f"Directory selected: {directory}")
-            # 自動ヒーロー名検出
-            detected_hero = detect_hero_from_files_for_gui(directory)
-            if detected_hero:
-                self.hero_name_var.set(detected_hero)
-                self.status_var.set(f"Directory: {directory} | Detected Hero: {detected_hero}")
-            else:
-                self.status_var.set(f"Directory: {directory} | Could not auto-detect hero.")
+            # 自動ヒーロー名検出 (大きなフォルダでも固まらないようにスレッドで実行)
+            self.status_var.set(f"Directory: {directory} | Detecting hero...")
+            result_queue = queue.Queue()
+            self._hero_detection = {"directory": directory, "queue": result_queue}
+            threading.Thread(
+                target=lambda: result_queue.put(detect_hero_from_files(directory)),
+                daemon=True,
+            ).start()
+            self.master.after(ANALYSIS_POLL_INTERVAL_MS, self._poll_hero_detection, self._hero_detection)
+
+    def _poll_hero_detection(self, detection):
+        if detection is not self._hero_detection:
+            return # 別のフォルダが選ばれた
+        try:
+            detected_hero = detection["queue"].get_nowait()
+        except queue.Empty:
+            self.master.after(ANALYSIS_POLL_INTERVAL_MS, self._poll_hero_detection, detection)
+            return
+        self._hero_detection = None
+        directory = detection["directory"]
+        if detected_hero:
+            self.hero_name_var.set(detected_hero)
+            self.status_var.set(f"Directory: {directory} | Detected Hero: {detected_hero}")
+        else:
+            self.status_var.set(f"Directory: {directory} | Could not auto-detect hero.")
 
 
+    def _get_worker_count(self):
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError): # Spinbox に数値以外が入力された場合
+            return 1
+
     def analyze_data(self):
         history_dir = self.dir_entry_var.get()
         hero_name = self.hero_name_var.get()
@@ -263,321 +424,360 @@ class PokerRangeGUI:
             messagebox.showerror("Error", "Please enter a hero name.")
             return
 
-        self.status_var.set("Analyzing...")
-        self.master.update_idletasks() # UIを更新
+        filepaths = list_hand_history_files(history_dir)
+        workers = self._get_worker_count()
+        profile_mode = self.profile_mode_var.get()
+        if profile_mode == "cProfile":
+            workers = 1 # cProfile は解析スレッドしか見えないので逐次で解析する
 
-        # データ構造の初期化
-        open_ranges = defaultdict(Counter)
-        open_opportunity_all_hands_ranges = defaultdict(Counter)
-        
-        bb_call_defense_ranges = defaultdict(Counter) # BB Call defense
-        bb_raise_defense_ranges = defaultdict(Counter) # BB Raise defense
-        bb_defense_opportunity_fold_ranges = defaultdict(Counter)
-        bb_defense_opportunity_all_hands_ranges = defaultdict(Counter)
-        open_spot_fold_ranges = defaultdict(Counter) # Hero folded in an open spot
-        open_spot_limp_ranges = defaultdict(Counter) # Hero limped (called) in an open spot
-        
-        threebet_ranges = defaultdict(Counter) # 3bet hands by hero position
-        threebet_opportunity_all_hands_ranges = defaultdict(Counter) # All hands where hero had 3bet opportunity by position
-        coldcall_ranges = defaultdict(Counter) # Cold call hands by hero position (in 3bet spot)
-        threebet_fold_ranges = defaultdict(Counter) # Fold hands by hero position (in 3bet spot)
-
-        # For vs-position breakdown
-        threebet_ranges_by_vspos = defaultdict(lambda: defaultdict(Counter))
-        coldcall_ranges_by_vspos = defaultdict(lambda: defaultdict(Counter))
-        threebet_fold_ranges_by_vspos = defaultdict(lambda: defaultdict(Counter))
-        threebet_opp_by_vspos = defaultdict(lambda: defaultdict(Counter))
-
-        file_count = 0
-        hand_count = 0
-
-        for filepath in glob.glob(os.path.join(history_dir, "*.txt")):
-            file_count += 1
-            for parsed_hand in parse_hand_history_file_for_gui(filepath, hero_name):
-                hand_count += 1
-                hand = parsed_hand["hand"]
-                position = parsed_hand["position"]
-                current_hand_text = parsed_hand.get("hand_history_text", None)
-
-                # Open Range
-                if parsed_hand["had_open_opportunity"] and position != "BB": # BB can't open raise usually
-                    open_opportunity_all_hands_ranges[position][hand] += 1
-                    if parsed_hand["is_hero_opener"]:
-                        open_ranges[position][hand] += 1
-                    elif parsed_hand["hero_action_in_open_spot"] == 'fold':
-                        open_spot_fold_ranges[position][hand] += 1
-                    elif parsed_hand["hero_action_in_open_spot"] == 'call': # Limp
-                        open_spot_limp_ranges[position][hand] += 1
-                
-                # BB Defense
-                if position == "BB":
-                    vs_pos = parsed_hand["vs_position_bb"]
-                    action = parsed_hand["bb_defense_action"] # "call", "raise", "fold", or None
-                    
-                    if vs_pos and action: # Opportunity was there, and an action (call, raise, fold) was recorded
-                        bb_defense_opportunity_all_hands_ranges[vs_pos][hand] += 1
-                        if action == "call":
-                            bb_call_defense_ranges[vs_pos][hand] += 1
-                        elif action == "raise":
-                            bb_raise_defense_ranges[vs_pos][hand] += 1
-                        elif action == "fold":
-                            bb_defense_opportunity_fold_ranges[vs_pos][hand] += 1
-                    # If action is None but vs_pos exists, it implies an opportunity but no explicit hero action found
-                    # This case might need review depending on how check_bb_defense behaves with missed actions.
-                    # For now, it's counted in opportunity_all if vs_pos is valid.
-
-                # 3bet Range
-                # 3bet opportunity: hero's first action is a raise, but not the first raise in the hand (i.e., not open)
-                # We count all hands where hero had a chance to 3bet (i.e., after a raise, before hero acts)
-                # and what hands hero actually 3bet by position
-                # We'll use preflop_actions and hero's position
-                # Find all raises before hero acts
-                preflop_actions = parsed_hand.get("preflop_actions", [])
-                hero_first_action_idx = -1
-                for i, (player, action) in enumerate(preflop_actions):
-                    if player == hero_name:
-                        hero_first_action_idx = i
-                        break
-                if hero_first_action_idx > 0:
-                    # There is at least one action before hero acts
-                    prior_raises = [j for j in range(hero_first_action_idx) if preflop_actions[j][1] == 'raise']
-                    if prior_raises:
-                        # There was a raise before hero acted (i.e., 3bet spot)
-                        threebet_opportunity_all_hands_ranges[position][hand] += 1
-                        if preflop_actions[hero_first_action_idx][1] == 'raise':
-                            threebet_ranges[position][hand] += 1
-                        elif preflop_actions[hero_first_action_idx][1] == 'call':
-                            coldcall_ranges[position][hand] += 1
-                        elif preflop_actions[hero_first_action_idx][1] == 'fold':
-                            threebet_fold_ranges[position][hand] += 1
-
-                        # vs-position breakdown
-                        # Find the last raise before hero acts
-                        last_raiser_idx = max(prior_raises)
-                        last_raiser_name = preflop_actions[last_raiser_idx][0]
-                        vs_pos = determine_position(last_raiser_name, current_hand_text) if last_raiser_name != hero_name else None
-                        if vs_pos and vs_pos != 'Other':
-                            threebet_opp_by_vspos[position][vs_pos][hand] += 1
-                            if preflop_actions[hero_first_action_idx][1] == 'raise':
-                                threebet_ranges_by_vspos[position][vs_pos][hand] += 1
-                            elif preflop_actions[hero_first_action_idx][1] == 'call':
-                                coldcall_ranges_by_vspos[position][vs_pos][hand] += 1
-                            elif preflop_actions[hero_first_action_idx][1] == 'fold':
-                                threebet_fold_ranges_by_vspos[position][vs_pos][hand] += 1
-
-        self.data = {
-            'open_ranges': open_ranges,
-            'open_opportunity_all_hands_ranges': open_opportunity_all_hands_ranges,
-            'bb_call_defense_ranges': bb_call_defense_ranges,
-            'bb_raise_defense_ranges': bb_raise_defense_ranges,
-            'bb_defense_opportunity_fold_ranges': bb_defense_opportunity_fold_ranges,
-            'bb_defense_opportunity_all_hands_ranges': bb_defense_opportunity_all_hands_ranges,
-            'open_spot_fold_ranges': open_spot_fold_ranges,
-            'open_spot_limp_ranges': open_spot_limp_ranges,
-            'threebet_ranges': threebet_ranges,
-            'threebet_opportunity_all_hands_ranges': threebet_opportunity_all_hands_ranges,
-            'coldcall_ranges': coldcall_ranges,
-            'threebet_fold_ranges': threebet_fold_ranges,
-            'threebet_ranges_by_vspos': threebet_ranges_by_vspos,
-            'coldcall_ranges_by_vspos': coldcall_ranges_by_vspos,
-            'threebet_fold_ranges_by_vspos': threebet_fold_ranges_by_vspos,
-            'threebet_opp_by_vspos': threebet_opp_by_vspos,
+        # Set default filters up front so partial results show in a known tab
+        self.action_type_combo.set("Open")
+        self._update_position_selector() # Update positions based on "Open"
+        self.position_combo.set("ALL") # Default to "ALL" for the selected action type
+
+        self._stop_live_tail()
+        # 追記の読み始めは解析を始める前の位置 (解析中に追記されたハンドも後で拾う。解析が読んだ分は ID で除く)
+        self._tailer = HandHistoryTailer(history_dir, skip_duplicates=self.skip_duplicates_var.get())
+        self._tailer.mark_current_positions()
+        self._tail_hand_count = 0
+        self.data = RangeMatrix()
+        self._mark_data_changed()
+        self._analyzed_source = (history_dir, hero_name)
+        # 解析スレッドが追記し、メインスレッドはドリルダウンのときに読むだけ
+        self._hand_locations = HandLocationIndex()
+        self._hand_store = HandStore()
+        self._reset_data_filters()
+        self._data_info = {"hand_count": 0, "file_count": 0, "hero_names": [hero_name],
+                           "sources": [os.path.abspath(history_dir)]}
+        self._analysis = {
+            "hero_name": hero_name,
+            "total_files": len(filepaths),
+            "file_count": 0,
+            "hand_count": 0,
+            "hands_at_last_refresh": 0,
+            "start_time": time.perf_counter(),
+            "queue": queue.Queue(),
+            "cancel_event": threading.Event(),
         }
-        
-        if hand_count == 0:
+        self.analyze_button.config(state="disabled")
+        self.open_snapshot_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.status_var.set("Analyzing...")
+
+        # 解析はバックグラウンドスレッドで行い、結果は queue 経由でメインスレッドに渡す
+        # (self.data と Tk ウィジェットはメインスレッドからのみ触る)
+        worker_thread = threading.Thread(
+            target=self._analysis_worker,
+            args=(filepaths, hero_name, workers, self.use_cache_var.get(),
+                  self._analysis["queue"], self._analysis["cancel_event"], profile_mode,
+                  self.skip_duplicates_var.get(), self._hand_locations, self._hand_store),
+            daemon=True,
+        )
+        worker_thread.start()
+        self.master.after(ANALYSIS_POLL_INTERVAL_MS, self._poll_analysis)
+
+    @staticmethod
+    def _analysis_worker(filepaths, hero_name, workers, use_cache, result_queue, cancel_event, profile_mode="Off",
+                         skip_duplicates=False, location_index=None, hand_store=None):
+        cache = None
+        if use_cache:
+            try:
+                cache = AnalysisCache() # SQLite の接続はこのスレッドで開く
+            except (OSError, sqlite3.Error):
+                cache = None # キャッシュが使えなくても解析は続ける
+        dedup_index = None
+        if skip_duplicates:
+            try:
+                dedup_index = HandIdIndex()
+            except (OSError, sqlite3.Error):
+                dedup_index = None # 索引が使えなければ重複も数える
+        profile = StageProfile() if profile_mode != "Off" else None
+        profiler = cProfile.Profile() if profile_mode == "cProfile" else None
+        file_results = iter_file_aggregates(filepaths, hero_name, workers, cache=cache, profile=profile,
+                                            dedup_index=dedup_index, location_index=location_index,
+                                            hand_store=hand_store, cancel_event=cancel_event)
+        try:
+            if profiler is not None:
+                profiler.enable()
+            # キャンセルはジェネレータ側で見る。受け取った結果は位置索引と HandStore に
+            # 追加済みなので、self.data とずれないように必ずキューへ送る
+            for partial, partial_hand_count in file_results:
+                result_queue.put(("file", partial, partial_hand_count))
+            if profiler is not None:
+                profiler.disable()
+            if profile is not None:
+                result_queue.put(("profile", (profile, profiler), 0))
+            result_queue.put(("done", (cache.hits if cache else 0,
+                                       dedup_index.duplicate_count if dedup_index else 0), 0))
+        except Exception as e:
+            result_queue.put(("error", e, 0))
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            file_results.close()
+            if cache is not None:
+                cache.close()
+            if dedup_index is not None:
+                dedup_index.close()
+
+    def cancel_analysis(self):
+        if self._analysis:
+            self._analysis["cancel_event"].set()
+            self.cancel_button.config(state="disabled")
+            self.status_var.set("Cancelling...")
+
+    def _poll_analysis(self):
+        analysis = self._analysis
+        finished = None
+        while True:
+            try:
+                kind, payload, partial_hand_count = analysis["queue"].get_nowait()
+            except queue.Empty:
+                break
+            if kind == "file":
+                self.data.merge(payload)
+                analysis["file_count"] += 1
+                analysis["hand_count"] += partial_hand_count
+                self._data_info["file_count"] += 1
+                self._data_info["hand_count"] += partial_hand_count
+            elif kind == "profile":
+                analysis["profile"] = payload
+            else:
+                finished = (kind, payload)
+                break
+
+        if finished:
+            self._finish_analysis(*finished)
+            return
+
+        file_count = analysis["file_count"]
+        hand_count = analysis["hand_count"]
+        elapsed = time.perf_counter() - analysis["start_time"]
+        rate = hand_count / elapsed if elapsed > 0 else 0.0
+        if not analysis["cancel_event"].is_set():
+            self.status_var.set(
+                f"Analyzing... {file_count}/{analysis['total_files']} files, "
+                f"{hand_count} hands ({rate:.0f} hands/s)"
+            )
+
+        # 途中経過: 一定ハンド数ごとに表示中のマトリクスを更新
+        if hand_count - analysis["hands_at_last_refresh"] >= PARTIAL_REFRESH_HANDS:
+            analysis["hands_at_last_refresh"] = hand_count
+            self._refresh_current_results()
+
+        self.master.after(ANALYSIS_POLL_INTERVAL_MS, self._poll_analysis)
+
+    def _finish_analysis(self, kind, payload):
+        analysis = self._analysis
+        self._analysis = None
+        self.analyze_button.config(state="normal")
+        self.open_snapshot_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self._reset_data_filters(self._hand_store)
+
+        file_count = analysis["file_count"]
+        hand_count = analysis["hand_count"]
+        hero_name = analysis["hero_name"]
+        elapsed = time.perf_counter() - analysis["start_time"]
+
+        if kind == "error":
+            self.status_var.set(f"Analysis failed after {file_count} files: {payload}")
+            messagebox.showerror("Error", f"Analysis failed: {payload}")
+        elif analysis["cancel_event"].is_set():
+            self.status_var.set(f"Analysis cancelled: partial results for {hand_count} hands from {file_count} files.")
+            messagebox.showinfo("Analysis Cancelled", f"Kept partial results for {hand_count} hands from {file_count} files.")
+        elif hand_count == 0:
             self.status_var.set(f"Analyzed {file_count} files. No hands found for hero '{hero_name}'.")
             messagebox.showinfo("Analysis Complete", f"Analyzed {file_count} files. No hands found for hero '{hero_name}'.")
         else:
-            self.status_var.set(f"Analysis complete: {hand_count} hands from {file_count} files.")
+            cached_files, duplicate_hands = payload
+            duplicates_text = f", {duplicate_hands} duplicate hands skipped" if duplicate_hands else ""
+            self.status_var.set(f"Analysis complete: {hand_count} hands from {file_count} files "
+                                f"({cached_files} from cache{duplicates_text}) in {elapsed:.1f}s.")
             messagebox.showinfo("Analysis Complete", f"Analyzed {hand_count} hands from {file_count} files.")
 
-        # Set default filters and display results
-        self.action_type_combo.set("Open") 
-        self._update_position_selector() # Update positions based on "Open"
-        self.position_combo.set("ALL") # Default to "ALL" for the selected action type
+        if "profile" not in analysis:
+            self._refresh_current_results()
+            return
+        # 最初のタブの作成と (遅れて行われる) 描画までを計測してから保存する
+        profile, profiler = analysis["profile"]
+        self._render_profile = profile
+        self._refresh_current_results()
+        status = self.status_var.get()
+        self.master.after(PROFILE_RENDER_SETTLE_MS, lambda: self._finish_profile(
+            status, profile, profiler, hero_name=hero_name, files=file_count, hands=hand_count,
+            elapsed_seconds=elapsed))
+
+    def _finish_profile(self, status, profile, profiler, **extra):
+        if self._render_profile is profile:
+            self._render_profile = None
+        self.status_var.set(status + " Profile: " + self._save_profile(profile, profiler, **extra))
+
+    @staticmethod
+    def _save_profile(profile, profiler, **extra):
+        # JSON (と cProfile の pstats) を PROFILE_DIR に保存し、ステータスバー用の1行を返す
+        summary = profile.summary_line()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            base_path = os.path.join(PROFILE_DIR, time.strftime("profile-%Y%m%d-%H%M%S"))
+            profile.dump_json(base_path + ".json", **extra)
+            saved = base_path + ".json"
+            if profiler is not None:
+                profiler.dump_stats(base_path + ".prof")
+                saved += " (+ .prof)"
+        except OSError as e:
+            return f"{summary} (could not save: {e})"
+        return f"{summary} (saved to {saved})"
+
+    def save_snapshot(self):
+        if self.data is None or self._analysis:
+            messagebox.showerror("Error", "Please analyze hands (and wait for the analysis to finish) first.")
+            return
+        path = filedialog.asksaveasfilename(
+            defaultextension=SNAPSHOT_FILE_EXTENSION,
+            filetypes=[("Range snapshots", "*" + SNAPSHOT_FILE_EXTENSION), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            RangeSnapshot(self.data, **self._data_info).save(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save snapshot: {e}")
+            return
+        self.status_var.set(f"Snapshot saved: {path} ({self._data_info['hand_count']} hands)")
+
+    def open_snapshots(self):
+        if self._analysis:
+            return
+        paths = filedialog.askopenfilenames(
+            filetypes=[("Range snapshots", "*" + SNAPSHOT_FILE_EXTENSION), ("All files", "*.*")])
+        if not paths:
+            return
+        try:
+            snapshot = merge_snapshots(RangeSnapshot.load(path) for path in paths)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not open snapshot: {e}")
+            return
+
+        self._stop_live_tail()
+        self._tailer = None
+        self.data = snapshot.matrix
+        self._mark_data_changed()
+        self._analyzed_source = None # 履歴ディレクトリが無いのでライブ追跡はできない
+        self._hand_locations = None
+        self._hand_store = None
+        self._reset_data_filters()
+        self._data_info = {"hand_count": snapshot.hand_count, "file_count": snapshot.file_count,
+                           "hero_names": sorted(snapshot.hero_names), "sources": sorted(snapshot.sources)}
+        self.action_type_combo.set("Open")
+        self._update_position_selector()
+        self.position_combo.set("ALL")
+        self._refresh_current_results()
+        heroes = ", ".join(sorted(snapshot.hero_names)) or "unknown hero"
+        self.status_var.set(f"Opened {len(paths)} snapshot(s): {snapshot.hand_count} hands ({heroes}).")
+
+    def toggle_live_tail(self):
+        if not self.live_tail_var.get():
+            self._stop_live_tail()
+            self.status_var.set("Live tail stopped.")
+            return
+        if self._analysis or self.data is None or not self._analyzed_source or self._tailer is None:
+            messagebox.showerror("Error", "Please analyze hands first, then enable live tail.")
+            self.live_tail_var.set(False)
+            return
+
+        history_dir, _ = self._analyzed_source
+        if self._hand_store is not None and not len(self._tailer.counted_ids):
+            hand_ids = np.unique(self._hand_store.rows["hand_id"])
+            self._tailer.counted_ids = hand_ids[hand_ids != 0]
+        self.status_var.set(f"Live tail: watching {history_dir} for new hands...")
+        self._tail_after_id = self.master.after(TAIL_POLL_INTERVAL_MS, self._poll_live_tail)
+
+    def _stop_live_tail(self):
+        # 追跡を止めても位置は残す (再開したら止めていた間の追記から読む)
+        if self._tail_after_id is not None:
+            self.master.after_cancel(self._tail_after_id)
+            self._tail_after_id = None
+        self.live_tail_var.set(False)
+
+    def _poll_live_tail(self):
+        self._tail_after_id = None
+        if self._tailer is None or not self.live_tail_var.get():
+            return
+        _, hero_name = self._analyzed_source
+        new_hand_count = 0
+        # 新しく追記された完全なハンドだけを解析する (コストは新規ハンド数に比例)
+        for parsed_hand in parse_hand_texts(self._tailer.read_new_hand_texts(), hero_name):
+            add_parsed_hand_to_aggregates(self.data, parsed_hand, hero_name)
+            new_hand_count += 1
+        if new_hand_count:
+            self._tail_hand_count += new_hand_count
+            self._data_info["hand_count"] += new_hand_count
+            self.refresh_visible_tab()
+            self._refresh_leaks_view()
+            self.status_var.set(f"Live tail: +{new_hand_count} hands ({self._tail_hand_count} since tail started)")
+        self._tail_after_id = self.master.after(TAIL_POLL_INTERVAL_MS, self._poll_live_tail)
+
+    def _refresh_current_results(self):
+        self._mark_data_changed()
+        # 再描画後も選択中のタブを維持する
+        selected_title = None
+        if self.notebook.select():
+            selected_title = self.notebook.tab(self.notebook.select(), "text")
         self.display_results_in_gui()
+        if selected_title:
+            for tab_id in self.notebook.tabs():
+                if self.notebook.tab(tab_id, "text") == selected_title and self.notebook.tab(tab_id, "state") != "hidden":
+                    self.notebook.select(tab_id)
+                    break
 
 
     def display_results_in_gui(self):
-        # 既存のデータタブをクリア (Welcomeタブ以外)
-        for i in reversed(range(self.notebook.index('end'))):
-            tab_text = self.notebook.tab(i, "text")
-            if tab_text != "Welcome":
-                self.notebook.forget(i)
+        # 既存のデータタブを外す (Welcomeタブ以外)。ウィジェットは破棄せずキャッシュに残し、
+        # 同じフィルタに戻ったときに再利用する
+        for tab_id in self.notebook.tabs():
+            if tab_id != str(self.initial_tab):
+                self.notebook.forget(tab_id)
 
-        if not self.data:
+        if self.data is None:
             self.status_var.set("No data to display. Analyze hands first.")
             if self.notebook.index('end') == 0: # Only welcome tab exists or no tabs
                  self.notebook.select(self.initial_tab)
             return
 
+        data = self.view_data # 期間・ステークなどで絞り込んだ集計 (絞り込みが無ければ self.data)
         action_filter = self.action_type_var.get()
         position_filter = self.position_var.get()
+        self._current_filter_key = (action_filter, position_filter)
         
         tabs_created = 0
         first_tab_to_select = None
 
-        positions_to_iterate = ["UTG", "HJ", "CO", "BTN", "SB"] # BB is not an opening position
-        opponent_positions_bb = ["UTG", "HJ", "CO", "BTN", "SB"] # For BB defense
-        positions_for_3bet = ["UTG", "HJ", "CO", "BTN", "SB", "BB"]
-
-        if action_filter == "Open":
-            relevant_positions = [position_filter] if position_filter != "ALL" else positions_to_iterate
-            for pos in relevant_positions:
-                if pos in self.data['open_opportunity_all_hands_ranges'] or pos in self.data['open_ranges']:
-                    # Open Freq %
-                    tab = self.create_matrix_tab(
-                        title=f"{pos} Raise Freq %",
-                        opportunity_counter=self.data['open_opportunity_all_hands_ranges'].get(pos, Counter()),
-                        action_counters={ 
-                            'raise': self.data['open_ranges'].get(pos, Counter()),
-                            'limp': self.data['open_spot_limp_ranges'].get(pos, Counter()),
-                            'fold': self.data['open_spot_fold_ranges'].get(pos, Counter())
-                        },
-                        display_mode="open_freq"
-                    )
-                    if tab and not first_tab_to_select: first_tab_to_select = tab
+        # マトリクスのタブは iter_matrix_views (エクスポートと共通) から、チャートとの差とエクイティのタブはここで足す
+        for spot, views in iter_matrix_views(data, action_filter, position_filter):
+            kind, pos, vs_pos = spot
+            for title, make_tab_args, drill_actions in views:
+                tab = self._add_matrix_tab(title, make_tab_args, drill_down=(*spot, drill_actions))
+                if tab and not first_tab_to_select: first_tab_to_select = tab
+                tabs_created += 1
+
+            if kind == "open":
+                self._add_chart_diff_tab(f"{pos} Raise vs Chart", data, spot, ("raise",))
+                # Equity vs BB's defending range (call + raise) against this position
+                if data.has_data("bb_defense", "BB", pos):
+                    self._add_equity_tab(f"{pos} Equity vs BB Def", data, ("open", pos, None, ("raise",)),
+                                         ("bb_defense", "BB", pos, ("call", "raise")),
+                                         f"{pos} open range vs BB defense")
                     tabs_created += 1
-                    
-                    # Open Opp ALL (Counts)
-                    tab = self.create_matrix_tab(
-                        title=f"{pos} Raise Opp. ALL (Counts)",
-                        action_counters={'main': self.data['open_opportunity_all_hands_ranges'].get(pos, Counter())},
-                        display_mode="count"
-                    )
-                    if tab and not first_tab_to_select: first_tab_to_select = tab
-                    tabs_created += 1
-
-                    # Actual Open (Counts) - This is just the raise counts
-                    tab = self.create_matrix_tab(
-                        title=f"{pos} Raise Actual (Counts)",
-                        action_counters={'main': self.data['open_ranges'].get(pos, Counter())},
-                        display_mode="count"
-                    )
-                    if tab and not first_tab_to_select: first_tab_to_select = tab
-                    tabs_created += 1
-
-        elif action_filter == "BB Defense":
-            relevant_vs_positions = [position_filter] if position_filter != "ALL" else opponent_positions_bb
-            for vs_pos in relevant_vs_positions:
-                has_data_for_vs_pos = (
-                    vs_pos in self.data['bb_defense_opportunity_all_hands_ranges'] or
-                    vs_pos in self.data['bb_call_defense_ranges'] or
-                    vs_pos in self.data['bb_raise_defense_ranges'] or
-                    vs_pos in self.data['bb_defense_opportunity_fold_ranges']
-                )
-                if has_data_for_vs_pos:
-                    # Combined BB Defense Freq % (Call + Raise + Fold)
-                    tab = self.create_matrix_tab(
-                        title=f"BB Def Freq (vs {vs_pos})",
-                        opportunity_counter=self.data['bb_defense_opportunity_all_hands_ranges'].get(vs_pos, Counter()),
-                        action_counters={ # For bb_defense_freq mode
-                            'call': self.data['bb_call_defense_ranges'].get(vs_pos, Counter()),
-                            'raise': self.data['bb_raise_defense_ranges'].get(vs_pos, Counter()),
-                            'fold': self.data['bb_defense_opportunity_fold_ranges'].get(vs_pos, Counter())
-                        },
-                        display_mode="bb_defense_freq"
-                    )
-                    if tab and not first_tab_to_select: first_tab_to_select = tab
-                    tabs_created += 1
-
-                    # BB Def Opp ALL (Counts)
-                    tab = self.create_matrix_tab(
-                        title=f"BB Def Opp ALL (Counts vs {vs_pos})",
-                        action_counters={'main': self.data['bb_defense_opportunity_all_hands_ranges'].get(vs_pos, Counter())},
-                        display_mode="count"
-                    )
-                    if tab and not first_tab_to_select: first_tab_to_select = tab
-                    tabs_created += 1
-                    
-                    # BB Def Actual (Counts - Call + Raise)
-                    combined_bb_def_actual = Counter(self.data['bb_call_defense_ranges'].get(vs_pos, Counter()))
-                    combined_bb_def_actual.update(self.data['bb_raise_defense_ranges'].get(vs_pos, Counter()))
-                    tab = self.create_matrix_tab(
-                        title=f"BB Def Actual (Counts vs {vs_pos})",
-                        action_counters={'main': combined_bb_def_actual},
-                        display_mode="count"
-                    )
-                    if tab and not first_tab_to_select: first_tab_to_select = tab
-                    tabs_created += 1
-
-                    # BB Fold (Counts)
-                    tab = self.create_matrix_tab(
-                        title=f"BB Fold (Counts vs {vs_pos})",
-                        action_counters={'main': self.data['bb_defense_opportunity_fold_ranges'].get(vs_pos, Counter())},
-                        display_mode="count"
-                    )
-                    if tab and not first_tab_to_select: first_tab_to_select = tab
-                    tabs_created += 1
-        
-        elif action_filter == "3bet":
-            relevant_positions = [position_filter] if position_filter != "ALL" else positions_for_3bet
-            for pos in relevant_positions:
-                # vs-position breakdown
-                vspos_dict = self.data['threebet_opp_by_vspos'].get(pos, {})
-                if vspos_dict:
-                    for vs_pos in [p for p in positions_for_3bet if p != pos]:
-                        opp_counter = self.data['threebet_opp_by_vspos'][pos].get(vs_pos, Counter())
-                        if not opp_counter:
-                            continue
-                        tab = self.create_matrix_tab(
-                            title=f"{pos} vs {vs_pos} 3bet spot Freq %",
-                            opportunity_counter=opp_counter,
-                            action_counters={
-                                'raise': self.data['threebet_ranges_by_vspos'][pos][vs_pos],
-                                'call': self.data['coldcall_ranges_by_vspos'][pos][vs_pos],
-                                'fold': self.data['threebet_fold_ranges_by_vspos'][pos][vs_pos],
-                            },
-                            display_mode="threeway_freq"
-                        )
-                        if tab and not first_tab_to_select: first_tab_to_select = tab
-                        tabs_created += 1
-                        # Opp count
-                        tab = self.create_matrix_tab(
-                            title=f"{pos} vs {vs_pos} Opp count",
-                            action_counters={'main': opp_counter},
-                            display_mode="count"
-                        )
-                        if tab and not first_tab_to_select: first_tab_to_select = tab
-                        tabs_created += 1
-                        # 3bet Actual count
-                        tab = self.create_matrix_tab(
-                            title=f"{pos} vs {vs_pos} 3bet Actual count",
-                            action_counters={'main': self.data['threebet_ranges_by_vspos'][pos][vs_pos]},
-                            display_mode="count"
-                        )
-                        if tab and not first_tab_to_select: first_tab_to_select = tab
-                        tabs_created += 1
-                        # cold call Actual count
-                        tab = self.create_matrix_tab(
-                            title=f"{pos} vs {vs_pos} cold call Actual count",
-                            action_counters={'main': self.data['coldcall_ranges_by_vspos'][pos][vs_pos]},
-                            display_mode="count"
-                        )
-                        if tab and not first_tab_to_select: first_tab_to_select = tab
-                        tabs_created += 1
-                        # fold Actual count
-                        tab = self.create_matrix_tab(
-                            title=f"{pos} vs {vs_pos} fold Actual count",
-                            action_counters={'main': self.data['threebet_fold_ranges_by_vspos'][pos][vs_pos]},
-                            display_mode="count"
-                        )
-                        if tab and not first_tab_to_select: first_tab_to_select = tab
-                        tabs_created += 1
-                # fallback: if no vspos breakdown, show overall
-                elif pos in self.data['threebet_opportunity_all_hands_ranges'] or pos in self.data['threebet_ranges']:
-                    tab = self.create_matrix_tab(
-                        title=f"{pos} 3bet spot Freq %",
-                        opportunity_counter=self.data['threebet_opportunity_all_hands_ranges'].get(pos, Counter()),
-                        action_counters={
-                            'raise': self.data['threebet_ranges'].get(pos, Counter()),
-                            'call': self.data['coldcall_ranges'].get(pos, Counter()),
-                            'fold': self.data['threebet_fold_ranges'].get(pos, Counter()),
-                        },
-                        display_mode="threeway_freq"
-                    )
-                    if tab and not first_tab_to_select: first_tab_to_select = tab
+            elif kind == "bb_defense":
+                self._add_chart_diff_tab(f"BB Def vs Chart (vs {vs_pos})", data, spot, ("call", "raise"))
+                # Equity of the defending range vs the opener's range
+                if data.has_data("open", vs_pos):
+                    self._add_equity_tab(f"BB Def Equity (vs {vs_pos})", data,
+                                         ("bb_defense", "BB", vs_pos, ("call", "raise")),
+                                         ("open", vs_pos, None, ("raise",)), f"BB defense vs {vs_pos} open range")
                     tabs_created += 1
+            elif vs_pos is not None: # 3bet (相手別の内訳があるときだけ)
+                self._add_chart_diff_tab(f"{pos} vs {vs_pos} 3bet vs Chart", data, spot, ("raise",))
 
         if tabs_created == 0:
             self.status_var.set(f"No data for current filter: {action_filter} / {position_filter}. Select other options or analyze data.")
@@ -589,7 +789,9 @@ class PokerRangeGUI:
 
         elif first_tab_to_select:
             self.notebook.select(first_tab_to_select)
+            self._ensure_tab_built(str(first_tab_to_select))
             self.status_var.set(f"Displaying: {action_filter} / {position_filter}")
+        self._evict_cached_tabs()
         
         if self.notebook.index('end') > 0 and self.notebook.tab(0, "text") == "Welcome" and tabs_created > 0 :
              self.notebook.hide(self.initial_tab) # Hide welcome tab if other tabs are present
@@ -598,265 +800,321 @@ class PokerRangeGUI:
              self.notebook.select(self.initial_tab)
 
 
-    def _redraw_canvas_cell(self, event, canvas_widget, freq1, freq2, freq3, cell_text, mode):
-        canvas_widget.delete("all")
-        width = canvas_widget.winfo_width()
-        height = canvas_widget.winfo_height()
-
-        if width <= 1 or height <= 1: # Not visible or too small
-            return
-
-        bg_color = '#F0F0F0' 
-        text_color = "black" 
-        total_colored_freq = 0.0
-        current_x = 0
-
-        if mode == "open_freq":
-            open_raise_freq = freq1 # Raise, Red
-            open_limp_freq = freq2  # Limp, Grey (this was previously fold freq, now limp freq)
-            open_fold_freq = freq3  # Fold, Blue (this was previously not used by open_freq, now fold freq)
-            
-            # 1. Draw open raise portion (#FF0058 Red)
-            bar_raise_width = width * open_raise_freq
-            if bar_raise_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_raise_width, height, fill="#FF0058", outline="") 
-            current_x += bar_raise_width
-
-            # 2. Draw open limp portion (New: Yellow)
-            bar_limp_width = width * open_limp_freq
-            if bar_limp_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_limp_width, height, fill="#FFFF99", outline="") # Light Yellow
-            current_x += bar_limp_width
-            
-            # 3. Draw open fold portion (#0A92CF Blue)
-            bar_fold_width = width * open_fold_freq
-            if bar_fold_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_fold_width, height, fill="#0A92CF", outline="") 
-            # current_x += bar_fold_width # Last bar
-            
-            total_colored_freq = open_raise_freq + open_limp_freq + open_fold_freq
-            if total_colored_freq < 1.0:
-                 canvas_widget.create_rectangle(width * total_colored_freq, 0, width, height, fill=bg_color, outline="")
-
-        elif mode == "bb_defense_freq":
-            # freq1 is Call Freq, freq2 is Raise Freq, freq3 is Fold Freq from create_matrix_tab
-            raise_action_freq = freq2 
-            call_action_freq = freq1  
-            fold_action_freq = freq3  
-            
-            current_x = 0
-            # 1. Draw Raise portion (Red)
-            bar_raise_width = width * raise_action_freq
-            if bar_raise_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_raise_width, height, fill="#FF0058", outline="") 
-            current_x += bar_raise_width
-
-            # 2. Draw Call portion (Green)
-            bar_call_width = width * call_action_freq
-            if bar_call_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_call_width, height, fill="#62E45A", outline="") 
-            current_x += bar_call_width
-
-            # 3. Draw Fold portion (Blue)
-            bar_fold_width = width * fold_action_freq
-            if bar_fold_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_fold_width, height, fill="#0A92CF", outline="") 
-            # current_x += bar_fold_width # Not needed if this is the last bar before background fill
-            
-            total_colored_freq = raise_action_freq + call_action_freq + fold_action_freq
-            # Fill remaining with background
-            if total_colored_freq < 1.0:
-                 # The starting x for background fill should be the end of the last colored bar
-                 canvas_widget.create_rectangle(width * total_colored_freq, 0, width, height, fill=bg_color, outline="")
-
-        elif mode == "single_freq":
-            bar_width = width * freq1
-            if bar_width > 0:
-                canvas_widget.create_rectangle(0, 0, bar_width, height, fill="#FF0058", outline="")
-            if freq1 < 1.0:
-                canvas_widget.create_rectangle(bar_width, 0, width, height, fill=bg_color, outline="")
-        elif mode == "threeway_freq":
-            # freq1: raise (red), freq2: call (green), freq3: fold (blue)
-            bar_raise_width = width * freq1
-            if bar_raise_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_raise_width, height, fill="#FF0058", outline="")
-            current_x += bar_raise_width
-            bar_call_width = width * freq2
-            if bar_call_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_call_width, height, fill="#62E45A", outline="")
-            current_x += bar_call_width
-            bar_fold_width = width * freq3
-            if bar_fold_width > 0:
-                canvas_widget.create_rectangle(current_x, 0, current_x + bar_fold_width, height, fill="#0A92CF", outline="")
-            total_colored_freq = freq1 + freq2 + freq3
-            if total_colored_freq < 1.0:
-                canvas_widget.create_rectangle(width * total_colored_freq, 0, width, height, fill=bg_color, outline="")
-        else: # Count mode or unknown - just fill with background
-            canvas_widget.create_rectangle(0, 0, width, height, fill=bg_color, outline="")
-
-        # Text color decision - Always black
-        text_color = "black"
-        
-        # Center text
-        canvas_widget.create_text(width / 2, height / 2, text=cell_text, fill=text_color, anchor="center", justify="center")
+    def _schedule_matrix_redraw(self, canvas, cell_freqs, cell_texts, mode):
+        # リサイズ中は <Configure> が連続して届くので、最後の1回だけ再描画する
+        canvas_id = str(canvas)
+        pending = self._pending_redraws.pop(canvas_id, None)
+        if pending:
+            self.master.after_cancel(pending[0])
+        redraw = lambda: self._redraw_matrix_canvas(canvas, cell_freqs, cell_texts, mode)
+        self._pending_redraws[canvas_id] = (self.master.after(RESIZE_REDRAW_DELAY_MS, redraw), redraw)
+
+    def flush_matrix_redraws(self):
+        """Draw every matrix whose redraw is still waiting for RESIZE_REDRAW_DELAY_MS now; returns how many."""
+        pending = list(self._pending_redraws.values())
+        for after_id, redraw in pending:
+            self.master.after_cancel(after_id)
+            redraw()
+        return len(pending)
+
+    def _redraw_matrix_canvas(self, canvas, cell_freqs, cell_texts, mode):
+        self._pending_redraws.pop(str(canvas), None)
+        if not canvas.winfo_exists():
+            return
+        if self._render_profile is not None:
+            start = time.perf_counter()
+            self._draw_matrix_canvas(canvas, cell_freqs, cell_texts, mode)
+            self._render_profile.add("render.draw", time.perf_counter() - start)
+        else:
+            self._draw_matrix_canvas(canvas, cell_freqs, cell_texts, mode)
 
+    def _draw_matrix_canvas(self, canvas, cell_freqs, cell_texts, mode):
+        canvas.delete("all")
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
 
-    def create_matrix_tab(self, title, opportunity_counter=None, 
-                          action_counters=None, # Expected to be a dict like {'main': Counter, 'second': Counter, 'third': Counter}
-                          display_mode="count"):
-        # display_mode: "count", "open_freq", "bb_defense_freq"
-        
+        if width <= MATRIX_HEADER_SIZE or height <= MATRIX_HEADER_SIZE: # Not visible or too small
+            return
+
+        num_ranks = len(RANKS)
+        cell_width = (width - MATRIX_HEADER_SIZE) / num_ranks
+        cell_height = (height - MATRIX_HEADER_SIZE) / num_ranks
+
+        # Column headers (A-2) and row headers (A-2)
+        for i, rank_char in enumerate(RANKS):
+            x0 = MATRIX_HEADER_SIZE + i * cell_width
+            canvas.create_rectangle(x0, 0, x0 + cell_width, MATRIX_HEADER_SIZE, outline="black")
+            canvas.create_text(x0 + cell_width / 2, MATRIX_HEADER_SIZE / 2, text=rank_char, anchor="center")
+            y0 = MATRIX_HEADER_SIZE + i * cell_height
+            canvas.create_rectangle(0, y0, MATRIX_HEADER_SIZE, y0 + cell_height, outline="black")
+            canvas.create_text(MATRIX_HEADER_SIZE / 2, y0 + cell_height / 2, text=rank_char, anchor="center")
+
+        for cell in range(NUM_HAND_CLASSES):
+            r, c = divmod(cell, num_ranks)
+            x0 = MATRIX_HEADER_SIZE + c * cell_width
+            y0 = MATRIX_HEADER_SIZE + r * cell_height
+            current_x = x0
+            # Stacked bars, then background for the rest of the cell
+            for fraction, color in matrix_cell_bars(*cell_freqs[cell], mode):
+                bar_width = cell_width * fraction
+                if bar_width > 0:
+                    canvas.create_rectangle(current_x, y0, current_x + bar_width, y0 + cell_height, fill=color, outline="")
+                current_x += bar_width
+            if current_x < x0 + cell_width:
+                canvas.create_rectangle(current_x, y0, x0 + cell_width, y0 + cell_height, fill=MATRIX_BG_COLOR, outline="")
+            canvas.create_rectangle(x0, y0, x0 + cell_width, y0 + cell_height, outline="lightgrey")
+            # Center text - Always black
+            canvas.create_text(x0 + cell_width / 2, y0 + cell_height / 2, text=cell_texts[cell],
+                               fill="black", anchor="center", justify="center")
+
+
+    def create_matrix_tab(self, title, opportunity_counts=None, 
+                          action_counts=None, # Expected to be a dict like {'main': counts, 'raise': counts, ...} of 169-cell arrays
+                          display_mode="count", caption=None):
         tab_frame = ttk.Frame(self.notebook, padding=5)
         self.notebook.add(tab_frame, text=title)
-
-        base_hands = ['A', 'K', 'Q', 'J', 'T', '9', '8', '7', '6', '5', '4', '3', '2']
-
-        # Configure grid weights for responsiveness for the tab_frame itself
-        # Row 0 and Column 0 for headers, not weighted for resizing
-        tab_frame.grid_rowconfigure(0, weight=0)
-        tab_frame.grid_columnconfigure(0, weight=0)
-        for i in range(len(base_hands)):
-            # Cells (1-13) are weighted for resizing
-            tab_frame.grid_columnconfigure(i + 1, weight=1, minsize=40) 
-            tab_frame.grid_rowconfigure(i + 1, weight=1, minsize=30)    
-
-        # Add column headers (A-2)
-        for i, rank_char in enumerate(base_hands):
-            header_label = ttk.Label(tab_frame, text=rank_char, relief="solid", borderwidth=1, anchor="center")
-            header_label.grid(row=0, column=i + 1, sticky="nsew")
-
-        # Add row headers (A-2)
-        for i, rank_char in enumerate(base_hands):
-            header_label = ttk.Label(tab_frame, text=rank_char, relief="solid", borderwidth=1, anchor="center")
-            header_label.grid(row=i + 1, column=0, sticky="nsew")
-
-        for r, rank1 in enumerate(base_hands):
-            for c, rank2 in enumerate(base_hands):
-                is_pair = (rank1 == rank2)
-                is_suited = (r < c)
-                is_offsuit = (r > c)
-
-                hand_str = ""
-                if is_pair: hand_str = rank1 + rank2
-                elif is_suited: hand_str = rank1 + rank2 + 's'
-                else: hand_str = rank2 + rank1 + 'o'
-                
-                opp_value = opportunity_counter.get(hand_str, 0) if opportunity_counter else 0
-
-                cell_canvas = tk.Canvas(tab_frame, bg='#F0F0F0', highlightthickness=1, highlightbackground="lightgrey")
-                cell_canvas.grid(row=r + 1, column=c + 1, sticky="nsew") # Offset by 1 for headers
-
-                text_to_display = ""
-                freq1_for_draw, freq2_for_draw, freq3_for_draw = 0.0, 0.0, 0.0
-                current_redraw_mode = "count" # default for actual counts or single_freq if not specified
-
-                if display_mode == "open_freq":
-                    current_redraw_mode = "open_freq"
-                    open_raise_count = action_counters['raise'].get(hand_str, 0) if action_counters and 'raise' in action_counters else 0
-                    open_limp_count = action_counters['limp'].get(hand_str, 0) if action_counters and 'limp' in action_counters else 0
-                    open_fold_count = action_counters['fold'].get(hand_str, 0) if action_counters and 'fold' in action_counters else 0
-                    
-                    if opp_value > 0:
-                        raise_freq_val = open_raise_count / opp_value 
-                        limp_freq_val = open_limp_count / opp_value
-                        fold_freq_val = open_fold_count / opp_value  
-                        
-                        freq1_for_draw = raise_freq_val
-                        freq2_for_draw = limp_freq_val
-                        freq3_for_draw = fold_freq_val
-
-                        if raise_freq_val == 0 and limp_freq_val == 0 and fold_freq_val == 0:
-                            text_to_display = "0%"
-                        else:
-                            text_to_display = f"R:{raise_freq_val:.0%}\nL:{limp_freq_val:.0%}\nF:{fold_freq_val:.0%}"
-                    elif open_raise_count > 0 or open_limp_count > 0 or open_fold_count > 0:
-                        text_to_display = "Err"
-                        freq1_for_draw = 1.0 # Indicate error with full bar
-                    else:
-                        text_to_display = "N/A"
-
-                elif display_mode == "bb_defense_freq":
-                    current_redraw_mode = "bb_defense_freq"
-                    call_count = action_counters['call'].get(hand_str, 0) if action_counters and 'call' in action_counters else 0
-                    raise_count = action_counters['raise'].get(hand_str, 0) if action_counters and 'raise' in action_counters else 0
-                    fold_count = action_counters['fold'].get(hand_str, 0) if action_counters and 'fold' in action_counters else 0
-                    
-                    if opp_value > 0:
-                        call_freq_val = call_count / opp_value    # Corresponds to freq1_for_draw
-                        raise_freq_val = raise_count / opp_value   # Corresponds to freq2_for_draw
-                        fold_freq_val = fold_count / opp_value    # Corresponds to freq3_for_draw
-                        
-                        freq1_for_draw = call_freq_val
-                        freq2_for_draw = raise_freq_val
-                        freq3_for_draw = fold_freq_val
-
-                        if call_freq_val == 0 and raise_freq_val == 0 and fold_freq_val == 0:
-                            text_to_display = "0%"
-                        else:
-                            # Display order: Raise, Call, Fold
-                            text_to_display = f"R:{raise_freq_val:.0%}\nC:{call_freq_val:.0%}\nF:{fold_freq_val:.0%}"
-                    elif call_count > 0 or raise_count > 0 or fold_count > 0:
-                        text_to_display = "Err"
-                        freq1_for_draw = 1.0 # Indicate error
-                    else:
-                        text_to_display = "N/A"
-                
-                elif display_mode == "count":
-                    current_redraw_mode = "count" # Explicitly set for clarity
-                    count_val = action_counters['main'].get(hand_str, 0) if action_counters and 'main' in action_counters else 0
-                    text_to_display = str(count_val)
-                    # No frequencies to draw for count mode, bars will be empty by default in _redraw_canvas_cell if mode is count
-                
-                elif display_mode == "single_freq":
-                    current_redraw_mode = "single_freq"
-                    # For single_freq: action_counters['raise'] or ['call'] or ['fold'] is the actual count, opp_value is the opportunity count
-                    # Use whichever key is present in action_counters
-                    key = next(iter(action_counters.keys())) if action_counters else None
-                    count = action_counters[key].get(hand_str, 0) if action_counters and key in action_counters else 0
-                    if opp_value > 0:
-                        freq = count / opp_value
-                        freq1_for_draw = freq
-                        if freq == 0:
-                            text_to_display = "0%"
-                        else:
-                            text_to_display = f"{freq:.0%}"
-                    elif count > 0:
-                        text_to_display = "Err"
-                        freq1_for_draw = 1.0
-                    else:
-                        text_to_display = "N/A"
-                
-                elif display_mode == "threeway_freq":
-                    current_redraw_mode = "threeway_freq"
-                    raise_count = action_counters['raise'].get(hand_str, 0) if action_counters and 'raise' in action_counters else 0
-                    call_count = action_counters['call'].get(hand_str, 0) if action_counters and 'call' in action_counters else 0
-                    fold_count = action_counters['fold'].get(hand_str, 0) if action_counters and 'fold' in action_counters else 0
-                    if opp_value > 0:
-                        raise_freq_val = raise_count / opp_value
-                        call_freq_val = call_count / opp_value
-                        fold_freq_val = fold_count / opp_value
-                        freq1_for_draw = raise_freq_val
-                        freq2_for_draw = call_freq_val
-                        freq3_for_draw = fold_freq_val
-                        if raise_freq_val == 0 and call_freq_val == 0 and fold_freq_val == 0:
-                            text_to_display = "0%"
-                        else:
-                            text_to_display = f"R:{raise_freq_val:.0%}\nC:{call_freq_val:.0%}\nF:{fold_freq_val:.0%}"
-                    elif raise_count > 0 or call_count > 0 or fold_count > 0:
-                        text_to_display = "Err"
-                        freq1_for_draw = 1.0
-                    else:
-                        text_to_display = "N/A"
-                
-                # Bind Configure
-                cell_canvas.bind(
-                    "<Configure>",
-                    (lambda f1=freq1_for_draw, f2=freq2_for_draw, f3=freq3_for_draw, text=text_to_display, mode=current_redraw_mode, widget=cell_canvas:
-                        lambda event: self._redraw_canvas_cell(event, widget, f1, f2, f3, text, mode)
-                    )()
-                )
+        self._fill_matrix_frame(tab_frame, opportunity_counts, action_counts, display_mode, caption)
         return tab_frame
 
+    def _fill_matrix_frame(self, tab_frame, opportunity_counts=None, action_counts=None, display_mode="count",
+                           caption=None):
+        # display_mode: "count", "open_freq", "bb_defense_freq", "threeway_freq", "single_freq", "equity"
+        # caption はマトリクスの上に表示する1行 (エクイティのタブではレンジ全体の勝率)
+        cell_freqs, cell_texts, redraw_mode = compute_matrix_cells(opportunity_counts, action_counts, display_mode)
+        if caption:
+            ttk.Label(tab_frame, text=caption).pack(side="top", anchor="w", pady=(0, 5))
+
+        # 13x13 の表全体 (見出しを含む) を1枚の Canvas に描く
+        num_ranks = len(RANKS)
+        canvas = tk.Canvas(tab_frame, bg=MATRIX_BG_COLOR, highlightthickness=0,
+                           width=MATRIX_HEADER_SIZE + num_ranks * MATRIX_MIN_CELL_WIDTH,
+                           height=MATRIX_HEADER_SIZE + num_ranks * MATRIX_MIN_CELL_HEIGHT)
+        canvas.pack(expand=True, fill="both")
+        canvas.bind(
+            "<Configure>",
+            lambda event: self._schedule_matrix_redraw(canvas, cell_freqs, cell_texts, redraw_mode)
+        )
+        return canvas
+
+    def _add_matrix_tab(self, title, make_tab_args, drill_down=None):
+        # make_tab_args は self.data から create_matrix_tab の引数を作り直す関数。
+        # drill_down はセルをクリックしたときに一覧するハンドの (spot kind, position, vs_position, actions)。
+        # タブは空のまま追加し、最初に選択されたときに中身を作る (_ensure_tab_built)。
+        # 作ったタブは (アクション, ポジション, タイトル) をキーにした LRU キャッシュに残す。
+        cache_key = self._current_filter_key + (title,)
+        tab = self._tab_cache.pop(cache_key, None)
+        if tab is None:
+            tab = ttk.Frame(self.notebook, padding=5)
+            self._tab_specs[str(tab)] = {"make_tab_args": make_tab_args, "built_version": None,
+                                         "drill_down": drill_down}
+        else:
+            self._tab_specs[str(tab)]["make_tab_args"] = make_tab_args
+        self._tab_cache[cache_key] = tab # 最近使ったものとして末尾へ
+        self.notebook.add(tab, text=title)
+        return tab
+
+    def load_chart(self):
+        path = filedialog.askopenfilename(filetypes=[("Range charts", "*.json"), ("All files", "*.*")])
+        if not path:
+            return
+        try:
+            self._chart = ReferenceChart.load(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not load chart: {e}")
+            return
+        self._deviation_cache = None
+        if self.data is not None:
+            self._refresh_current_results()
+        self._refresh_leaks_view()
+        self.status_var.set(f"Chart loaded: {self._chart.name} ({int(self._chart.defined.sum())} spots).")
+
+    def _deviation_report(self, data):
+        # 全スポットを一度に比べる (数ミリ秒) ので、データが変わるたびに作り直す
+        key = (id(data), self._data_version)
+        if self._deviation_cache is None or self._deviation_cache[0] != key:
+            self._deviation_cache = (key, score_deviations(data, self._chart))
+        return self._deviation_cache[1]
+
+    def _add_chart_diff_tab(self, title, data, spot, actions):
+        # spot = (kind, position, vs_position)。チャートにそのスポットが無ければタブを作らない
+        if self._chart is None or not self._deviation_report(data).covers(*spot):
+            return None
+        return self._add_matrix_tab(title, lambda: dict(
+            action_counts={'diff': self._deviation_report(data).grid(*spot, actions)},
+            display_mode="diff",
+            caption=f"Played minus chart '{self._chart.name}' ({'+'.join(actions)}); red = more often than the chart"
+        ), drill_down=spot + (actions,))
+
+    def show_leaks(self):
+        if self._chart is None or self.data is None:
+            messagebox.showerror("Error", "Please analyze hands (or open a snapshot) and load a chart first.")
+            return
+        if self._leaks_view is not None and self._leaks_view.winfo_exists():
+            self._leaks_view.winfo_toplevel().lift()
+            self._refresh_leaks_view()
+            return
+        window = tk.Toplevel(self.master)
+        window.geometry("800x400")
+        columns = ("spot", "action", "hand", "hands", "played", "chart", "z", "misplayed")
+        tree = ttk.Treeview(window, columns=columns, show="headings")
+        for column in columns:
+            tree.heading(column, text=column.capitalize())
+            tree.column(column, width=140 if column == "spot" else 70, anchor="w" if column == "spot" else "center")
+        tree.pack(expand=True, fill="both")
+        self._leaks_view = tree
+        self._refresh_leaks_view()
+
+    def _refresh_leaks_view(self):
+        # 開いているリーク一覧を今の表示データで作り直す (ライブ追跡で増えるたびに呼ばれる)
+        tree = self._leaks_view
+        if tree is None or not tree.winfo_exists() or self._chart is None or self.data is None:
+            return
+        tree.delete(*tree.get_children())
+        leaks = self._deviation_report(self.view_data).leaks(LEAKS_LIST_SIZE)
+        for kind, position, vs_position, action, hand, hands, played, expected, z, misplayed in leaks:
+            spot = f"{kind} {position}" + (f" vs {vs_position}" if vs_position else "")
+            tree.insert("", "end", values=(spot, action, hand, hands, f"{played:.0%}", f"{expected:.0%}",
+                                           f"{z:+.1f}", f"{misplayed:.0f}"))
+        tree.winfo_toplevel().title(f"Biggest leaks vs {self._chart.name}: {len(leaks)} significant")
+
+    def _add_equity_tab(self, title, data, hero_range, villain_range, description):
+        # hero_range / villain_range は RangeMatrix.range_weights の引数 (kind, position, vs_position, actions)
+        return self._add_matrix_tab(title, lambda: self._equity_tab_args(data, hero_range, villain_range, description))
+
+    def _equity_tab_args(self, data, hero_range, villain_range, description):
+        if self._equity_table is None:
+            self._start_equity_table_load()
+            return dict(display_mode="equity", caption="Building the preflop equity table (first use only)...")
+        equity, class_equity = self._equity_table.range_vs_range(data.range_weights(*hero_range),
+                                                                 data.range_weights(*villain_range))
+        return dict(action_counts={'equity': class_equity}, display_mode="equity",
+                    caption=f"{description}: {equity:.1%} all-in preflop equity (cells: each hand vs that range)")
+
+    def _start_equity_table_load(self):
+        # 表を読む (初回は作る) のはバックグラウンドスレッドで行い、できたら表示中のタブを作り直す
+        if self._equity_loader is not None:
+            return
+        workers = self._get_worker_count()
+        result = {}
+
+        def load():
+            try:
+                result["table"] = load_preflop_equity_table(workers)
+            except Exception as e:
+                result["error"] = e
+
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        self._equity_loader = (thread, result)
+        self.master.after(ANALYSIS_POLL_INTERVAL_MS, self._poll_equity_table_load)
+
+    def _poll_equity_table_load(self):
+        thread, result = self._equity_loader
+        if thread.is_alive():
+            self.master.after(ANALYSIS_POLL_INTERVAL_MS, self._poll_equity_table_load)
+            return
+        self._equity_loader = None
+        if "error" in result:
+            self.status_var.set(f"Could not build the preflop equity table: {result['error']}")
+            return
+        self._equity_table = result["table"]
+        self.refresh_visible_tab()
+
+    def _on_matrix_click(self, event, drill_down):
+        canvas = event.widget
+        num_ranks = len(RANKS)
+        cell_width = (canvas.winfo_width() - MATRIX_HEADER_SIZE) / num_ranks
+        cell_height = (canvas.winfo_height() - MATRIX_HEADER_SIZE) / num_ranks
+        if event.x < MATRIX_HEADER_SIZE or event.y < MATRIX_HEADER_SIZE or cell_width <= 0 or cell_height <= 0:
+            return
+        c = min(int((event.x - MATRIX_HEADER_SIZE) / cell_width), num_ranks - 1)
+        r = min(int((event.y - MATRIX_HEADER_SIZE) / cell_height), num_ranks - 1)
+        self.show_hand_drill_down(*drill_down, r * num_ranks + c)
+
+    def show_hand_drill_down(self, kind, position, vs_position, actions, hand_class):
+        # 位置索引から該当ハンドを探し、その範囲だけをディスクから読んで一覧する
+        spot = f"{position} vs {vs_position}" if vs_position else position
+        label = f"{spot} {HAND_CLASS_NAMES[hand_class]} {'/'.join(actions)} ({kind})"
+        if self._hand_locations is None:
+            self.status_var.set("Hand drill-down needs an analyzed folder (not available for opened snapshots).")
+            return
+        locations = self._hand_locations.locate(kind, position, vs_position, actions, hand_class)
+        if not locations:
+            self.status_var.set(f"No hands for {label}.")
+            return
+        hands = [(location, hand_text) for location, hand_text
+                 in read_located_hand_texts(locations[:DRILL_DOWN_MAX_HANDS]) if hand_text]
+
+        window = tk.Toplevel(self.master)
+        shown = f"first {len(hands)} of " if len(locations) > len(hands) else ""
+        window.title(f"{label}: {shown}{len(locations)} hands")
+        window.geometry("900x500")
+        pane = ttk.PanedWindow(window, orient="horizontal")
+        pane.pack(expand=True, fill="both")
+        hand_list = tk.Listbox(pane, width=45, exportselection=False)
+        hand_view = tk.Text(pane, wrap="none")
+        pane.add(hand_list, weight=1)
+        pane.add(hand_view, weight=3)
+        for (filepath, _, _, _), hand_text in hands:
+            header = hand_text.split("\n", 1)[0]
+            hand_list.insert("end", f"{os.path.basename(filepath)}: {header}")
+
+        def show_selected(event=None):
+            selection = hand_list.curselection()
+            if not selection:
+                return
+            hand_view.config(state="normal")
+            hand_view.delete("1.0", "end")
+            hand_view.insert("1.0", hands[selection[0]][1])
+            hand_view.config(state="disabled")
+
+        hand_list.bind("<<ListboxSelect>>", show_selected)
+        if hands:
+            hand_list.selection_set(0)
+            show_selected()
+        self.status_var.set(f"{label}: {len(locations)} hands.")
+
+    def _ensure_tab_built(self, tab_id):
+        spec = self._tab_specs.get(tab_id)
+        if not spec or spec["built_version"] == self._data_version:
+            return
+        start = time.perf_counter()
+        tab_frame = self.master.nametowidget(tab_id)
+        for child in tab_frame.winfo_children():
+            child.destroy()
+        canvas = self._fill_matrix_frame(tab_frame, **spec["make_tab_args"]())
+        if spec["drill_down"] is not None:
+            canvas.bind("<Button-1>", lambda event: self._on_matrix_click(event, spec["drill_down"]))
+        spec["built_version"] = self._data_version
+        if self._render_profile is not None:
+            self._render_profile.add("render.build_tab", time.perf_counter() - start)
+
+    def _on_tab_changed(self, event):
+        if self.notebook.select():
+            self._ensure_tab_built(self.notebook.select())
+
+    def _evict_cached_tabs(self):
+        # 表示中でない古いタブから破棄して MAX_CACHED_TABS 個に収める
+        shown_tabs = set(self.notebook.tabs())
+        for cache_key in list(self._tab_cache):
+            if len(self._tab_cache) <= MAX_CACHED_TABS:
+                break
+            tab = self._tab_cache[cache_key]
+            if str(tab) in shown_tabs:
+                continue
+            del self._tab_cache[cache_key]
+            self._tab_specs.pop(str(tab), None)
+            tab.destroy()
+
+    def _mark_data_changed(self):
+        # 作成済みのタブは次に表示されたときに作り直される
+        self._data_version += 1
+
+    def refresh_visible_tab(self):
+        self._mark_data_changed()
+        if self.notebook.select():
+            self._ensure_tab_built(self.notebook.select())
+
 def main_gui():
     root = tk.Tk()
     gui = PokerRangeGUI(root)
@@ -864,11 +1122,3 @@ def main_gui():
 
 if __name__ == '__main__':
     main_gui()
-
-# 注意: このファイルは utils_judge.py と同じディレクトリに置くか、
-# utils_judge.py が含まれるディレクトリがPythonの検索パスに含まれている必要があります。
-# また、range_analyzer.py から解析ロジックを適切に分離・インポートする構造が理想的です。
-# この例では、簡単のため一部の解析関数を直接含めていますが、
-# 本来は range_analyzer.py をリファクタリングして、
-# `process_directory(history_dir, hero_name)` のような関数を呼び出し、
-# 結果の辞書を受け取る形にするのがクリーンです。 
\ No newline at end of file
@@ -0,0 +1,368 @@
+# 決定的なハンド履歴ジェネレータ (ベンチマークや動作確認用のサンプルデータ)
+# 同じ引数・同じ seed からは常に同じファイルが生成される。
+#   python hand_generator.py OUT_DIR --hands 100000 --format pokerstars --table-size 6 --hero Hero
+import argparse
+import os
+import random
+import sys
+from collections import deque
+from datetime import datetime, timedelta
+
+HAND_FORMATS = ("pokerstars", "zoom", "poker_hand")
+
+RANKS = "AKQJT98765432"
+SUITS = "shdc"
+CARD_NAMES = [rank + suit for rank in RANKS for suit in SUITS] # カード番号 = rank * 4 + suit
+
+# 各アクションを選ぶハンドの割合 (上位何%のハンドでそのアクションを取るか)。
+# 実際の判断はハンドの強さ (上位からの割合) に少しノイズを加えて決める。
+DEFAULT_ACTION_PROFILE = {
+    "open_raise": 0.22, # 誰も参加していないときにオープンレイズ
+    "limp": 0.03, # 誰も参加していないときにリンプ
+    "iso_raise": 0.12, # リンパーがいるときにレイズ (BB のオプションを含む)
+    "overlimp": 0.15, # リンパーがいるときにコール
+    "threebet": 0.07, # オープンレイズに対して 3bet
+    "call_open": 0.13, # オープンレイズに対してコール
+    "fourbet": 0.03, # 3bet に対して 4bet
+    "call_threebet": 0.10, # 3bet に対してコール
+    "call_fourbet": 0.03, # 4bet 以上に対してコール (それ以上はレイズしない)
+    "noise": 0.04, # 強さの判定に加えるノイズの幅
+    "postflop_bet": 0.45, # フロップ以降に先頭のプレイヤーがベットする確率
+    "postflop_call": 0.45, # ベットに対してコールする確率
+    "muck": 0.3, # ショーダウンで負けたプレイヤーがマックする確率
+}
+PROFILE_KEYS = tuple(DEFAULT_ACTION_PROFILE)
+
+OPEN_RAISE_BB = 2.5
+RAISE_MULTIPLIER = 3
+STACK_BB = 100
+RAKE_PERCENT = 5
+TABLE_NAMES = ("Aase", "Halley", "Kallisto", "Pallas", "Vesta", "Ceres", "Juno", "Hygiea")
+
+
+# --- ハンドの強さ (上位からの割合) ---
+
+def _class_score(rank1, rank2, suited):
+    # Chen formula に近い簡易スコア (rank は 0=A .. 12=2, rank1 <= rank2)
+    high = {0: 10, 1: 8, 2: 7, 3: 6}.get(rank1, (14 - rank1) / 2)
+    if rank1 == rank2:
+        return max(high * 2, 5)
+    score = high + (2 if suited else 0)
+    gap = rank2 - rank1 - 1
+    score -= (0, 1, 2, 4)[gap] if gap < 4 else 5
+    if gap <= 1 and rank1 > 2:
+        score += 1
+    return score
+
+
+def _build_strength_table():
+    # (rank1, rank2, suited) -> 上位から何%に入るか (そのクラスのコンボの中央)
+    classes = []
+    for rank1 in range(13):
+        for rank2 in range(rank1, 13):
+            for suited in ((False,) if rank1 == rank2 else (True, False)):
+                combos = 6 if rank1 == rank2 else (4 if suited else 12)
+                classes.append((_class_score(rank1, rank2, suited), combos, (rank1, rank2, suited)))
+    classes.sort(key=lambda item: -item[0])
+    table = {}
+    seen = 0
+    for _, combos, key in classes:
+        table[key] = (seen + combos / 2) / 1326
+        seen += combos
+    return table
+
+
+STRENGTH_TABLE = _build_strength_table()
+
+
+def hand_strength(card1, card2):
+    rank1, rank2 = sorted((card1 // 4, card2 // 4))
+    return STRENGTH_TABLE[(rank1, rank2, rank1 != rank2 and card1 % 4 == card2 % 4)]
+
+
+def _money(cents):
+    return f"${cents // 100}" if cents % 100 == 0 else f"${cents / 100:.2f}"
+
+
+# --- 1ハンドの生成 ---
+
+def _preflop(rng, order, strengths, profile, sb_cents, bb_cents):
+    """Simulate preflop betting. Returns (action lines, committed cents, folded set, last aggressor)."""
+    committed = {name: 0 for name in order}
+    if len(order) == 2:
+        sb_player, bb_player = order[0], order[1] # heads-up: the button is SB and acts first
+    else:
+        sb_player, bb_player = order[-2], order[-1]
+    committed[sb_player] = sb_cents
+    committed[bb_player] = bb_cents
+    current_bet = bb_cents
+    raises = 0
+    limpers = 0
+    folded = set()
+    lines = []
+    aggressor = None
+    to_act = deque(order)
+    while to_act and len(order) - len(folded) > 1:
+        name = to_act.popleft()
+        to_call = current_bet - committed[name]
+        strength = strengths[name] + rng.uniform(-profile["noise"], profile["noise"])
+        if raises == 0 and to_call == 0: # BB のオプション
+            action = "raise" if strength < profile["iso_raise"] else "check"
+        elif raises == 0 and limpers:
+            action = "raise" if strength < profile["iso_raise"] else (
+                "call" if strength < profile["iso_raise"] + profile["overlimp"] else "fold")
+        elif raises == 0:
+            action = "raise" if strength < profile["open_raise"] else (
+                "call" if strength < profile["open_raise"] + profile["limp"] else "fold")
+        elif raises == 1:
+            action = "raise" if strength < profile["threebet"] else (
+                "call" if strength < profile["threebet"] + profile["call_open"] else "fold")
+        elif raises == 2:
+            action = "raise" if strength < profile["fourbet"] else (
+                "call" if strength < profile["fourbet"] + profile["call_threebet"] else "fold")
+        else:
+            action = "call" if strength < profile["call_fourbet"] else "fold"
+
+        if action == "raise":
+            if raises == 0:
+                raise_to = int(bb_cents * OPEN_RAISE_BB) + bb_cents * limpers
+            else:
+                raise_to = current_bet * RAISE_MULTIPLIER
+            raise_to = min(raise_to, bb_cents * STACK_BB)
+            lines.append(f"{name}: raises {_money(raise_to - current_bet)} to {_money(raise_to)}")
+            committed[name] = current_bet = raise_to
+            raises += 1
+            aggressor = name
+            # レイザー以外のまだ降りていないプレイヤーがもう一度アクションする
+            start = order.index(name)
+            to_act = deque(p for p in order[start + 1:] + order[:start] if p not in folded)
+        elif action == "call":
+            lines.append(f"{name}: calls {_money(to_call)}")
+            committed[name] = current_bet
+            if raises == 0:
+                limpers += 1
+        elif action == "check":
+            lines.append(f"{name}: checks")
+        else:
+            lines.append(f"{name}: folds")
+            folded.add(name)
+    return lines, committed, folded, aggressor
+
+
+def generate_hand(rng, hand_id, timestamp, seats, button_seat, hero_name, hand_format="pokerstars",
+                  table_name="Aase", table_size=6, stakes=(2, 5), profile=None):
+    """Return the text of one hand.
+
+    seats maps seat number -> player name, stakes is (small blind, big blind)
+    in cents and profile overrides entries of DEFAULT_ACTION_PROFILE.
+    """
+    profile = dict(DEFAULT_ACTION_PROFILE, **(profile or {}))
+    sb_cents, bb_cents = stakes
+    seat_numbers = sorted(seats)
+    # ボタンの左から時計回り (SB, BB, ..., BTN)
+    clockwise = sorted(seat_numbers, key=lambda seat: (seat - button_seat - 1) % (max(seat_numbers) + 1))
+    names = [seats[seat] for seat in clockwise]
+    if len(names) == 2:
+        preflop_order = [names[1], names[0]] # heads-up: button (SB) acts first preflop
+        sb_player, bb_player = names[1], names[0]
+        postflop_order = [names[0], names[1]]
+    else:
+        preflop_order = names[2:] + names[:2]
+        sb_player, bb_player = names[0], names[1]
+        postflop_order = names
+
+    deck = rng.sample(range(52), 2 * len(names) + 5)
+    hole_cards = {name: (deck[2 * i], deck[2 * i + 1]) for i, name in enumerate(names)}
+    board = deck[2 * len(names):]
+    strengths = {name: hand_strength(*cards) for name, cards in hole_cards.items()}
+
+    def cards_text(cards):
+        return " ".join(CARD_NAMES[card] for card in cards)
+
+    stakes_text = f"({_money(sb_cents)}/{_money(bb_cents)})"
+    time_text = timestamp.strftime("%Y/%m/%d %H:%M:%S")
+    if hand_format == "zoom":
+        header = f"PokerStars Zoom Hand #{hand_id}:  Hold'em No Limit {stakes_text} - {time_text} ET"
+    elif hand_format == "poker_hand":
+        header = f"Poker Hand #HD{hand_id}: Hold'em No Limit {stakes_text} - {time_text}"
+    else:
+        header = f"PokerStars Hand #{hand_id}:  Hold'em No Limit {stakes_text} - {time_text} ET"
+    lines = [header, f"Table '{table_name}' {table_size}-max Seat #{button_seat} is the button"]
+    stack_text = _money(bb_cents * STACK_BB)
+    for seat in seat_numbers:
+        lines.append(f"Seat {seat}: {seats[seat]} ({stack_text} in chips)")
+    lines.append(f"{sb_player}: posts small blind {_money(sb_cents)}")
+    lines.append(f"{bb_player}: posts big blind {_money(bb_cents)}")
+    lines.append("*** HOLE CARDS ***")
+    if hero_name in hole_cards:
+        lines.append(f"Dealt to {hero_name} [{cards_text(hole_cards[hero_name])}]")
+
+    preflop_lines, committed, folded, aggressor = _preflop(
+        rng, preflop_order, strengths, profile, sb_cents, bb_cents)
+    lines.extend(preflop_lines)
+    folded_on = {name: "before Flop" for name in folded}
+
+    # フロップ以降: 先頭のプレイヤーがベットし、残りはコールかフォールドだけの簡単なモデル
+    winner = None
+    uncalled = 0
+    streets_dealt = 0
+    remaining = [name for name in postflop_order if name not in folded]
+    if len(remaining) == 1:
+        winner = remaining[0]
+        uncalled = committed[winner] - max(committed[p] for p in names if p != winner)
+    for street, board_cards in (("FLOP", board[:3]), ("TURN", board[:4]), ("RIVER", board[:5])):
+        if winner is not None:
+            break
+        streets_dealt += 1
+        if street == "FLOP":
+            lines.append(f"*** FLOP *** [{cards_text(board_cards)}]")
+        else:
+            lines.append(f"*** {street} *** [{cards_text(board_cards[:-1])}] [{CARD_NAMES[board_cards[-1]]}]")
+        bettor = remaining[0]
+        if rng.random() >= profile["postflop_bet"]:
+            lines.extend(f"{name}: checks" for name in remaining)
+            continue
+        pot = sum(committed.values())
+        bet = max(bb_cents, pot // 2)
+        lines.append(f"{bettor}: bets {_money(bet)}")
+        committed[bettor] += bet
+        callers = []
+        for name in remaining[1:]:
+            if rng.random() < profile["postflop_call"]:
+                lines.append(f"{name}: calls {_money(bet)}")
+                committed[name] += bet
+                callers.append(name)
+            else:
+                lines.append(f"{name}: folds")
+                folded_on[name] = f"on the {street.capitalize()}"
+        remaining = [bettor] + callers
+        if not callers:
+            winner = bettor
+            uncalled = bet
+
+    pot = sum(committed.values()) - uncalled
+    rake = pot * RAKE_PERCENT // 100 if streets_dealt else 0
+    showdown = winner is None
+    if showdown:
+        winner = rng.choice(remaining)
+        lines.append("*** SHOW DOWN ***")
+        for name in remaining:
+            lines.append(f"{name}: shows [{cards_text(hole_cards[name])}]")
+    elif uncalled:
+        lines.append(f"Uncalled bet ({_money(uncalled)}) returned to {winner}")
+    lines.append(f"{winner} collected {_money(pot - rake)} from pot")
+    if not showdown:
+        lines.append(f"{winner}: doesn't show hand")
+
+    lines.append("*** SUMMARY ***")
+    lines.append(f"Total pot {_money(pot)} | Rake {_money(rake)}")
+    if streets_dealt:
+        lines.append(f"Board [{cards_text(board[:2 + streets_dealt])}]")
+    for seat in seat_numbers:
+        name = seats[seat]
+        tag = {names[-1]: " (button)", sb_player: " (small blind)", bb_player: " (big blind)"}.get(name, "")
+        if len(names) == 2 and name == sb_player:
+            tag = " (button) (small blind)"
+        if name == winner and showdown:
+            summary = f"showed [{cards_text(hole_cards[name])}] and won ({_money(pot - rake)})"
+        elif name == winner:
+            summary = f"collected ({_money(pot - rake)})"
+        elif showdown and name in remaining:
+            if rng.random() < profile["muck"]:
+                summary = f"mucked [{cards_text(hole_cards[name])}]"
+            else:
+                summary = f"showed [{cards_text(hole_cards[name])}] and lost"
+        else:
+            summary = f"folded {folded_on.get(name, 'before Flop')}"
+            if committed[name] == 0:
+                summary += " (didn't bet)"
+        lines.append(f"Seat {seat}: {name}{tag} {summary}")
+    return "\n".join(lines) + "\n"
+
+
+# --- ファイルの生成 ---
+
+def _table_session(rng, table_size, hero_name, opponents):
+    seats = list(range(1, table_size + 1))
+    players = [hero_name] + rng.sample(opponents, table_size - 1)
+    rng.shuffle(players)
+    return dict(zip(seats, players))
+
+
+def write_hand_histories(out_dir, total_hands, hands_per_file=2000, hand_format="pokerstars", table_size=6,
+                         hero_name="Hero", seed=0, num_opponents=500, stakes=(2, 5), profile=None,
+                         start_hand_id=200000000000):
+    """Write total_hands hands into out_dir, hands_per_file per file. Returns the file paths.
+
+    Regular formats keep one table (fixed seats, rotating button) per file;
+    "zoom" reseats the table with new opponents every hand.
+    """
+    if hand_format not in HAND_FORMATS:
+        raise ValueError(f"hand_format must be one of {HAND_FORMATS}")
+    if not 2 <= table_size <= 9:
+        raise ValueError("table_size must be between 2 and 9")
+    rng = random.Random(seed)
+    opponents = [f"Player{i:06d}" for i in range(max(num_opponents, table_size - 1))]
+    os.makedirs(out_dir, exist_ok=True)
+    timestamp = datetime(2023, 1, 1, 12, 0, 0)
+    hand_id = start_hand_id
+    filepaths = []
+    file_index = 0
+    while hand_id - start_hand_id < total_hands:
+        count = min(hands_per_file, total_hands - (hand_id - start_hand_id))
+        table_name = f"{rng.choice(TABLE_NAMES)} {file_index + 1}"
+        filepath = os.path.join(out_dir, f"HH{timestamp:%Y%m%d} {table_name} - {hand_format}.txt")
+        seats = _table_session(rng, table_size, hero_name, opponents)
+        button_seat = rng.randint(1, table_size)
+        with open(filepath, "w", encoding="utf-8", newline="\n") as f:
+            for _ in range(count):
+                if hand_format == "zoom":
+                    seats = _table_session(rng, table_size, hero_name, opponents)
+                    button_seat = rng.randint(1, table_size)
+                else:
+                    button_seat = button_seat % table_size + 1
+                f.write(generate_hand(rng, hand_id, timestamp, seats, button_seat, hero_name, hand_format,
+                                      table_name, table_size, stakes, profile))
+                f.write("\n\n")
+                hand_id += 1
+                timestamp += timedelta(seconds=rng.randint(20, 90))
+        filepaths.append(filepath)
+        file_index += 1
+    return filepaths
+
+
+def _parse_profile_overrides(items):
+    profile = {}
+    for item in items or []:
+        key, _, value = item.partition("=")
+        if key not in PROFILE_KEYS:
+            raise ValueError(f"unknown action profile key {key!r} (choose from {', '.join(PROFILE_KEYS)})")
+        profile[key] = float(value)
+    return profile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write deterministic synthetic hand-history files.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--hands", type=int, default=10000)
+    parser.add_argument("--hands-per-file", type=int, default=2000)
+    parser.add_argument("--format", dest="hand_format", choices=HAND_FORMATS, default="pokerstars")
+    parser.add_argument("--table-size", type=int, default=6)
+    parser.add_argument("--hero", default="Hero")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--opponents", type=int, default=500, help="size of the opponent name pool")
+    parser.add_argument("--profile", action="append", metavar="KEY=VALUE",
+                        help="override an action frequency, e.g. open_raise=0.3 (repeatable)")
+    args = parser.parse_args(argv)
+    try:
+        profile = _parse_profile_overrides(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    filepaths = write_hand_histories(args.out_dir, args.hands, args.hands_per_file, args.hand_format,
+                                     args.table_size, args.hero, args.seed, args.opponents, profile=profile)
+    print(f"wrote {args.hands} hands in {len(filepaths)} files to {args.out_dir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
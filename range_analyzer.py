@@ -0,0 +1,3088 @@
+# ハンド履歴の解析エンジン (tkinter に依存しない)
+# gui_analyzer.py からインポートされるほか、単体でもコマンドラインから
+# 複数のディレクトリ/ヒーローをまとめて解析できる:
+#   python range_analyzer.py DIR [DIR ...] [--hero NAME ...] [--output-dir OUT]
+import argparse
+import bz2
+import datetime
+import json
+import os
+import glob
+import gzip
+import hashlib
+import html
+import itertools
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+# utils_judge.py は同じディレクトリにあるか、Pythonのパスが通っている必要がある
+from utils_judge import (
+    extract_preflop_actions,
+    get_first_raise_info,
+    had_opportunity_to_open
+)
+
+# 圧縮・アーカイブされた履歴も展開せずにそのまま読む (.zip は中の *.txt をすべて読む)
+HAND_HISTORY_PATTERNS = ("*.txt", "*.gz", "*.bz2", "*.zip")
+COMPRESSED_OPENERS = {".gz": gzip.open, ".bz2": bz2.open}
+ARCHIVE_EXTENSIONS = (".gz", ".bz2", ".zip") # 追記されない (ライブ追跡では新しいファイルとしてだけ読む)
+# 壊れた・途中で切れたアーカイブを読んだときの例外
+ARCHIVE_READ_ERRORS = (OSError, EOFError, zipfile.BadZipFile, zlib.error)
+
+
+def list_hand_history_files(history_dir, patterns=HAND_HISTORY_PATTERNS):
+    filepaths = set()
+    for pattern in patterns:
+        filepaths.update(glob.glob(os.path.join(history_dir, pattern)))
+    return sorted(filepaths)
+
+
+def iter_hand_history_streams(filepath):
+    """Yield a binary stream for each hand-history text in filepath.
+
+    Plain files give one stream, .gz/.bz2 one decompressing stream, and .zip
+    one stream per *.txt member, all read without extracting to disk.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension == ".zip":
+        with zipfile.ZipFile(filepath) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or not member.filename.lower().endswith(".txt"):
+                    continue
+                with archive.open(member) as stream:
+                    yield stream
+        return
+    with COMPRESSED_OPENERS.get(extension, open)(filepath, 'rb') as stream:
+        yield stream
+
+
+# --- ヒーロー名の自動検出 ---
+# まず各ファイルの先頭だけを並列に読んで "Dealt to" を数え、1人が統計的に
+# はっきり多ければそこで打ち切る。決まらないときだけ全ファイルを全行読む。
+DEALT_TO_REGEX = re.compile(rb"Dealt to (.+?) \[(?:.. ?)+\]") # "[Ah Kd]" のように2枚以上並ぶ
+HERO_SAMPLE_BYTES = 64 * 1024 # ファイルごとに読む先頭バイト数
+HERO_SAMPLE_MAX_FILES = 200 # サンプルするファイル数の上限 (フォルダ全体から均等に選ぶ)
+HERO_DETECT_THREADS = 8
+HERO_MIN_SAMPLE_HANDS = 20
+HERO_DOMINANCE_Z = 4.0 # 1位と2位の差がこの標準偏差分あれば確定
+
+
+def _count_dealt_to_names(filepath, max_bytes=None):
+    """Count "Dealt to" names in a file, reading at most max_bytes from its head."""
+    player_counts = Counter()
+    try:
+        for stream in iter_hand_history_streams(filepath):
+            if max_bytes is None:
+                lines = stream # 全体を読むときも1行ずつ (メモリはファイルサイズに依存しない)
+            else:
+                head = stream.read(max_bytes)
+                if len(head) == max_bytes:
+                    head = head[:head.rfind(b"\n") + 1] # 途中で切れた最終行は捨てる
+                lines = head.splitlines()
+            for line in lines:
+                if b"Dealt to " not in line:
+                    continue
+                match = DEALT_TO_REGEX.search(line)
+                if match:
+                    player_name = match.group(1).decode('utf-8', errors='replace').strip()
+                    if player_name.endswith(" (observer)"):
+                        player_name = player_name[:-11].strip()
+                    if player_name:
+                        player_counts[player_name] += 1
+            if max_bytes is not None:
+                break # サンプル時はアーカイブの先頭のメンバーだけを見る
+    except ARCHIVE_READ_ERRORS:
+        pass
+    return player_counts
+
+
+def _hero_is_clear(player_counts):
+    # 1位と2位の "Dealt to" 回数を二項検定 (符号検定) の正規近似で比べる
+    top = player_counts.most_common(2)
+    if not top:
+        return False
+    first = top[0][1]
+    second = top[1][1] if len(top) > 1 else 0
+    if first + second < HERO_MIN_SAMPLE_HANDS:
+        return False
+    return first - second > HERO_DOMINANCE_Z * (first + second) ** 0.5
+
+
+def _pick_hero_name(player_counts):
+    sorted_players = player_counts.most_common()
+    if not sorted_players: return None
+    
+    most_common_name, _ = sorted_players[0]
+    if most_common_name.upper() == "HERO": # "HERO" (大文字・小文字問わず) が最も一般的であれば、それを優先
+        for name, _ in sorted_players:
+            if name.upper() == "HERO":
+                return name
+    return most_common_name
+
+
+def _sample_filepaths(filepaths, max_files):
+    if len(filepaths) <= max_files:
+        return filepaths
+    step = len(filepaths) / max_files
+    return [filepaths[int(i * step)] for i in range(max_files)]
+
+
+def _count_names_in_files(filepaths, max_bytes, stop_early):
+    player_counts = Counter()
+    if not filepaths:
+        return player_counts
+    executor = ThreadPoolExecutor(max_workers=min(HERO_DETECT_THREADS, len(filepaths)))
+    try:
+        futures = [executor.submit(_count_dealt_to_names, fp, max_bytes) for fp in filepaths]
+        for future in as_completed(futures):
+            player_counts.update(future.result())
+            if stop_early and _hero_is_clear(player_counts):
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return player_counts
+
+
+def detect_hero_from_files(history_dir):
+    # GUI からは UIスレッドで呼ばずにスレッドで実行する
+    filepaths = list_hand_history_files(history_dir)
+    if not filepaths: return None # ファイルが見つからなかった場合
+
+    player_counts = _count_names_in_files(
+        _sample_filepaths(filepaths, HERO_SAMPLE_MAX_FILES), HERO_SAMPLE_BYTES, stop_early=True)
+    if not _hero_is_clear(player_counts):
+        # サンプルでは決まらない (ハンドが少ない・複数アカウントが混在) ので全行を数える
+        player_counts = _count_names_in_files(filepaths, None, stop_early=False)
+    return _pick_hero_name(player_counts)
+
+
+HAND_DELIMITERS = ("PokerStars Zoom Hand #", "PokerStars Hand #", "Poker Hand #")
+_HAND_DELIMITER_BYTES = tuple((delimiter, delimiter.encode('utf-8')) for delimiter in HAND_DELIMITERS)
+
+
+def detect_hand_delimiter(content):
+    # content は先頭部分の生のバイト列 (デコードせずに探す)
+    for delimiter, delimiter_bytes in _HAND_DELIMITER_BYTES:
+        if delimiter_bytes in content:
+            return delimiter
+    return None
+
+
+# 区切りの判定はファイル先頭のこのバイト数だけを見る
+HEADER_SNIFF_BYTES = 64 * 1024
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+# 1ハンドごとに順に試すエンコーディング (latin-1 は必ずデコードできる)。
+# UTF-8 とレガシーな Windows 向けクライアントの履歴が混在していても、ハンドを捨てずに読む。
+HAND_TEXT_ENCODINGS = ("utf-8", "cp1252", "latin-1")
+
+
+def _decode_hand_bytes(hand_bytes):
+    # テキストモードで開いた場合と同じく改行を "\n" に揃える
+    for encoding in HAND_TEXT_ENCODINGS:
+        try:
+            hand_text = hand_bytes.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    return hand_text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def iter_hand_spans_from_stream(stream):
+    """Yield (offset, raw bytes) of each hand read from a binary stream.
+
+    The delimiter is sniffed from the first HEADER_SNIFF_BYTES only, then the
+    stream is read in READ_CHUNK_BYTES chunks, so peak memory is bounded by one
+    chunk plus the longest hand regardless of the file size. offset is the
+    position of the hand in the (decompressed) stream. A stream with no
+    delimiter in its first HEADER_SNIFF_BYTES is one hand if it ends there and
+    yields nothing otherwise.
+    """
+    buf = stream.read(HEADER_SNIFF_BYTES)
+    delimiter = detect_hand_delimiter(buf)
+    if delimiter is None:
+        # 区切りが無い短いファイルは全体を1ハンドとして扱う。先頭を読んでも区切りが
+        # 見つからない大きいファイルはハンド履歴ではないので、残りを読まずに飛ばす
+        if not stream.read(1):
+            yield 0, buf
+        return
+
+    delimiter_bytes = delimiter.encode('utf-8')
+    base = 0 # buf[0] のストリーム上の位置
+    pos = buf.find(delimiter_bytes) # 先頭のゴミ (BOM など) は読み飛ばす
+    while True:
+        end = buf.find(delimiter_bytes, pos + len(delimiter_bytes))
+        if end != -1:
+            yield base + pos, buf[pos:end]
+            pos = end
+            continue
+        chunk = stream.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        base += pos
+        buf = buf[pos:] + chunk
+        pos = 0
+    if pos < len(buf):
+        yield base + pos, buf[pos:]
+
+
+def iter_hand_bytes_from_stream(stream):
+    """Yield the raw bytes of each hand read from a binary stream (see iter_hand_spans_from_stream)."""
+    for _, hand_bytes in iter_hand_spans_from_stream(stream):
+        yield hand_bytes
+
+
+def iter_located_hands(filepath, skip_ids=None, profile=None):
+    """Yield ((member, offset, length), hand_bytes) for each hand of a hand-history file.
+
+    member counts the streams of iter_hand_history_streams (always 0 except in
+    .zip archives) and offset/length are in bytes of that stream, so the hand
+    can be read back later with read_located_hand_texts. Hands are not decoded
+    here; tokenize_hand decodes only what it needs, per hand.
+    With skip_ids (hand-ID keys, see hand_id_key) those hands and repeats of a
+    hand within this file are dropped. With a StageProfile, reading and
+    splitting are timed as "read" and "split".
+    """
+    seen_ids = None if skip_ids is None else set(np.asarray(skip_ids, dtype=np.uint64).tolist())
+    try:
+        for member, stream in enumerate(iter_hand_history_streams(filepath)):
+            if profile is None:
+                hand_spans = iter_hand_spans_from_stream(stream)
+            else:
+                hand_spans = _timed_hand_spans(iter_hand_spans_from_stream(_TimedStream(stream, profile)), profile)
+            for offset, hand_bytes in hand_spans:
+                if seen_ids is not None:
+                    hand_id = hand_id_key(hand_bytes)
+                    if hand_id is not None:
+                        if hand_id in seen_ids:
+                            continue
+                        seen_ids.add(hand_id)
+                if _has_hand_body(hand_bytes):
+                    yield (member, offset, len(hand_bytes)), hand_bytes
+    except ARCHIVE_READ_ERRORS:
+        return # 読めないファイル (壊れたアーカイブを含む) は読めたところまでで終了
+
+
+def iter_hand_texts_from_file(filepath, skip_ids=None):
+    """Yield the hands of a hand-history file (plain, .gz, .bz2 or .zip) one at a time, decoded."""
+    for _, hand_bytes in iter_located_hands(filepath, skip_ids):
+        yield _decode_hand_bytes(hand_bytes)
+
+
+def _has_hand_body(hand_bytes):
+    # 区切り文字だけで中身の無い断片はハンドとして数えない
+    for _, delimiter_bytes in _HAND_DELIMITER_BYTES:
+        if hand_bytes.startswith(delimiter_bytes):
+            return bool(hand_bytes[len(delimiter_bytes):].strip())
+    return bool(hand_bytes.strip())
+
+
+def parse_hand_history_file(filepath, hero_name, skip_ids=None):
+    for _, hand_bytes in iter_located_hands(filepath, skip_ids):
+        parsed_hand = parse_hand(hand_bytes, hero_name)
+        if parsed_hand is not None:
+            yield parsed_hand
+
+
+# --- ハンドクラス (整数コード) ---
+
+RANKS = ['A', 'K', 'Q', 'J', 'T', '9', '8', '7', '6', '5', '4', '3', '2']
+SUITS = ['s', 'h', 'd', 'c']
+
+
+def _hand_class_name(r, c):
+    # 13x13 表の行 r, 列 c のハンド (右上がスーテッド、左下がオフスート)
+    if r == c: return RANKS[r] + RANKS[c]
+    if r < c: return RANKS[r] + RANKS[c] + 's'
+    return RANKS[c] + RANKS[r] + 'o'
+
+
+# ハンドクラス番号 = 行 * 13 + 列 (表示用の 13x13 表と同じ並び)。
+# 解析・集計は番号だけで行い、文字列は表示するときにだけ使う。
+HAND_CLASS_NAMES = [_hand_class_name(r, c) for r in range(13) for c in range(13)]
+HAND_CLASS_INDEX = {name: i for i, name in enumerate(HAND_CLASS_NAMES)}
+NUM_HAND_CLASSES = len(HAND_CLASS_NAMES)
+
+# カード番号 = ランク * 4 + スート (0..51)
+CARD_NAMES = [rank + suit for rank in RANKS for suit in SUITS]
+
+
+def _combo_hand_class(card1, card2):
+    rank1, suit1 = divmod(card1, 4)
+    rank2, suit2 = divmod(card2, 4)
+    high, low = min(rank1, rank2), max(rank1, rank2)
+    if high == low or suit1 != suit2:
+        return low * 13 + high # ペアは対角線、オフスートは左下
+    return high * 13 + low # スーテッドは右上
+
+
+# 52x52 のカード組 -> ハンドクラス (同じカード同士は -1)。1326 通りの組み合わせを網羅する。
+COMBO_HAND_CLASS = np.full((52, 52), -1, dtype=np.int16)
+# "Dealt to" 行の角括弧の中身 (b"Ah Kd" など、デコードしないバイト列) -> ハンドクラス。1回の dict 参照で済む。
+HOLE_CARDS_HAND_CLASS = {}
+for _card1 in range(52):
+    for _card2 in range(52):
+        if _card1 != _card2:
+            COMBO_HAND_CLASS[_card1, _card2] = _combo_hand_class(_card1, _card2)
+            HOLE_CARDS_HAND_CLASS[(CARD_NAMES[_card1] + " " + CARD_NAMES[_card2]).encode('ascii')] = \
+                int(COMBO_HAND_CLASS[_card1, _card2])
+del _card1, _card2
+
+
+# --- 1ハンドの字句解析 (1回の走査でハンドレコードを作る) ---
+
+# ハンドはバイト列のまま行に分けて、あらかじめコンパイルしたバイト列のパターンで読む。
+# デコードするのはプレイヤー名と (utils_judge に渡す) プリフロップの行だけ。
+
+
+class HandFormat:
+    """Precompiled byte-level patterns for one site's hand-history layout.
+
+    tokenize_hand picks the format from the hand's first line (see
+    sniff_hand_format); a site whose layout differs only needs its own
+    HandFormat in HAND_FORMATS. Line patterns start with "\n" rather than a
+    MULTILINE "^" so the regex engine can jump to the literal (the first line
+    of a hand is always its header).
+    """
+
+    __slots__ = ("name", "header_prefixes", "seat_line_regex", "button_seat_regex", "hole_cards_marker",
+                 "dealt_to_prefix", "preflop_end_markers", "shown_cards_regex", "sitting_out_marker",
+                 "timestamp_regex", "stakes_regex", "table_size_regex")
+
+    def __init__(self, name, header_prefixes,
+                 seat_line_regex=rb"\nSeat (\d+): (.+) \(([^()]*\d[^()]*)\)(.*)",
+                 button_seat_regex=rb"Seat #(\d+) is the button",
+                 hole_cards_marker=b"*** HOLE CARDS ***",
+                 dealt_to_prefix=b"Dealt to ",
+                 preflop_end_markers=(b"*** FLOP ***", b"*** SUMMARY ***", b"*** TURN ***", b"*** RIVER ***"),
+                 # サマリーの "Seat 3: Villain (button) showed [Ah Kd] and won ..." / "mucked [..]"
+                 shown_cards_regex=rb"\nSeat (\d+): .* (?:showed|mucked) \[([^\]]+)\]",
+                 sitting_out_marker=b"sitting out",
+                 # ヘッダの最初の日時 "2023/07/13 12:00:00" (サイトの表示時刻のまま、タイムゾーンは無視)
+                 timestamp_regex=rb"(\d{4})/(\d{1,2})/(\d{1,2}) (\d{1,2}):(\d{2}):(\d{2})",
+                 # "($0.02/$0.05)" / "(€0.05/€0.10 EUR)" / トーナメントの "Level I (10/20)"
+                 stakes_regex=rb"\([^\d/()]*([\d.,]+)/[^\d/()]*([\d.,]+)[^()]*\)",
+                 table_size_regex=rb"(\d+)-max"):
+        self.name = name
+        self.header_prefixes = header_prefixes
+        self.seat_line_regex = re.compile(seat_line_regex)
+        self.button_seat_regex = re.compile(button_seat_regex)
+        self.hole_cards_marker = hole_cards_marker
+        self.dealt_to_prefix = dealt_to_prefix
+        self.preflop_end_markers = preflop_end_markers
+        self.shown_cards_regex = re.compile(shown_cards_regex)
+        self.sitting_out_marker = sitting_out_marker
+        self.timestamp_regex = re.compile(timestamp_regex)
+        self.stakes_regex = re.compile(stakes_regex)
+        self.table_size_regex = re.compile(table_size_regex)
+
+
+# 現在対応している2つのサイトは席・ボタン・配札の行が同じ書式なので既定のパターンを共有する
+POKERSTARS_FORMAT = HandFormat("pokerstars", (b"PokerStars Zoom Hand #", b"PokerStars Hand #"))
+GGPOKER_FORMAT = HandFormat("ggpoker", (b"Poker Hand #",))
+HAND_FORMATS = (POKERSTARS_FORMAT, GGPOKER_FORMAT)
+HAND_HEADER_MAX_BYTES = 512 # 席の行が無いハンドでヘッダとして見る長さ
+_HAND_FORMAT_PREFIXES = tuple((prefix, hand_format) for hand_format in HAND_FORMATS
+                              for prefix in hand_format.header_prefixes)
+
+
+def sniff_hand_format(hand_bytes):
+    """Return the HandFormat whose header starts hand_bytes (PokerStars when none matches)."""
+    for prefix, hand_format in _HAND_FORMAT_PREFIXES:
+        if hand_bytes.startswith(prefix):
+            return hand_format
+    return POKERSTARS_FORMAT
+
+
+# ボタンから時計回りに逆順に割り当てるポジション名 (BTN の右隣から CO, HJ, UTG)。
+# 7人以上のテーブルでそれより前の席は "Other" になる。
+POSITIONS_BEFORE_BUTTON = ("CO", "HJ", "UTG")
+
+
+def assign_positions(seats, button_seat):
+    """Map player name -> position ("UTG", "HJ", "CO", "BTN", "SB", "BB") from the seat map."""
+    if button_seat is None or len(seats) < 2:
+        return {}
+    # Seats clockwise starting left of the button; the button (if seated) is last
+    modulus = max(max(seats), button_seat) + 1
+    order = sorted(seats, key=lambda seat: (seat - button_seat - 1) % modulus)
+    names = [seats[seat] for seat in order]
+    if len(names) == 2:
+        # Heads-up: the button posts the small blind
+        return {names[0]: "BB", names[1]: "SB"} if order[1] == button_seat else {names[0]: "SB", names[1]: "BB"}
+
+    positions = {names[0]: "SB", names[1]: "BB"}
+    rest = names[2:]
+    if order[-1] == button_seat:
+        positions[rest.pop()] = "BTN"
+    for position in POSITIONS_BEFORE_BUTTON:
+        if not rest:
+            break
+        positions[rest.pop()] = position
+    return positions
+
+
+class HandRecord:
+    """What the range analysis needs from one hand, collected in a single scan of its text.
+
+    Positions, BB defense and the open/first-raise questions are answered from
+    this record instead of rescanning the hand text for every check.
+    """
+
+    __slots__ = ("seats", "button_seat", "positions", "hero_hand_class", "preflop_actions", "shown_hand_classes",
+                 "_first_raise_info", "_profile")
+
+    def __init__(self, seats, button_seat, hero_hand_class, preflop_actions, shown_hand_classes=None, profile=None):
+        self._profile = profile # StageProfile (計測しないときは None)
+        self.seats = seats
+        self.button_seat = button_seat
+        self.positions = _call_timed(profile, "positions", assign_positions, seats, button_seat)
+        self.hero_hand_class = hero_hand_class # 0..168, or None if the hero's cards are unknown
+        self.preflop_actions = preflop_actions
+        self.shown_hand_classes = shown_hand_classes or {} # player name -> hand class shown at showdown
+        self._first_raise_info = None
+
+    def position_of(self, player_name):
+        return self.positions.get(player_name, "Other")
+
+    def first_raise_info(self):
+        if self._first_raise_info is None:
+            self._first_raise_info = _call_timed(self._profile, "utils_judge.get_first_raise_info",
+                                                 get_first_raise_info, self.preflop_actions)
+        return self._first_raise_info
+
+    def had_opportunity_to_open(self, player_name):
+        return _call_timed(self._profile, "utils_judge.had_opportunity_to_open",
+                           had_opportunity_to_open, self.preflop_actions, player_name)
+
+    def bb_defense(self, player_name):
+        """Return (action, opener_position) for the BB facing an open raise, else (None, None).
+
+        action is the player's first action after the open raise ("call",
+        "raise" or "fold"), or None if they never acted.
+        """
+        if self.position_of(player_name) != "BB":
+            return None, None
+        first_raiser, first_raise_idx, is_open_raise = self.first_raise_info()
+        if not first_raiser or not is_open_raise or first_raiser == player_name:
+            return None, None
+        opener_position = self.position_of(first_raiser)
+        for player, action in self.preflop_actions[first_raise_idx + 1:]:
+            if player == player_name:
+                return action, opener_position
+        return None, opener_position
+
+    def spot_actions(self, player_name):
+        """Return the spots player_name faced this hand as (kind, position, vs_position, action) tuples.
+
+        kind/position/vs_position index a RangeMatrix; action is "raise",
+        "call" or "fold", or None when only the opportunity is counted.
+        """
+        position = self.position_of(player_name)
+        if position == "Other" or not self.preflop_actions:
+            return []
+        spots = []
+
+        # Open Range (BB can't open raise usually)
+        if position != "BB" and self.had_opportunity_to_open(player_name):
+            first_raiser, _, is_open_raise = self.first_raise_info()
+            action = None
+            if first_raiser == player_name and is_open_raise:
+                action = "raise"
+            else:
+                for player, action_type in self.preflop_actions:
+                    if player == player_name:
+                        if action_type in ("fold", "call"): # call = limp
+                            action = action_type
+                        break
+            spots.append(("open", position, None, action))
+
+        # BB Defense: counted only when the BB actually acted after the open raise
+        if position == "BB":
+            action, vs_position = _call_timed(self._profile, "bb_defense", self.bb_defense, player_name)
+            if vs_position and vs_position != "Other" and action:
+                spots.append(("bb_defense", "BB", vs_position, action if action in ("call", "raise", "fold") else None))
+
+        # 3bet Range: there was a raise before the player's first action (i.e., not an open spot)
+        first_action_idx = -1
+        for i, (player, _) in enumerate(self.preflop_actions):
+            if player == player_name:
+                first_action_idx = i
+                break
+        if first_action_idx > 0:
+            prior_raises = [j for j in range(first_action_idx) if self.preflop_actions[j][1] == 'raise']
+            if prior_raises:
+                action = self.preflop_actions[first_action_idx][1]
+                if action not in ("raise", "call", "fold"):
+                    action = None
+                spots.append(("threebet", position, None, action))
+                # vs-position breakdown against the last raise before the player acts
+                vs_position = self.position_of(self.preflop_actions[max(prior_raises)][0])
+                if vs_position != "Other":
+                    spots.append(("threebet", position, vs_position, action))
+        return spots
+
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def read_hand_header(hand_bytes, hand_format=None):
+    """Return (timestamp, big_blind, table_size) from a hand's header lines; 0 where unknown.
+
+    timestamp is seconds since 1970 of the first date in the header, taken as
+    UTC (the site's clock, no time-zone conversion); big_blind is in
+    hundredths of the stake unit (cents, or tournament chips x 100).
+    """
+    hand_format = hand_format or sniff_hand_format(hand_bytes)
+    header_end = hand_bytes.find(b"\nSeat ")
+    header = hand_bytes[:header_end] if header_end != -1 else hand_bytes[:HAND_HEADER_MAX_BYTES]
+
+    timestamp = 0
+    match = hand_format.timestamp_regex.search(header)
+    if match:
+        year, month, day, hour, minute, second = map(int, match.groups())
+        try:
+            days = datetime.date(year, month, day).toordinal() - _EPOCH_ORDINAL
+            timestamp = max(0, days * 86400 + hour * 3600 + minute * 60 + second)
+        except ValueError:
+            pass
+    big_blind = 0
+    match = hand_format.stakes_regex.search(header)
+    if match:
+        try:
+            big_blind = int(round(float(match.group(2).replace(b",", b"")) * 100))
+        except ValueError:
+            pass
+    match = hand_format.table_size_regex.search(header)
+    table_size = int(match.group(1)) if match else 0
+    return timestamp, big_blind, table_size
+
+
+def tokenize_hand(hand, hero_name, collect_showdowns=False, profile=None):
+    """Scan one hand (raw bytes, or text from the live tail) into a HandRecord.
+
+    hero_name may be None (no hero cards). With collect_showdowns the scan
+    continues into the summary to record every shown or mucked hand.
+    With a StageProfile the record times its stages into it.
+    Player names are decoded with the first of HAND_TEXT_ENCODINGS that
+    decodes all of them, so one badly encoded hand does not affect the rest.
+    """
+    if isinstance(hand, str):
+        hand = hand.encode('utf-8')
+    if b"\r" in hand:
+        hand = hand.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    hand_format = sniff_hand_format(hand)
+    for encoding in HAND_TEXT_ENCODINGS:
+        try:
+            return _tokenize_hand_bytes(hand, hand_format, hero_name, collect_showdowns, encoding, profile)
+        except UnicodeDecodeError:
+            continue
+
+
+def _tokenize_hand_bytes(hand_bytes, hand_format, hero_name, collect_showdowns, encoding, profile=None):
+    # 行ごとのループではなく、セクション (席/プリフロップ/サマリー) を find で切り出して
+    # それぞれにパターンを1回ずつ適用する
+    hole_cards_start = hand_bytes.find(hand_format.hole_cards_marker)
+    header = hand_bytes if hole_cards_start == -1 else hand_bytes[:hole_cards_start]
+
+    seats = {}
+    for seat, name, _, rest in hand_format.seat_line_regex.findall(header):
+        if hand_format.sitting_out_marker not in rest:
+            seats[int(seat)] = name.decode(encoding)
+    match = hand_format.button_seat_regex.search(header)
+    button_seat = int(match.group(1)) if match else None
+
+    hero_hand_class = None
+    preflop_actions = []
+    shown_hand_classes = {}
+    if hole_cards_start != -1:
+        preflop_start = hand_bytes.find(b"\n", hole_cards_start) + 1 or len(hand_bytes)
+        preflop_end = len(hand_bytes)
+        for marker in hand_format.preflop_end_markers:
+            marker_start = hand_bytes.find(b"\n" + marker, preflop_start - 1)
+            if marker_start != -1 and marker_start < preflop_end:
+                preflop_end = marker_start
+        preflop = hand_bytes[preflop_start:preflop_end]
+
+        if hero_name:
+            hero_hand_class = _find_hero_hand_class(preflop, hand_format, hero_name, encoding)
+        preflop_lines = [line for line in preflop.decode(encoding).splitlines() if line.strip()]
+        if preflop_lines:
+            preflop_actions = _call_timed(profile, "utils_judge.extract_preflop_actions",
+                                          extract_preflop_actions, preflop_lines)
+
+        if collect_showdowns and preflop_end < len(hand_bytes):
+            for seat, cards in hand_format.shown_cards_regex.findall(hand_bytes, preflop_end):
+                seat = int(seat)
+                hand_class = HOLE_CARDS_HAND_CLASS.get(cards)
+                if seat in seats and hand_class is not None:
+                    shown_hand_classes[seats[seat]] = hand_class
+
+    return HandRecord(seats, button_seat, hero_hand_class, preflop_actions, shown_hand_classes, profile)
+
+
+def _find_hero_hand_class(preflop, hand_format, hero_name, encoding):
+    # "Dealt to Hero [Ah Kd]" (行頭のものだけ)
+    try:
+        prefix = hand_format.dealt_to_prefix + hero_name.encode(encoding) + b" ["
+    except UnicodeEncodeError:
+        return None # この文字コードでは書けない名前なので、このハンドにヒーローはいない
+    pos = preflop.find(prefix)
+    while pos > 0 and preflop[pos - 1] != 0x0A: # 0x0A = b"\n"
+        pos = preflop.find(prefix, pos + 1)
+    if pos == -1:
+        return None
+    cards_start = pos + len(prefix)
+    return HOLE_CARDS_HAND_CLASS.get(preflop[cards_start:preflop.find(b"]", cards_start)])
+
+
+def parse_hand(hand, hero_name, profile=None):
+    """Return {"hand", "position", "spots"} for the hero in one hand, or None if the hero has no spot in it.
+
+    hand is the raw bytes of the hand or its text (see tokenize_hand).
+    """
+    record = _call_timed(profile, "tokenize", tokenize_hand, hand, hero_name, False, profile)
+    hand_class = record.hero_hand_class
+    if hand_class is None: return None
+    hero_position = record.position_of(hero_name)
+    if hero_position == "Other": return None
+    if not record.preflop_actions: return None
+
+    return {
+        "hand": hand_class, "position": hero_position, # hand: hand-class index (0..168)
+        # (kind, position, vs_position, action) for open / BB defense / 3bet
+        "spots": _call_timed(profile, "classify", record.spot_actions, hero_name),
+    }
+
+
+def parse_hand_texts(hand_texts_to_process, hero_name):
+    for current_hand_text in hand_texts_to_process:
+        parsed_hand = parse_hand(current_hand_text, hero_name)
+        if parsed_hand is not None:
+            yield parsed_hand
+
+# --- レンジ行列 (NumPy) ---
+
+POSITIONS = ["UTG", "HJ", "CO", "BTN", "SB", "BB"]
+POSITION_INDEX = {pos: i for i, pos in enumerate(POSITIONS)}
+# 相手ポジションの軸は POSITIONS + 「相手なし」(オープンや相手別でない 3bet 集計)
+VS_NONE = len(POSITIONS)
+SPOT_KINDS = ["open", "bb_defense", "threebet"]
+SPOT_KIND_INDEX = {kind: i for i, kind in enumerate(SPOT_KINDS)}
+# open では "call" がリンプ、threebet では "call" がコールドコール
+RANGE_ACTIONS = ["opportunity", "raise", "call", "fold"]
+RANGE_ACTION_INDEX = {action: i for i, action in enumerate(RANGE_ACTIONS)}
+
+RANGE_MATRIX_SHAPE = (len(SPOT_KINDS), len(POSITIONS), len(POSITIONS) + 1, len(RANGE_ACTIONS), NUM_HAND_CLASSES)
+RANGE_MATRIX_MAGIC = b"PRM"
+RANGE_MATRIX_FORMAT_VERSION = 1
+
+
+def _vs_index(vs_position):
+    return VS_NONE if vs_position is None else POSITION_INDEX[vs_position]
+
+
+class RangeMatrix:
+    """Hand-class counts for every spot in one fixed-shape integer array.
+
+    Axes: spot kind x hero position x vs-position (+ "none") x action x 169
+    hand classes. Merging partial results is a single array addition, and the
+    array (de)serializes to compact zlib-compressed bytes, which is also how
+    it is pickled between worker processes.
+    """
+
+    def __init__(self, counts=None):
+        if counts is None:
+            counts = np.zeros(RANGE_MATRIX_SHAPE, dtype=np.int32)
+        elif counts.shape != RANGE_MATRIX_SHAPE:
+            raise ValueError(f"RangeMatrix counts must have shape {RANGE_MATRIX_SHAPE}, got {counts.shape}")
+        self.counts = counts
+
+    def add(self, kind, position, vs_position, action, hand_class, n=1):
+        self.counts[SPOT_KIND_INDEX[kind], POSITION_INDEX[position], _vs_index(vs_position),
+                    RANGE_ACTION_INDEX[action], hand_class] += n
+
+    def merge(self, other):
+        self.counts += other.counts
+        return self
+
+    def __add__(self, other):
+        return RangeMatrix(self.counts + other.counts)
+
+    def __eq__(self, other):
+        return isinstance(other, RangeMatrix) and np.array_equal(self.counts, other.counts)
+
+    def total_hands(self):
+        return int(self.counts[:, :, :, RANGE_ACTION_INDEX["opportunity"]].sum())
+
+    def grid(self, kind, position, vs_position=None, action="opportunity"):
+        """169 counts for one spot and action (a view; do not modify)."""
+        return self.counts[SPOT_KIND_INDEX[kind], POSITION_INDEX[position], _vs_index(vs_position),
+                           RANGE_ACTION_INDEX[action]]
+
+    def has_data(self, kind, position, vs_position=None):
+        return bool(self.counts[SPOT_KIND_INDEX[kind], POSITION_INDEX[position], _vs_index(vs_position)].any())
+
+    def vs_positions_with_opportunities(self, kind, position):
+        opportunities = self.counts[SPOT_KIND_INDEX[kind], POSITION_INDEX[position], :VS_NONE,
+                                    RANGE_ACTION_INDEX["opportunity"]]
+        return [POSITIONS[i] for i in np.flatnonzero(opportunities.any(axis=1))]
+
+    def frequencies(self):
+        """Raise/call/fold frequencies over opportunities for every spot and cell at once.
+
+        Returns a float array shaped like counts without the opportunity slot
+        (kind x position x vs-position x [raise, call, fold] x 169); cells
+        without opportunities are 0.
+        """
+        opportunities = self.counts[:, :, :, :1, :]
+        actions = self.counts[:, :, :, 1:, :]
+        return np.divide(actions, opportunities, out=np.zeros(actions.shape), where=opportunities > 0)
+
+    def range_weights(self, kind, position, vs_position=None, actions=("raise",)):
+        """Per-class frequency of the given actions in one spot (169 floats, 0 without opportunities).
+
+        This is the weighted range the equity functions take, e.g. the BTN
+        open range is range_weights("open", "BTN").
+        """
+        opportunities = self.grid(kind, position, vs_position, "opportunity")
+        taken = sum(self.grid(kind, position, vs_position, action) for action in actions)
+        return np.divide(taken, opportunities, out=np.zeros(NUM_HAND_CLASSES), where=opportunities > 0)
+
+    def to_bytes(self):
+        header = RANGE_MATRIX_MAGIC + bytes([RANGE_MATRIX_FORMAT_VERSION])
+        return header + zlib.compress(self.counts.astype('<i4', copy=False).tobytes(), 1)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        if blob[:3] != RANGE_MATRIX_MAGIC or blob[3:4] != bytes([RANGE_MATRIX_FORMAT_VERSION]):
+            raise ValueError("Not a RangeMatrix blob or unsupported format version")
+        try:
+            counts = np.frombuffer(zlib.decompress(blob[4:]), dtype='<i4').astype(np.int32)
+        except zlib.error as e:
+            raise ValueError(f"Truncated or corrupt RangeMatrix blob ({e})") from None
+        if counts.size != np.prod(RANGE_MATRIX_SHAPE):
+            raise ValueError("Truncated or corrupt RangeMatrix blob (wrong number of counts)")
+        return cls(counts.reshape(RANGE_MATRIX_SHAPE))
+
+    def __reduce__(self):
+        return (RangeMatrix.from_bytes, (self.to_bytes(),))
+
+
+# --- スナップショット (集計結果の保存と結合) ---
+# RangeMatrix に解析の出どころ (ハンド数・ファイル数・ヒーロー・ディレクトリ) を付けて1ファイルに保存する。
+# 別々のマシンで解析したシャードを、順番を問わず結合して GUI で開ける。
+
+SNAPSHOT_MAGIC = b"PRS"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_FILE_EXTENSION = ".prs"
+
+
+class RangeSnapshot:
+    """A RangeMatrix plus what it was built from, saved as one versioned blob.
+
+    Merging adds the matrices and hand/file counts and unions the hero names
+    and sources, so it is associative and commutative.
+    """
+
+    def __init__(self, matrix=None, hand_count=0, file_count=0, hero_names=(), sources=()):
+        self.matrix = matrix if matrix is not None else RangeMatrix()
+        self.hand_count = hand_count
+        self.file_count = file_count
+        self.hero_names = frozenset(hero_names)
+        self.sources = frozenset(sources)
+
+    def merge(self, other):
+        self.matrix = self.matrix + other.matrix
+        self.hand_count += other.hand_count
+        self.file_count += other.file_count
+        self.hero_names |= other.hero_names
+        self.sources |= other.sources
+        return self
+
+    def __add__(self, other):
+        return RangeSnapshot(self.matrix, self.hand_count, self.file_count, self.hero_names,
+                             self.sources).merge(other)
+
+    def __eq__(self, other):
+        return (isinstance(other, RangeSnapshot) and self.matrix == other.matrix
+                and (self.hand_count, self.file_count, self.hero_names, self.sources)
+                == (other.hand_count, other.file_count, other.hero_names, other.sources))
+
+    def to_bytes(self):
+        metadata = json.dumps({
+            "hand_count": self.hand_count,
+            "file_count": self.file_count,
+            "hero_names": sorted(self.hero_names),
+            "sources": sorted(self.sources),
+        }, sort_keys=True).encode('utf-8')
+        header = SNAPSHOT_MAGIC + bytes([SNAPSHOT_FORMAT_VERSION]) + struct.pack('<I', len(metadata))
+        return header + metadata + self.matrix.to_bytes()
+
+    @classmethod
+    def from_bytes(cls, blob):
+        if blob[:3] == RANGE_MATRIX_MAGIC:
+            return cls(RangeMatrix.from_bytes(blob)) # メタデータの無い RangeMatrix だけのファイル
+        if blob[:3] != SNAPSHOT_MAGIC or blob[3:4] != bytes([SNAPSHOT_FORMAT_VERSION]):
+            raise ValueError("Not a range snapshot or unsupported format version")
+        # 途中までしかコピーされていないファイルも ValueError にする (呼び出し側は ValueError だけを見る)
+        if len(blob) < 8:
+            raise ValueError("Truncated range snapshot (header)")
+        (metadata_length,) = struct.unpack_from('<I', blob, 4)
+        if len(blob) < 8 + metadata_length:
+            raise ValueError("Truncated range snapshot (metadata)")
+        try:
+            metadata = json.loads(blob[8:8 + metadata_length].decode('utf-8'))
+            return cls(RangeMatrix.from_bytes(blob[8 + metadata_length:]), metadata["hand_count"],
+                       metadata["file_count"], metadata["hero_names"], metadata["sources"])
+        except (IndexError, KeyError, TypeError, struct.error, zlib.error) as e:
+            raise ValueError(f"Truncated or corrupt range snapshot ({e!r})") from None
+
+    def save(self, path):
+        # 書きかけのファイルが残らないように一時ファイルから置き換える
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(self.to_bytes())
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def merge_snapshots(snapshots):
+    merged = RangeSnapshot()
+    for snapshot in snapshots:
+        merged.merge(snapshot)
+    return merged
+
+
+# --- 集計 (ファイル単位の部分集計と並列解析) ---
+
+def add_parsed_hand_to_aggregates(data, parsed_hand, hero_name):
+    hand = parsed_hand["hand"]
+    for kind, position, vs_position, action in parsed_hand["spots"]:
+        data.add(kind, position, vs_position, "opportunity", hand)
+        if action:
+            data.add(kind, position, vs_position, action, hand)
+
+
+# parse_file_aggregates が集計と一緒に返せる付加データ
+HAND_EXTRAS = ("locations", "rows")
+
+
+def parse_file_aggregates(filepath, hero_name, skip_ids=None, extras=(), profile=None):
+    # 1ファイル分の部分集計を返す (ワーカープロセスで実行される)。
+    # extras に "locations" があればドリルダウン用の位置索引 (HandLocations)、"rows" があれば
+    # 列指向のハンド行 (HandRows) を {名前: bytes} にして3つ目の値として付けて返す。
+    # profile (StageProfile) を渡すと段階ごとの時間をそこに加える
+    partial = RangeMatrix()
+    hand_count = 0
+    locations = HandLocations() if "locations" in extras else None
+    rows = HandRows() if "rows" in extras else None
+    for location, hand_bytes in iter_located_hands(filepath, skip_ids, profile):
+        parsed_hand = parse_hand(hand_bytes, hero_name, profile)
+        if parsed_hand is None:
+            continue
+        hand_count += 1
+        _call_timed(profile, "aggregate", add_parsed_hand_to_aggregates, partial, parsed_hand, hero_name)
+        if locations is not None:
+            locations.add(parsed_hand, location)
+        if rows is not None:
+            rows.add(parsed_hand, hand_bytes)
+    if not extras:
+        return partial, hand_count
+    extra_blobs = {}
+    if locations is not None:
+        extra_blobs["locations"] = locations.to_bytes()
+    if rows is not None:
+        extra_blobs["rows"] = rows.to_bytes()
+    return partial, hand_count, extra_blobs
+
+
+def _parse_file_star(task):
+    parse_file, args = task
+    return parse_file(*args)
+
+
+def _iter_parsed_files(parse_file, tasks, workers):
+    # parse_file(*args) をタスク (引数のタプル) ごとに、直列またはプロセスプールで実行する
+    if workers <= 1 or len(tasks) <= 1:
+        for args in tasks:
+            yield parse_file(*args)
+        return
+
+    # Small chunks keep the pool busy without paying IPC per file
+    chunksize = max(1, len(tasks) // (workers * 4))
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield from executor.map(
+            _parse_file_star,
+            ((parse_file, args) for args in tasks),
+            chunksize=chunksize,
+        )
+    finally:
+        # Closing the generator early (e.g. on cancel) drops the queued files
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_file_aggregates(filepaths, hero_name, workers=1, cache=None, profile=None, dedup_index=None,
+                         location_index=None, hand_store=None, cancel_event=None):
+    """Yield (partial_aggregates, hand_count) for each file.
+
+    workers <= 1 parses in this process; otherwise files are spread across a
+    process pool. Either way every file goes through parse_file_aggregates,
+    so merging the partials gives the same result as the serial path.
+    With an AnalysisCache, unchanged files are served from it first and only
+    new or modified files are parsed (and written back to the cache).
+    With a StageProfile, per-stage timings from every worker are added to it.
+    With a HandIdIndex, a hand that also appears in an earlier file (or earlier
+    in the same file) is counted once; see HandIdIndex.duplicate_ids_by_file.
+    With a HandLocationIndex, where each counted hand is in its file is added
+    to it for drill-down; with a HandStore, each counted hand is added to it
+    as rows (one per spot) for filtered views.
+    With a cancel_event (threading.Event), iteration stops once it is set,
+    before the next file's locations and rows are added, so the indexes hold
+    exactly the files that were yielded.
+    """
+    skip_ids_by_file = None
+    if dedup_index is not None:
+        skip_ids_by_file, _ = dedup_index.duplicate_ids_by_file(filepaths, workers)
+    extras = tuple(name for name, target in (("locations", location_index), ("rows", hand_store))
+                   if target is not None)
+
+    def dedup_key(filepath):
+        return "" if skip_ids_by_file is None else dedup_cache_key(skip_ids_by_file[filepath])
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def take_extras(filepath, result):
+        if not extras:
+            return result
+        partial, hand_count, extra_blobs = result
+        if location_index is not None:
+            location_index.add_file(filepath, extra_blobs["locations"])
+        if hand_store is not None:
+            hand_store.add_rows(extra_blobs["rows"])
+        return partial, hand_count
+
+    to_parse = filepaths
+    if cache is not None:
+        to_parse = []
+        for filepath in filepaths:
+            lookup_start = time.perf_counter()
+            cached = cache.get(filepath, hero_name, dedup_key(filepath), extras)
+            if profile is not None:
+                profile.add("cache_lookup", time.perf_counter() - lookup_start)
+            if cached is None:
+                to_parse.append(filepath)
+            elif cancelled():
+                return
+            else:
+                yield take_extras(filepath, cached)
+
+    tasks = [(filepath, hero_name, None if skip_ids_by_file is None else skip_ids_by_file[filepath], extras)
+             for filepath in to_parse]
+    if profile is None:
+        parsed_results = _iter_parsed_files(parse_file_aggregates, tasks, workers)
+    else:
+        parsed_results = _iter_profiled_results(
+            _iter_parsed_files(parse_file_aggregates_profiled, tasks, workers), profile)
+    try:
+        for filepath, result in zip(to_parse, parsed_results):
+            if cache is not None:
+                cache.put(filepath, hero_name, *result, dedup_key=dedup_key(filepath))
+            if cancelled():
+                return
+            yield take_extras(filepath, result)
+    finally:
+        parsed_results.close()
+        if cache is not None:
+            cache.commit()
+
+
+# --- ハンドの位置索引 (ドリルダウン) ---
+# マトリクスのセル (例: BTN の AJo をレイズ) をクリックしたときに該当ハンドを表示するため、
+# (スポットのセル, ハンドクラス) -> (ファイル, ストリーム番号, バイト位置, 長さ) を記録する。
+# ハンドの本文は保持せず、表示するときにその範囲だけをディスクから読み直す。
+
+HAND_LOCATIONS_MAGIC = b"PHL"
+HAND_LOCATIONS_FORMAT_VERSION = 1
+HAND_LOCATION_RECORD_DTYPE = np.dtype([("member", "<u2"), ("offset", "<u8"), ("length", "<u4")])
+
+
+def _location_key(kind, position, vs_position, action, hand_class):
+    return _spot_cell(kind, position, vs_position, action) * NUM_HAND_CLASSES + hand_class
+
+
+class HandLocations:
+    """Where one file's hero hands are, built in the worker that parses the file.
+
+    Records are grouped by (spot cell, hand class) key and serialized as the
+    sorted keys, a count per key and the zlib-compressed records (14 bytes each
+    before compression). A spot without a recorded action is stored under
+    "opportunity".
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._members = []
+        self._offsets = []
+        self._lengths = []
+
+    def add(self, parsed_hand, location):
+        member, offset, length = location
+        for kind, position, vs_position, action in parsed_hand["spots"]:
+            self._keys.append(_location_key(kind, position, vs_position, action or "opportunity", parsed_hand["hand"]))
+            self._members.append(member)
+            self._offsets.append(offset)
+            self._lengths.append(length)
+
+    def to_bytes(self):
+        keys = np.array(self._keys, dtype=np.uint32)
+        order = np.argsort(keys, kind='stable') # 同じキーの中はファイル内の順
+        records = np.empty(len(keys), dtype=HAND_LOCATION_RECORD_DTYPE)
+        records["member"] = np.array(self._members, dtype=np.uint16)[order]
+        records["offset"] = np.array(self._offsets, dtype=np.uint64)[order]
+        records["length"] = np.array(self._lengths, dtype=np.uint32)[order]
+        unique_keys, counts = np.unique(keys[order], return_counts=True)
+        header = struct.pack("<3sBI", HAND_LOCATIONS_MAGIC, HAND_LOCATIONS_FORMAT_VERSION, len(unique_keys))
+        return (header + unique_keys.astype('<u4').tobytes() + counts.astype('<u4').tobytes()
+                + zlib.compress(records.tobytes()))
+
+
+class HandLocationIndex:
+    """HandLocations of every analyzed file, queried by spot and hand class for drill-down.
+
+    Only the per-file keys stay uncompressed; a file's records are decompressed
+    when a query hits one of its keys.
+    """
+
+    def __init__(self):
+        self.filepaths = []
+        self._keys = []
+        self._starts = []
+        self._records = []
+
+    def add_file(self, filepath, locations):
+        magic, version, key_count = struct.unpack_from("<3sBI", locations)
+        if magic != HAND_LOCATIONS_MAGIC or version != HAND_LOCATIONS_FORMAT_VERSION:
+            raise ValueError("not a hand-location blob")
+        offset = struct.calcsize("<3sBI")
+        keys = np.frombuffer(locations, dtype='<u4', count=key_count, offset=offset).astype(np.uint32)
+        counts = np.frombuffer(locations, dtype='<u4', count=key_count, offset=offset + 4 * key_count)
+        if key_count == 0:
+            return
+        self.filepaths.append(filepath)
+        self._keys.append(keys)
+        self._starts.append(np.concatenate(([0], np.cumsum(counts, dtype=np.int64))))
+        self._records.append(bytes(locations[offset + 8 * key_count:]))
+
+    def locate(self, kind, position, vs_position, actions, hand_class):
+        """Return [(filepath, member, offset, length)] of the hands in a spot and hand class, in file order.
+
+        actions is a list of RANGE_ACTIONS; "opportunity" matches every hand in
+        the spot whatever the hero did.
+        """
+        if "opportunity" in actions:
+            actions = RANGE_ACTIONS
+        wanted = np.array(sorted(_location_key(kind, position, vs_position, action, hand_class)
+                                 for action in actions), dtype=np.uint32)
+        locations = []
+        for filepath, keys, starts, blob in zip(self.filepaths, self._keys, self._starts, self._records):
+            indexes = np.searchsorted(keys, wanted)
+            indexes = indexes[indexes < len(keys)]
+            indexes = np.unique(indexes[np.isin(keys[indexes], wanted)])
+            if len(indexes) == 0:
+                continue
+            records = np.frombuffer(zlib.decompress(blob), dtype=HAND_LOCATION_RECORD_DTYPE)
+            found = np.concatenate([records[starts[i]:starts[i + 1]] for i in indexes])
+            found = np.sort(found, order=("member", "offset")) # 複数のアクションをまとめてファイル内の順に
+            locations.extend((filepath, int(member), int(offset), int(length)) for member, offset, length in found)
+        return locations
+
+
+def read_located_hand_texts(locations):
+    """Yield ((filepath, member, offset, length), hand_text) reading only those bytes from disk.
+
+    locations come from HandLocationIndex.locate. A hand that can no longer be
+    read (the file was removed or is corrupt) yields None as its text.
+    """
+    by_file = {}
+    for location in locations:
+        by_file.setdefault(location[0], []).append(location)
+    for filepath, file_locations in by_file.items():
+        texts = {}
+        try:
+            for member, stream in enumerate(iter_hand_history_streams(filepath)):
+                for location in sorted(loc for loc in file_locations if loc[1] == member):
+                    stream.seek(location[2])
+                    texts[location] = _decode_hand_bytes(stream.read(location[3]))
+        except ARCHIVE_READ_ERRORS:
+            pass
+        for location in file_locations:
+            yield location, texts.get(location)
+
+
+# --- 列指向のハンドストア (フィルタ付きの集計) ---
+# ヒーローのスポット1つを1行として、ハンド ID・日時・ステーク・テーブル人数などを列で持つ。
+# スポットの無いハンドも数えたハンドとして1行 (kind = HAND_ROW_NO_SPOT) 持つ。
+# 期間やステークで絞り込んだマトリクスは、テキストを解析し直さずにマスクと bincount で作る。
+
+HAND_ROWS_MAGIC = b"PHR"
+HAND_ROWS_FORMAT_VERSION = 2
+HAND_ROW_NO_SPOT = 255 # kind: スポットの無いハンド (ハンド数にだけ数える)
+HAND_ROW_DTYPE = np.dtype([
+    ("hand_id", "<u8"),     # hand_id_key (0 = 不明)
+    ("timestamp", "<u4"),   # read_hand_header の秒 (0 = 不明)
+    ("big_blind", "<u4"),   # 1/100 単位 (0 = 不明)
+    ("table_size", "u1"),   # "6-max" の 6 (0 = 不明)
+    ("kind", "u1"),         # SPOT_KINDS の番号、HAND_ROW_NO_SPOT = スポットなし
+    ("position", "u1"),     # POSITIONS の番号 (ヒーローのポジション)
+    ("vs_position", "u1"),  # POSITIONS の番号、VS_NONE = 相手なし
+    ("action", "u1"),       # RANGE_ACTIONS の番号、0 = 機会だけ (アクションなし)
+    ("hand_class", "u1"),
+    ("hand_start", "u1"),   # 1 = ハンドの最初の行 (1ハンドの行は連続して並ぶ)
+])
+HAND_STORE_FILE_EXTENSION = ".hands.npy"
+
+
+class HandRows:
+    """One file's counted hands as HAND_ROW_DTYPE rows, built in the worker that parses the file."""
+
+    def __init__(self):
+        self._rows = []
+
+    def add(self, parsed_hand, hand_bytes):
+        hand_id = hand_id_key(hand_bytes) or 0
+        timestamp, big_blind, table_size = read_hand_header(hand_bytes)
+        header = (hand_id, timestamp, big_blind, min(table_size, 255))
+        spots = parsed_hand["spots"]
+        if not spots:
+            self._rows.append(header + (HAND_ROW_NO_SPOT, POSITION_INDEX[parsed_hand["position"]], VS_NONE, 0,
+                                        parsed_hand["hand"], 1))
+        for i, (kind, position, vs_position, action) in enumerate(spots):
+            self._rows.append(header + (SPOT_KIND_INDEX[kind], POSITION_INDEX[position], _vs_index(vs_position),
+                                        RANGE_ACTION_INDEX[action] if action else 0, parsed_hand["hand"],
+                                        int(i == 0)))
+
+    def to_bytes(self):
+        rows = np.array(self._rows, dtype=HAND_ROW_DTYPE)
+        header = struct.pack("<3sBI", HAND_ROWS_MAGIC, HAND_ROWS_FORMAT_VERSION, len(rows))
+        return header + zlib.compress(rows.tobytes(), 1)
+
+    @staticmethod
+    def rows_from_bytes(blob):
+        magic, version, row_count = struct.unpack_from("<3sBI", blob)
+        if magic != HAND_ROWS_MAGIC or version != HAND_ROWS_FORMAT_VERSION:
+            raise ValueError("not a hand-rows blob")
+        rows = np.frombuffer(zlib.decompress(blob[struct.calcsize("<3sBI"):]), dtype=HAND_ROW_DTYPE)
+        if len(rows) != row_count:
+            raise ValueError("truncated hand-rows blob")
+        return rows
+
+
+def _hand_row_counter_keys(rows):
+    # 各行が数える RangeMatrix の位置 (counts を平らにした添字) と、それぞれの元の行番号。
+    # スポットごとに機会を1回、アクションがあればそのアクションも1回数える (スポットの無い行は数えない)
+    spot_rows = np.flatnonzero(rows["kind"] != HAND_ROW_NO_SPOT)
+    if len(spot_rows) < len(rows):
+        counter_keys, row_index = _hand_row_counter_keys(rows[spot_rows])
+        return counter_keys, spot_rows[row_index]
+    spot = (((rows["kind"].astype(np.int64) * RANGE_MATRIX_SHAPE[1] + rows["position"])
+             * RANGE_MATRIX_SHAPE[2] + rows["vs_position"]) * RANGE_MATRIX_SHAPE[3])
+    hand_class = rows["hand_class"]
+    acted = np.flatnonzero(rows["action"] != 0)
+    counter_keys = np.concatenate((spot * NUM_HAND_CLASSES + hand_class,
+                                   (spot[acted] + rows["action"][acted]) * NUM_HAND_CLASSES + hand_class[acted]))
+    return counter_keys, np.concatenate((np.arange(len(rows)), acted))
+
+
+def _selected_hand_starts(rows, mask=None):
+    # mask で選んだ行のうち、それぞれのハンドで最初に選ばれた行の番号
+    # (行はハンドごとに連続しているので、ハンドの通し番号が変わる所を探す)
+    hand_numbers = np.cumsum(rows["hand_start"], dtype=np.int64)
+    selected = np.arange(len(rows)) if mask is None else np.flatnonzero(mask)
+    numbers = hand_numbers[selected]
+    return selected[np.diff(numbers, prepend=np.int64(-1)) != 0]
+
+
+class HandStore:
+    """Every counted hand's hero spots as rows of a NumPy structured array (HAND_ROW_DTYPE).
+
+    Rows arrive per file (add_rows) and are concatenated on the first query.
+    Position and action have precomputed bitmap indexes (packed bits, one
+    per value); the other filters are vectorized comparisons on their
+    column. range_matrix turns any row mask into a RangeMatrix with a single
+    bincount, so a new slice of the data never touches the hand text.
+    """
+
+    def __init__(self, rows=None):
+        self._pending = [] if rows is None else [rows]
+        self._rows = np.zeros(0, dtype=HAND_ROW_DTYPE)
+        self._bitmaps = None
+
+    def add_rows(self, rows):
+        if isinstance(rows, (bytes, bytearray, memoryview)):
+            rows = HandRows.rows_from_bytes(rows)
+        if len(rows):
+            self._pending.append(rows)
+
+    @property
+    def rows(self):
+        if self._pending:
+            # 1つだけならそのまま使う (load した memmap をメモリへコピーしない)
+            parts = ([self._rows] if len(self._rows) else []) + self._pending
+            self._rows = parts[0] if len(parts) == 1 else np.concatenate(parts)
+            self._pending = []
+            self._bitmaps = None
+        return self._rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _bitmap(self, column, value):
+        # {(列名, 値): packbits したビットマップ} は最初の問い合わせで一度に作る
+        rows = self.rows
+        if self._bitmaps is None:
+            self._bitmaps = {}
+            for name, values in (("position", range(len(POSITIONS))), ("action", range(len(RANGE_ACTIONS)))):
+                for v in values:
+                    self._bitmaps[(name, v)] = np.packbits(rows[name] == v)
+        return self._bitmaps[(column, value)]
+
+    def _bitmap_union(self, column, values):
+        packed = np.zeros((len(self.rows) + 7) // 8, dtype=np.uint8)
+        for value in values:
+            packed |= self._bitmap(column, value)
+        return packed
+
+    def mask(self, since=None, until=None, table_sizes=None, big_blinds=None, positions=None, actions=None):
+        """Boolean row mask for the given filters (None = no restriction).
+
+        since/until are timestamps as in read_hand_header (until exclusive),
+        table_sizes and big_blinds are collections of column values, positions
+        are POSITIONS names and actions RANGE_ACTIONS names ("opportunity"
+        selects the spot rows without an action; actions never select the
+        rows of hands without a spot).
+        """
+        rows = self.rows
+        mask = np.ones(len(rows), dtype=bool)
+        if positions is not None or actions is not None:
+            packed = np.full((len(rows) + 7) // 8, 0xFF, dtype=np.uint8)
+            if positions is not None:
+                packed &= self._bitmap_union("position", [POSITION_INDEX[p] for p in positions])
+            if actions is not None:
+                packed &= self._bitmap_union("action", [RANGE_ACTION_INDEX[a] for a in actions])
+            mask &= np.unpackbits(packed, count=len(rows)).astype(bool)
+            if actions is not None:
+                mask &= rows["kind"] != HAND_ROW_NO_SPOT
+        if since is not None:
+            mask &= rows["timestamp"] >= since
+        if until is not None:
+            mask &= rows["timestamp"] < until
+        if table_sizes is not None:
+            mask &= np.isin(rows["table_size"], list(table_sizes))
+        if big_blinds is not None:
+            mask &= np.isin(rows["big_blind"], list(big_blinds))
+        return mask
+
+    def range_matrix(self, mask=None):
+        """RangeMatrix of the selected rows, equal to aggregating those hands from text."""
+        rows = self.rows if mask is None else self.rows[mask]
+        counter_keys, _ = _hand_row_counter_keys(rows)
+        counts = np.bincount(counter_keys, minlength=SPOT_CELLS * NUM_HAND_CLASSES)
+        return RangeMatrix(counts.astype(np.int32).reshape(RANGE_MATRIX_SHAPE))
+
+    def hand_count(self, mask=None):
+        """Number of counted hands with at least one selected row (hands without a spot included)."""
+        if mask is None:
+            return int(np.count_nonzero(self.rows["hand_start"]))
+        return len(_selected_hand_starts(self.rows, mask))
+
+    def distinct(self, column):
+        """Sorted distinct non-zero values of a column (for filter choices)."""
+        values = np.unique(self.rows[column])
+        return [int(v) for v in values if v]
+
+    def time_buckets(self, bucket="day"):
+        """Sorted start timestamps of the "day" or "session" buckets that hold hands.
+
+        A session ends when no hand starts for SESSION_GAP_SECONDS (at any
+        table). Rows with an unknown timestamp belong to no bucket.
+        """
+        timestamps = np.unique(self.rows["timestamp"])
+        timestamps = timestamps[timestamps != 0].astype(np.int64)
+        if bucket == "day":
+            return np.unique(timestamps // SECONDS_PER_DAY) * SECONDS_PER_DAY
+        if bucket == "session":
+            new_session = np.diff(timestamps, prepend=np.int64(-SESSION_GAP_SECONDS - 1)) > SESSION_GAP_SECONDS
+            return timestamps[new_session]
+        raise ValueError(f"unknown time bucket {bucket!r}")
+
+    def save(self, path):
+        np.save(path, self.rows)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Open a saved store; with mmap the columns are read from disk on demand."""
+        rows = np.load(path, mmap_mode='r' if mmap else None)
+        if rows.dtype != HAND_ROW_DTYPE:
+            raise ValueError(f"{path} is not a hand store")
+        return cls(rows)
+
+
+# --- 期間ごとの累積和 (日付の範囲をスライドさせる) ---
+# 日またはセッションごとの回数を累積した配列を持っておき、任意の期間の集計を2行の引き算で出す。
+# 列は行に現れた RangeMatrix の位置だけに絞る (全位置では1期間あたり約 340KB になるため)。
+
+SECONDS_PER_DAY = 24 * 60 * 60
+SESSION_GAP_SECONDS = 30 * 60 # ハンドがこの時間途切れたら次のセッション
+TIME_BUCKETS = {"Day": "day", "Session": "session"} # GUI の表示名 -> HandStore.time_buckets の bucket
+
+
+class RangeTimeline:
+    """Prefix sums of a HandStore's range counters over time buckets.
+
+    prefix[i] holds the counts of buckets 0..i-1 for the counter positions
+    that occur at all, so window(first, last) is one subtraction of two
+    rows scattered into a RangeMatrix. Building it costs one pass over the
+    rows; moving the window never touches the rows again.
+    """
+
+    def __init__(self, hand_store, bucket_starts, mask=None):
+        self.bucket_starts = np.asarray(bucket_starts, dtype=np.int64)
+        all_rows = hand_store.rows
+        selected = all_rows["timestamp"] != 0
+        if mask is not None:
+            selected &= mask
+        bucket_count = len(self.bucket_starts)
+        all_buckets = np.searchsorted(self.bucket_starts, all_rows["timestamp"].astype(np.int64), side='right') - 1
+        selected &= all_buckets >= 0
+        rows, row_buckets = all_rows[selected], all_buckets[selected]
+
+        counter_keys, row_index = _hand_row_counter_keys(rows)
+        self.counter_keys, columns = np.unique(counter_keys, return_inverse=True)
+        column_count = len(self.counter_keys)
+        counts = np.bincount(row_buckets[row_index] * column_count + columns,
+                             minlength=bucket_count * column_count).reshape(bucket_count, column_count)
+        self.prefix = np.zeros((bucket_count + 1, column_count), dtype=np.int32)
+        np.cumsum(counts, axis=0, out=self.prefix[1:])
+
+        # 1ハンドの行はすべて同じ時刻 = 同じ期間にある
+        hand_buckets = all_buckets[_selected_hand_starts(all_rows, selected)]
+        self.hand_prefix = np.concatenate(([0], np.cumsum(np.bincount(hand_buckets, minlength=bucket_count))))
+
+    @classmethod
+    def from_hand_store(cls, hand_store, bucket="day", mask=None):
+        return cls(hand_store, hand_store.time_buckets(bucket), mask)
+
+    def __len__(self):
+        return len(self.bucket_starts)
+
+    def _check_window(self, first, last):
+        if not 0 <= first <= last < len(self.bucket_starts):
+            raise ValueError(f"bucket window {first}..{last} is not within 0..{len(self.bucket_starts) - 1}")
+
+    def window(self, first, last):
+        """RangeMatrix of buckets first..last (inclusive); ValueError unless 0 <= first <= last < len(self)."""
+        self._check_window(first, last)
+        counts = np.zeros(SPOT_CELLS * NUM_HAND_CLASSES, dtype=np.int32)
+        counts[self.counter_keys] = self.prefix[last + 1] - self.prefix[first]
+        return RangeMatrix(counts.reshape(RANGE_MATRIX_SHAPE))
+
+    def hand_count(self, first, last):
+        self._check_window(first, last)
+        return int(self.hand_prefix[last + 1] - self.hand_prefix[first])
+
+    def bucket_at(self, timestamp):
+        """Index of the bucket holding timestamp (0 if it is before the first)."""
+        return max(0, int(np.searchsorted(self.bucket_starts, timestamp, side='right')) - 1)
+
+
+# --- プロファイル (段階ごとの時間と呼び出し回数) ---
+# 解析の各関数は profile 引数 (StageProfile または None) を受け取り、渡されたときだけ段階ごとに計測する。
+# 無効なとき (profile=None) は None の判定だけで通常どおり呼ばれる。
+
+PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".poker_range_maker", "profiles")
+
+
+class StageProfile:
+    """Accumulated seconds and call counts per analysis stage.
+
+    Times include inner stages (tokenize includes positions, and so on).
+    Not thread-safe: each run fills its own profile and merge combines them.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+    def add(self, stage, seconds, calls=1):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def merge(self, other):
+        for stage, seconds in other.seconds.items():
+            self.add(stage, seconds, other.calls[stage])
+        return self
+
+    def summary_line(self, limit=6):
+        # 時間の長い順に "tokenize 2.31s, split 0.80s, ..."
+        stages = sorted(self.seconds, key=self.seconds.get, reverse=True)[:limit]
+        return ", ".join(f"{stage} {self.seconds[stage]:.2f}s" for stage in stages)
+
+    def to_dict(self):
+        return {stage: {"seconds": self.seconds[stage], "calls": self.calls[stage]}
+                for stage in sorted(self.seconds, key=self.seconds.get, reverse=True)}
+
+    def dump_json(self, path, **extra):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dict(extra, stages=self.to_dict()), f, indent=2)
+
+
+def _call_timed(profile, stage, func, *args):
+    # func(*args) を呼び、profile があればその時間を stage に加える
+    if profile is None:
+        return func(*args)
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        profile.add(stage, time.perf_counter() - start)
+
+
+class _TimedStream:
+    # ファイルの read() だけを "read" として計測する
+    def __init__(self, stream, profile):
+        self._stream = stream
+        self._profile = profile
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        try:
+            return self._stream.read(size)
+        finally:
+            self._profile.add("read", time.perf_counter() - start)
+
+
+def _timed_hand_spans(hand_spans, profile):
+    # 1ハンド取り出すごとの時間を "split" (read を含む) として計測する
+    clock = time.perf_counter
+    try:
+        while True:
+            start = clock()
+            try:
+                hand_span = next(hand_spans)
+            except StopIteration:
+                profile.add("split", clock() - start)
+                return
+            profile.add("split", clock() - start)
+            yield hand_span
+    finally:
+        hand_spans.close()
+
+
+def parse_file_aggregates_profiled(filepath, hero_name, skip_ids=None, extras=()):
+    # parse_file_aggregates と同じ結果に、そのファイルの StageProfile を付けて返す
+    profile = StageProfile()
+    start = time.perf_counter()
+    result = parse_file_aggregates(filepath, hero_name, skip_ids, extras, profile)
+    profile.add("total", time.perf_counter() - start)
+    return result + (profile,)
+
+
+def _iter_profiled_results(results, profile):
+    try:
+        for *result, file_profile in results:
+            profile.merge(file_profile)
+            yield tuple(result)
+    finally:
+        results.close()
+
+
+# --- 全プレイヤー集計 (ポピュレーション) ---
+# ヒーローだけでなく着席している全員のアクション回数を1回の走査で数える。
+# ホールカードはショーダウンで見えたハンドだけハンドクラス別にも数える。
+
+# RangeMatrix の (spot kind, position, vs-position, action) を1つの整数にしたもの
+SPOT_CELLS = RANGE_MATRIX_SHAPE[0] * RANGE_MATRIX_SHAPE[1] * RANGE_MATRIX_SHAPE[2] * RANGE_MATRIX_SHAPE[3]
+POPULATION_STORE_MAGIC = b"PPS"
+POPULATION_STORE_FORMAT_VERSION = 1
+POPULATION_COMPACT_EVERY = 1 << 20 # 未集約のキーがこの数を超えたらまとめる
+
+
+def _spot_cell(kind, position, vs_position, action):
+    return ((SPOT_KIND_INDEX[kind] * len(POSITIONS) + POSITION_INDEX[position]) * (len(POSITIONS) + 1)
+            + _vs_index(vs_position)) * len(RANGE_ACTIONS) + RANGE_ACTION_INDEX[action]
+
+
+def _sum_sparse(keys, counts):
+    # 同じキーの回数を足し合わせ、キーの昇順に並べる
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint32)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    counts = counts[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return keys[starts], np.add.reduceat(counts, starts).astype(np.uint32)
+
+
+class PopulationStore:
+    """Per-player spot counts for every seated player, stored sparsely.
+
+    Players get integer ids (names[id]). Action counts are kept as sorted
+    (key, count) arrays with key = player_id * SPOT_CELLS + spot cell, and
+    hands shown at showdown as key = (player_id * SPOT_CELLS + spot cell) *
+    NUM_HAND_CLASSES + hand class, so memory grows with the spots players
+    actually faced rather than players x spots x 169.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.player_ids = {}
+        self.action_keys = np.zeros(0, dtype=np.int64)
+        self.action_counts = np.zeros(0, dtype=np.uint32)
+        self.shown_keys = np.zeros(0, dtype=np.int64)
+        self.shown_counts = np.zeros(0, dtype=np.uint32)
+        # 未集約の分: add_hand のキー (1回ずつ) と merge で受け取った (keys, counts) の塊
+        self._hand_action_keys = []
+        self._hand_shown_keys = []
+        self._pending_actions = []
+        self._pending_shown = []
+        self._pending_size = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def player_id(self, name):
+        player_id = self.player_ids.get(name)
+        if player_id is None:
+            player_id = self.player_ids[name] = len(self.names)
+            self.names.append(name)
+        return player_id
+
+    def add_hand(self, record):
+        """Count the spots every positioned player faced in one HandRecord."""
+        for name in record.positions:
+            spots = record.spot_actions(name)
+            if not spots:
+                continue
+            base = self.player_id(name) * SPOT_CELLS
+            hand_class = record.shown_hand_classes.get(name)
+            for kind, position, vs_position, action in spots:
+                cells = [_spot_cell(kind, position, vs_position, "opportunity")]
+                if action:
+                    cells.append(_spot_cell(kind, position, vs_position, action))
+                for cell in cells:
+                    self._hand_action_keys.append(base + cell)
+                    if hand_class is not None:
+                        self._hand_shown_keys.append((base + cell) * NUM_HAND_CLASSES + hand_class)
+        if len(self._hand_action_keys) >= POPULATION_COMPACT_EVERY:
+            self.compact()
+
+    def _queue(self, action_keys, action_counts, shown_keys, shown_counts):
+        self._pending_actions.append((action_keys, action_counts))
+        self._pending_shown.append((shown_keys, shown_counts))
+        self._pending_size += len(action_keys) + len(shown_keys)
+        # 集約済みの量に比例するまで溜めてから並べ替えるので、merge を繰り返しても線形に近い
+        if self._pending_size >= max(POPULATION_COMPACT_EVERY, len(self.action_keys) + len(self.shown_keys)):
+            self.compact()
+
+    def compact(self):
+        if self._hand_action_keys or self._hand_shown_keys:
+            hand_action_keys = np.array(self._hand_action_keys, dtype=np.int64)
+            hand_shown_keys = np.array(self._hand_shown_keys, dtype=np.int64)
+            self._hand_action_keys = []
+            self._hand_shown_keys = []
+            self._pending_actions.append((hand_action_keys, np.ones(len(hand_action_keys), dtype=np.uint32)))
+            self._pending_shown.append((hand_shown_keys, np.ones(len(hand_shown_keys), dtype=np.uint32)))
+        if self._pending_actions:
+            self.action_keys, self.action_counts = _sum_sparse(
+                np.concatenate([self.action_keys] + [keys for keys, _ in self._pending_actions]),
+                np.concatenate([self.action_counts] + [counts for _, counts in self._pending_actions]))
+            self.shown_keys, self.shown_counts = _sum_sparse(
+                np.concatenate([self.shown_keys] + [keys for keys, _ in self._pending_shown]),
+                np.concatenate([self.shown_counts] + [counts for _, counts in self._pending_shown]))
+            self._pending_actions = []
+            self._pending_shown = []
+            self._pending_size = 0
+        return self
+
+    def merge(self, other):
+        other.compact()
+        # other の player id をこちらの id に付け替えてから足し合わせる
+        id_map = np.array([self.player_id(name) for name in other.names], dtype=np.int64)
+        shown_stride = SPOT_CELLS * NUM_HAND_CLASSES
+        if len(id_map) == 0:
+            return self
+        self._queue(
+            id_map[other.action_keys // SPOT_CELLS] * SPOT_CELLS + other.action_keys % SPOT_CELLS,
+            other.action_counts,
+            id_map[other.shown_keys // shown_stride] * shown_stride + other.shown_keys % shown_stride,
+            other.shown_counts,
+        )
+        return self
+
+    def _player_slice(self, keys, name, stride):
+        player_id = self.player_ids.get(name)
+        if player_id is None:
+            return slice(0, 0)
+        start, end = np.searchsorted(keys, [player_id * stride, (player_id + 1) * stride])
+        return slice(start, end)
+
+    def spot_counts(self, name):
+        """Action counts for one player shaped (kind, position, vs-position, action)."""
+        self.compact()
+        counts = np.zeros(SPOT_CELLS, dtype=np.int64)
+        player_slice = self._player_slice(self.action_keys, name, SPOT_CELLS)
+        np.add.at(counts, self.action_keys[player_slice] % SPOT_CELLS, self.action_counts[player_slice])
+        return counts.reshape(RANGE_MATRIX_SHAPE[:4])
+
+    def shown_range_matrix(self, name):
+        """The hands one player showed down, as a RangeMatrix over the spots they played."""
+        self.compact()
+        shown_stride = SPOT_CELLS * NUM_HAND_CLASSES
+        counts = np.zeros(shown_stride, dtype=np.int32)
+        player_slice = self._player_slice(self.shown_keys, name, shown_stride)
+        np.add.at(counts, self.shown_keys[player_slice] % shown_stride, self.shown_counts[player_slice])
+        return RangeMatrix(counts.reshape(RANGE_MATRIX_SHAPE))
+
+    def players_by_opportunities(self):
+        """(name, total spot opportunities) for every player, most active first."""
+        self.compact()
+        is_opportunity = (self.action_keys % len(RANGE_ACTIONS)) == RANGE_ACTION_INDEX["opportunity"]
+        totals = np.bincount((self.action_keys[is_opportunity] // SPOT_CELLS),
+                             weights=self.action_counts[is_opportunity], minlength=len(self.names))
+        return [(self.names[i], int(totals[i])) for i in np.argsort(-totals, kind='stable')]
+
+    def __eq__(self, other):
+        if not isinstance(other, PopulationStore):
+            return NotImplemented
+        # player id の振り方は問わず、名前ごとの回数が同じなら等しい
+        return sorted(self.names) == sorted(other.names) and all(
+            np.array_equal(self.spot_counts(name), other.spot_counts(name))
+            and self.shown_range_matrix(name) == other.shown_range_matrix(name)
+            for name in self.names)
+
+    def to_bytes(self):
+        self.compact()
+        names_blob = "\n".join(self.names).encode('utf-8')
+        payload = b"".join((
+            struct.pack('<IQQ', len(names_blob), len(self.action_keys), len(self.shown_keys)),
+            names_blob,
+            self.action_keys.astype('<i8', copy=False).tobytes(),
+            self.action_counts.astype('<u4', copy=False).tobytes(),
+            self.shown_keys.astype('<i8', copy=False).tobytes(),
+            self.shown_counts.astype('<u4', copy=False).tobytes(),
+        ))
+        return POPULATION_STORE_MAGIC + bytes([POPULATION_STORE_FORMAT_VERSION]) + zlib.compress(payload, 1)
+
+    @classmethod
+    def from_bytes(cls, blob):
+        if blob[:3] != POPULATION_STORE_MAGIC or blob[3] != POPULATION_STORE_FORMAT_VERSION:
+            raise ValueError("Not a PopulationStore blob or unsupported format version")
+        payload = zlib.decompress(blob[4:])
+        names_length, action_length, shown_length = struct.unpack_from('<IQQ', payload)
+        offset = struct.calcsize('<IQQ')
+        store = cls()
+        names_blob = payload[offset:offset + names_length]
+        store.names = names_blob.decode('utf-8').split("\n") if names_length else []
+        store.player_ids = {name: i for i, name in enumerate(store.names)}
+        offset += names_length
+        for keys_attr, counts_attr, length in (("action_keys", "action_counts", action_length),
+                                               ("shown_keys", "shown_counts", shown_length)):
+            keys = np.frombuffer(payload, dtype='<i8', count=length, offset=offset).astype(np.int64)
+            offset += 8 * length
+            counts = np.frombuffer(payload, dtype='<u4', count=length, offset=offset).astype(np.uint32)
+            offset += 4 * length
+            setattr(store, keys_attr, keys)
+            setattr(store, counts_attr, counts)
+        return store
+
+    def __reduce__(self):
+        return (PopulationStore.from_bytes, (self.to_bytes(),))
+
+
+def parse_file_population(filepath, skip_ids=None):
+    # 1ファイル分の全プレイヤー集計を返す (ワーカープロセスで実行される)
+    partial = PopulationStore()
+    hand_count = 0
+    for _, hand_bytes in iter_located_hands(filepath, skip_ids):
+        record = tokenize_hand(hand_bytes, None, collect_showdowns=True)
+        if not record.positions:
+            continue
+        hand_count += 1
+        partial.add_hand(record)
+    return partial.compact(), hand_count
+
+
+def process_directory_population(history_dir, workers=1, dedup_index=None):
+    """Aggregate every seated player's spots in history_dir in one pass.
+
+    Returns (PopulationStore, hand_count).
+    """
+    filepaths = list_hand_history_files(history_dir)
+    if dedup_index is None:
+        tasks = [(filepath,) for filepath in filepaths]
+    else:
+        skip_ids_by_file, _ = dedup_index.duplicate_ids_by_file(filepaths, workers)
+        tasks = [(filepath, skip_ids_by_file[filepath]) for filepath in filepaths]
+    population = PopulationStore()
+    hand_count = 0
+    for partial, partial_hand_count in _iter_parsed_files(parse_file_population, tasks, workers):
+        population.merge(partial)
+        hand_count += partial_hand_count
+    return population.compact(), hand_count
+
+
+# --- 解析キャッシュ (SQLite) ---
+
+# 解析ロジック (パーサや集計) を変更したらこの値を上げること。
+# バージョンが異なるキャッシュは破棄して作り直す。
+ANALYSIS_CACHE_VERSION = 10
+ANALYSIS_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".poker_range_maker", "analysis_cache.sqlite3")
+
+
+class AnalysisCache:
+    """Per-file partial aggregates keyed by (path, hero_name, dedup_key), valid while size and mtime match.
+
+    Hand-history files are append-only, so a file whose size and mtime are
+    unchanged does not need to be parsed again. The connection is tied to the
+    thread that created it; open the cache in the thread that runs the analysis.
+    """
+
+    COMMIT_EVERY = 500
+
+    def __init__(self, path=ANALYSIS_CACHE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.hits = 0
+        self._pending_stats = {}
+        self._uncommitted = 0
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != str(ANALYSIS_CACHE_VERSION):
+            # 解析ロジックが変わったので古い結果は使えない
+            self.conn.execute("DROP TABLE IF EXISTS files")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                              (str(ANALYSIS_CACHE_VERSION),))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT NOT NULL, hero_name TEXT NOT NULL, dedup_key TEXT NOT NULL,"
+            " size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " hand_count INTEGER NOT NULL, aggregates BLOB NOT NULL, locations BLOB, rows BLOB,"
+            " PRIMARY KEY (path, hero_name, dedup_key))"
+        )
+        self.conn.commit()
+
+    def get(self, filepath, hero_name, dedup_key="", extras=()):
+        """Return the cached (partial_aggregates, hand_count), or None if the file must be parsed.
+
+        dedup_key identifies the hands skipped as duplicates ("" when nothing is
+        skipped), so the same file parsed with a different skip set is a miss.
+        With extras (names from HAND_EXTRAS) the result is (partial_aggregates,
+        hand_count, {name: blob}) as from parse_file_aggregates, and a file
+        cached without one of them is a miss.
+        """
+        path = os.path.abspath(filepath)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        self._pending_stats[path] = (st.st_size, st.st_mtime_ns)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, hand_count, aggregates, locations, rows FROM files"
+            " WHERE path = ? AND hero_name = ? AND dedup_key = ?",
+            (path, hero_name, dedup_key),
+        ).fetchone()
+        if row is None or (row[0], row[1]) != (st.st_size, st.st_mtime_ns):
+            return None
+        extra_blobs = {name: blob for name, blob in zip(HAND_EXTRAS, row[4:]) if name in extras}
+        if any(blob is None for blob in extra_blobs.values()):
+            return None
+        self.hits += 1
+        if extras:
+            return RangeMatrix.from_bytes(row[3]), row[2], extra_blobs
+        return RangeMatrix.from_bytes(row[3]), row[2]
+
+    def put(self, filepath, hero_name, partial, hand_count, extra_blobs=None, dedup_key=""):
+        path = os.path.abspath(filepath)
+        # Use the stat taken before parsing; if the file grew meanwhile the
+        # next lookup sees a different size and parses it again.
+        stats = self._pending_stats.pop(path, None)
+        if stats is None:
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files"
+            " (path, hero_name, dedup_key, size, mtime_ns, hand_count, aggregates, locations, rows)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, hero_name, dedup_key, stats[0], stats[1], hand_count, partial.to_bytes())
+            + tuple((extra_blobs or {}).get(name) for name in HAND_EXTRAS),
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+# --- ハンドIDによる重複排除 ---
+# クライアントの自動保存とトラッカーの再エクスポートなど、同じハンドが複数のファイルに
+# 入っていることがある。ヘッダの "Hand #番号" を 64bit 整数にしてファイルごとに
+# SQLite へ保存しておき (サイズと mtime が同じファイルは読み直さない)、どのハンドを
+# 読み飛ばすかを解析の前に決める。ハンドの本文はデコードも字句解析もしない。
+
+HAND_ID_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".poker_range_maker", "hand_ids.sqlite3")
+HAND_ID_INDEX_VERSION = 2
+# "PokerStars Hand #123:", "PokerStars Zoom Hand #123:", "Poker Hand #RC123:" (英字の接頭辞付き)
+HAND_ID_REGEX = re.compile(rb"(?:PokerStars (?:Zoom )?Hand|Poker Hand) #([A-Za-z]*)(\d+)")
+_HAND_ID_HASHED = 1 << 63 # 接頭辞付きの ID はハッシュにしてこのビットを立てる (素の番号とは重ならない)
+
+
+def hand_id_key(hand_bytes):
+    """Return the hand's header number as a uint64 key, or None if the hand has no "Hand #" header.
+
+    PokerStars regular and Zoom hands share one number space, so both map to
+    the plain number. An ID with a letter prefix ("RC", "HD", ...) or a
+    number of 63 bits or more is hashed as prefix + number with the top bit
+    set, so IDs from different sites never share a key unless the 63-bit
+    digests collide.
+    """
+    match = HAND_ID_REGEX.match(hand_bytes)
+    if match is None:
+        return None
+    prefix, digits = match.groups()
+    if not prefix:
+        number = int(digits)
+        if number < _HAND_ID_HASHED:
+            return number
+    digest = hashlib.blake2b(prefix + b"#" + digits, digest_size=8).digest()
+    return int.from_bytes(digest, "little") | _HAND_ID_HASHED
+
+
+def scan_hand_ids(filepath):
+    """Return the sorted hand-ID keys in a hand-history file as a uint64 array (repeats kept)."""
+    hand_ids = []
+    try:
+        for stream in iter_hand_history_streams(filepath):
+            for hand_bytes in iter_hand_bytes_from_stream(stream):
+                hand_id = hand_id_key(hand_bytes)
+                if hand_id is not None:
+                    hand_ids.append(hand_id)
+    except ARCHIVE_READ_ERRORS:
+        pass # 読めたところまで (iter_hand_texts_from_file と同じ)
+    return np.sort(np.array(hand_ids, dtype=np.uint64))
+
+
+def _encode_hand_ids(hand_ids):
+    # 昇順の ID は差分にすると小さな数が並ぶので zlib でよく縮む (1ハンドあたり数バイト)
+    deltas = np.diff(hand_ids, prepend=np.uint64(0)) if len(hand_ids) else hand_ids
+    return zlib.compress(deltas.astype('<u8').tobytes())
+
+
+def _decode_hand_ids(blob):
+    return np.cumsum(np.frombuffer(zlib.decompress(blob), dtype='<u8'), dtype=np.uint64)
+
+
+def dedup_cache_key(skip_ids):
+    """Digest of a skip set, used to key cached aggregates ("" when the file is parsed without one).
+
+    skip_ids is None when nothing in the file is dropped (see
+    HandIdIndex.duplicate_ids_by_file), so such a file shares its cache entry
+    with an analysis that does not skip duplicates.
+    """
+    if skip_ids is None:
+        return ""
+    return "dedup:" + hashlib.blake2b(np.asarray(skip_ids, dtype='<u8').tobytes(), digest_size=16).hexdigest()
+
+
+class HandIdIndex:
+    """Hand-ID keys of every hand-history file seen, persisted in SQLite.
+
+    Only files whose size or mtime changed are scanned again, and the IDs are
+    stored delta-encoded, so re-importing a folder of tens of millions of hands
+    costs a stat per file plus a sort. Entries of files that are gone from
+    the folders being looked up are deleted. Like AnalysisCache the
+    connection is tied to the thread that created it.
+    """
+
+    def __init__(self, path=HAND_ID_INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.duplicate_count = 0
+        self._ensure_schema()
+
+    def _ensure_schema(self):
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != str(HAND_ID_INDEX_VERSION):
+            self.conn.execute("DROP TABLE IF EXISTS files")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                              (str(HAND_ID_INDEX_VERSION),))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, ids BLOB NOT NULL)"
+        )
+        self.conn.commit()
+
+    def file_ids(self, filepaths, workers=1):
+        """Return the sorted hand-ID array of each file (same order as filepaths), scanning only changed files.
+
+        A hand written twice in one file appears twice in its array.
+        """
+        self._prune_missing(filepaths)
+        ids_by_file = [None] * len(filepaths)
+        to_scan = []
+        for i, filepath in enumerate(filepaths):
+            path = os.path.abspath(filepath)
+            try:
+                st = os.stat(path)
+            except OSError:
+                ids_by_file[i] = np.empty(0, dtype=np.uint64)
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                continue
+            row = self.conn.execute("SELECT size, mtime_ns, ids FROM files WHERE path = ?", (path,)).fetchone()
+            if row is not None and (row[0], row[1]) == (st.st_size, st.st_mtime_ns):
+                ids_by_file[i] = _decode_hand_ids(row[2])
+            else:
+                to_scan.append((i, path, st.st_size, st.st_mtime_ns))
+
+        scanned = _iter_parsed_files(scan_hand_ids, [(path,) for _, path, _, _ in to_scan], workers)
+        for (i, path, size, mtime_ns), hand_ids in zip(to_scan, scanned):
+            ids_by_file[i] = hand_ids
+            self.conn.execute("INSERT OR REPLACE INTO files (path, size, mtime_ns, ids) VALUES (?, ?, ?, ?)",
+                              (path, size, mtime_ns, _encode_hand_ids(hand_ids)))
+        self.conn.commit()
+        return ids_by_file
+
+    def _prune_missing(self, filepaths):
+        # 調べるフォルダにあった索引のうち、ファイルが無くなったものを消す
+        requested = {os.path.abspath(filepath) for filepath in filepaths}
+        for directory in {os.path.dirname(path) for path in requested}:
+            prefix = os.path.join(directory, "")
+            rows = self.conn.execute("SELECT path FROM files WHERE path >= ? AND path < ?",
+                                     (prefix, prefix + "\U0010ffff")).fetchall()
+            gone = [(path,) for path, in rows
+                    if path not in requested and os.path.dirname(path) == directory and not os.path.exists(path)]
+            self.conn.executemany("DELETE FROM files WHERE path = ?", gone)
+
+    def duplicate_ids_by_file(self, filepaths, workers=1):
+        """Decide which hands each file should skip.
+
+        Returns ({filepath: sorted uint64 array of hand IDs to skip, or None}, duplicate_count).
+        A hand is kept in the first file of filepaths that contains it and
+        skipped everywhere else; the result does not depend on which files
+        were scanned before. Repeats inside one file are dropped at parse time
+        (and counted here). A file with nothing to drop gets None, so it is
+        parsed (and cached) exactly as without dedup.
+        """
+        ids_by_file = self.file_ids(filepaths, workers)
+        in_file_repeats = [len(ids) - len(np.unique(ids)) for ids in ids_by_file]
+        ids_by_file = [np.unique(ids) for ids in ids_by_file]
+        all_ids = np.concatenate(ids_by_file) if ids_by_file else np.empty(0, dtype=np.uint64)
+        owners = np.repeat(np.arange(len(filepaths)), [len(ids) for ids in ids_by_file])
+        order = np.argsort(all_ids, kind='stable') # 同じ ID は filepaths の順に並ぶ
+        sorted_ids = all_ids[order]
+        repeated = np.zeros(len(sorted_ids), dtype=bool)
+        repeated[1:] = sorted_ids[1:] == sorted_ids[:-1]
+        skip_owners = owners[order][repeated]
+        skip_ids = sorted_ids[repeated]
+        by_owner = np.argsort(skip_owners, kind='stable')
+        bounds = np.searchsorted(skip_owners[by_owner], np.arange(len(filepaths) + 1))
+        skip_ids = skip_ids[by_owner]
+        skip_ids_by_file = {}
+        for i, filepath in enumerate(filepaths):
+            file_skip_ids = np.sort(skip_ids[bounds[i]:bounds[i + 1]])
+            skip_ids_by_file[filepath] = file_skip_ids if len(file_skip_ids) or in_file_repeats[i] else None
+        self.duplicate_count = int(repeated.sum()) + sum(in_file_repeats)
+        return skip_ids_by_file, self.duplicate_count
+
+    def close(self):
+        self.conn.close()
+
+
+# --- ライブ追跡 (tail) ---
+
+# A hand is written in one go and ends with its summary followed by blank lines;
+# anything after the last delimiter without this is still being written.
+_HAND_COMPLETE_MARKER = b"*** SUMMARY ***"
+
+
+class HandHistoryTailer:
+    """Follow growing hand-history files and return only newly appended complete hands.
+
+    Watches the same files as the analysis (list_hand_history_files). Keeps a
+    byte offset per file; each poll reads the bytes after the offset, splits
+    them on the same delimiters as iter_hand_texts_from_file and advances the
+    offset past the last complete hand, so the cost scales with the new data.
+    Compressed files and archives are not appended to, so one that appears
+    after mark_current_positions is read whole, once.
+
+    Hands whose hand-ID key is in counted_ids (sorted uint64, the hands the
+    analysis counted) are dropped, so marking the positions when the analysis
+    starts never counts a hand twice. With skip_duplicates a hand seen
+    earlier in the tail is dropped too, as HandIdIndex does for the analysis.
+    """
+
+    def __init__(self, history_dir, skip_duplicates=False):
+        self.history_dir = history_dir
+        self.skip_duplicates = skip_duplicates
+        self.counted_ids = np.empty(0, dtype=np.uint64)
+        self.duplicate_count = 0
+        self.offsets = {}
+        self.delimiters = {}
+        self._tailed_ids = set()
+
+    def _list_files(self):
+        return list_hand_history_files(self.history_dir)
+
+    def mark_current_positions(self):
+        # ここまでの内容は解析が読むので、これ以降に追記されたハンドだけを対象にする
+        for filepath in self._list_files():
+            try:
+                self.offsets[filepath] = os.path.getsize(filepath)
+            except OSError:
+                pass
+
+    def read_new_hand_texts(self):
+        hand_texts = []
+        for filepath in self._list_files():
+            try:
+                size = os.path.getsize(filepath)
+            except OSError:
+                continue
+            if os.path.splitext(filepath)[1].lower() in ARCHIVE_EXTENSIONS:
+                if filepath not in self.offsets:
+                    self.offsets[filepath] = size
+                    for hand_bytes in self._read_archive_hands(filepath):
+                        self._append_hand_text(hand_texts, hand_bytes)
+                continue
+            offset = self.offsets.get(filepath, 0)
+            if size < offset: # ファイルが置き換えられた/切り詰められた
+                offset = 0
+                self.delimiters.pop(filepath, None)
+            if size == offset:
+                continue
+            try:
+                with open(filepath, 'rb') as f:
+                    f.seek(offset)
+                    chunk = f.read(size - offset)
+            except OSError:
+                continue
+            new_hands, consumed = self._split_complete_hands(filepath, chunk)
+            hand_texts.extend(new_hands)
+            self.offsets[filepath] = offset + consumed
+        return hand_texts
+
+    def _split_complete_hands(self, filepath, chunk):
+        delimiter = self.delimiters.get(filepath)
+        if delimiter is None:
+            delimiter = detect_hand_delimiter(chunk)
+            if delimiter is None:
+                return [], 0 # 区切りがまだ書かれていない
+            self.delimiters[filepath] = delimiter
+        delimiter_bytes = delimiter.encode('utf-8')
+
+        starts = []
+        pos = chunk.find(delimiter_bytes)
+        while pos != -1:
+            starts.append(pos)
+            pos = chunk.find(delimiter_bytes, pos + len(delimiter_bytes))
+        if not starts:
+            return [], 0
+
+        # Bytes before the first delimiter belong to a hand that was already
+        # counted (or to the file header), like the file header skipped by
+        # iter_hand_texts_from_file.
+        hand_texts = []
+        for start, end in zip(starts, starts[1:]):
+            self._append_hand_text(hand_texts, chunk[start:end])
+
+        last_hand = chunk[starts[-1]:]
+        normalized_tail = last_hand.replace(b"\r\n", b"\n")
+        if _HAND_COMPLETE_MARKER in last_hand and normalized_tail.endswith(b"\n\n"):
+            self._append_hand_text(hand_texts, last_hand)
+            return hand_texts, len(chunk)
+        return hand_texts, starts[-1] # 書き込み途中のハンドは次回読み直す
+
+    @staticmethod
+    def _read_archive_hands(filepath):
+        try:
+            for stream in iter_hand_history_streams(filepath):
+                yield from iter_hand_bytes_from_stream(stream)
+        except ARCHIVE_READ_ERRORS:
+            return # 書き込み途中のアーカイブは読めたところまで
+
+    def _is_counted(self, hand_bytes):
+        hand_id = hand_id_key(hand_bytes)
+        if hand_id is None:
+            return False
+        position = np.searchsorted(self.counted_ids, np.uint64(hand_id))
+        if position < len(self.counted_ids) and self.counted_ids[position] == hand_id:
+            return True
+        if self.skip_duplicates:
+            if hand_id in self._tailed_ids:
+                return True
+            self._tailed_ids.add(hand_id)
+        return False
+
+    def _append_hand_text(self, hand_texts, hand_bytes):
+        if not _has_hand_body(hand_bytes):
+            return
+        if self._is_counted(hand_bytes):
+            self.duplicate_count += 1
+            return
+        hand_text = _decode_hand_bytes(hand_bytes)
+        if hand_text and hand_text.strip():
+            hand_texts.append(hand_text)
+
+
+# --- プリフロップのエクイティ (レンジ対レンジ) ---
+# 1326 通りのコンボ同士のオールイン時の勝率を表にして持ち、レンジ対レンジは重み付きの
+# 行列×ベクトル2回で求める (同じカードを使うコンボの組み合わせは除く)。
+# 表は共通のボードを乱数で引いて全コンボを一度に評価し、スートの入れ替え 24 通りで平均して作る。
+# 作るのは初回だけで、あとは ~/.poker_range_maker に保存したものを読む。
+
+PREFLOP_EQUITY_PATH = os.path.join(os.path.expanduser("~"), ".poker_range_maker", "preflop_equity_v1.npy")
+EQUITY_TABLE_BOARDS = 20000 # 厳密な列挙との差はおおむね 0.5% 以内
+EQUITY_TABLE_CHUNK_BOARDS = 1000 # ワーカー1回分のボード数 (勝ち数を uint16 で数えるので 65535 以下)
+EQUITY_TABLE_SEED = 0
+
+# カード番号 = RANKS の番号 * 4 + SUITS の番号。ビットはスートごとに 13 ビット (上位ほど強いランク)
+CARD_BITS = np.array([1 << (suit * 13 + 12 - rank) for rank in range(len(RANKS)) for suit in range(len(SUITS))],
+                     dtype=np.int64)
+COMBO_CARDS = np.array([(a, b) for a in range(52) for b in range(a + 1, 52)])
+COMBO_BITS = CARD_BITS[COMBO_CARDS[:, 0]] | CARD_BITS[COMBO_CARDS[:, 1]]
+NUM_COMBOS = len(COMBO_CARDS)
+
+
+# COMBO_CARDS の順のコンボ -> ハンドクラス
+COMBO_CLASS_BY_INDEX = COMBO_HAND_CLASS[COMBO_CARDS[:, 0], COMBO_CARDS[:, 1]].astype(np.intp)
+
+
+def _top_bits(mask, count):
+    kept = 0
+    for bit in range(12, -1, -1):
+        if count and mask >> bit & 1:
+            kept |= 1 << bit
+            count -= 1
+    return kept
+
+
+def _straight_top(mask):
+    # ストレートの一番上のランク + 1 (A-5 は 5 のランク + 1 = 4)、無ければ 0
+    for top in range(12, 3, -1):
+        if mask >> (top - 4) & 0x1F == 0x1F:
+            return top + 1
+    return 4 if mask & 0x100F == 0x100F else 0
+
+
+_RANK_MASKS = range(1 << 13)
+_RANK_POPCOUNT = np.array([bin(mask).count("1") for mask in _RANK_MASKS], dtype=np.int64)
+_RANK_TOP = {count: np.array([_top_bits(mask, count) for mask in _RANK_MASKS], dtype=np.int64) for count in (1, 2, 3, 5)}
+_RANK_STRAIGHT = np.array([_straight_top(mask) for mask in _RANK_MASKS], dtype=np.int64)
+
+
+def evaluate_hands(hand_bits):
+    """Strength of 7-card hands given as OR-ed CARD_BITS (any shape); higher is better, equal is a tie.
+
+    Everything is bitwise on the four 13-bit suit masks plus lookups in
+    8192-entry tables, so a whole batch is a few dozen array operations.
+    The category is in bits 26 and up, the ranks that break ties below.
+    """
+    suits = [(hand_bits >> (13 * suit)) & 0x1FFF for suit in range(4)]
+    s0, s1, s2, s3 = suits
+    ranks = s0 | s1 | s2 | s3
+    quads = s0 & s1 & s2 & s3
+    pairs = (s0 & s1) | (s0 & s2) | (s0 & s3) | (s1 & s2) | (s1 & s3) | (s2 & s3) # 2枚以上あるランク
+    trips = (s0 & s1 & s2) | (s0 & s1 & s3) | (s0 & s2 & s3) | (s1 & s2 & s3)
+    flush = np.zeros_like(ranks)
+    for suit_mask in suits: # 7枚ならフラッシュのスートは多くても1つ
+        flush = np.where(_RANK_POPCOUNT[suit_mask] >= 5, suit_mask, flush)
+    straight_flush = _RANK_STRAIGHT[flush]
+    straight = _RANK_STRAIGHT[ranks]
+    top_trips = _RANK_TOP[1][trips]
+    top_two_pairs = _RANK_TOP[2][pairs]
+    pair_count = _RANK_POPCOUNT[pairs]
+    return np.select(
+        [straight_flush > 0, quads > 0, (trips > 0) & (pair_count >= 2), flush > 0, straight > 0, trips > 0,
+         pair_count >= 2, pairs > 0],
+        [8 << 26 | straight_flush,
+         7 << 26 | _RANK_TOP[1][quads] << 13 | _RANK_TOP[1][ranks & ~quads],
+         6 << 26 | top_trips << 13 | _RANK_TOP[1][pairs & ~top_trips],
+         5 << 26 | _RANK_TOP[5][flush],
+         4 << 26 | straight,
+         3 << 26 | top_trips << 13 | _RANK_TOP[2][ranks & ~trips],
+         2 << 26 | top_two_pairs << 13 | _RANK_TOP[1][ranks & ~top_two_pairs],
+         1 << 26 | pairs << 13 | _RANK_TOP[3][ranks & ~pairs]],
+        _RANK_TOP[5][ranks])
+
+
+def _equity_table_chunk(seed, chunk_index, board_count):
+    # board_count 枚のボードで、全コンボの組 (i, j) について i が j に勝った回数と、
+    # どちらもボードとカードが重ならなかった回数を数える (ワーカープロセスで実行される)
+    rng = np.random.default_rng((seed, chunk_index))
+    boards = np.argsort(rng.random((board_count, 52)), axis=1)[:, :5]
+    board_bits = CARD_BITS[boards].sum(axis=1)
+    playable = (board_bits[:, None] & COMBO_BITS[None, :]) == 0
+    # ボードと重なるコンボは 0 (どの手にも負ける) にしておき、その分はあとで引く
+    scores = np.where(playable, evaluate_hands(board_bits[:, None] | COMBO_BITS[None, :]), 0).astype(np.int32)
+    wins = np.zeros((NUM_COMBOS, NUM_COMBOS), dtype=np.uint16)
+    for board_scores in scores:
+        wins += board_scores[:, None] > board_scores[None, :]
+    playable = playable.astype(np.float32)
+    return wins, playable.T @ playable, playable.sum(axis=0)
+
+
+def _suit_permutation_indexes():
+    # スートを入れ替えたときに各コンボが移る先のコンボ番号 (24 通り)
+    combo_index = {(int(a), int(b)): i for i, (a, b) in enumerate(COMBO_CARDS)}
+    for permutation in itertools.permutations(range(4)):
+        cards = (np.arange(52) // 4) * 4 + np.array(permutation)[np.arange(52) % 4]
+        moved = np.sort(cards[COMBO_CARDS], axis=1)
+        yield np.array([combo_index[(a, b)] for a, b in moved.tolist()])
+
+
+class PreflopEquityTable:
+    """All-in preflop equity of every combo against every other combo.
+
+    equity[i, j] is combo i's share of the pot against combo j (wins plus
+    half the ties over the five-card boards), and 0 where the two combos
+    share a card. Combos are COMBO_CARDS order; COMBO_CLASS_BY_INDEX maps them
+    to the 169 hand classes.
+    """
+
+    def __init__(self, equity):
+        if equity.shape != (NUM_COMBOS, NUM_COMBOS):
+            raise ValueError(f"equity table must have shape {(NUM_COMBOS, NUM_COMBOS)}, got {equity.shape}")
+        self.compatible = ((COMBO_BITS[:, None] & COMBO_BITS[None, :]) == 0).astype(np.float32)
+        self.equity = equity.astype(np.float32) * self.compatible
+
+    @classmethod
+    def build(cls, workers=1, boards=EQUITY_TABLE_BOARDS, seed=EQUITY_TABLE_SEED):
+        """Estimate the table from random boards (one-time; the chunks run on a process pool)."""
+        chunks = [(seed, index, min(EQUITY_TABLE_CHUNK_BOARDS, boards - start))
+                  for index, start in enumerate(range(0, boards, EQUITY_TABLE_CHUNK_BOARDS))]
+        wins = np.zeros((NUM_COMBOS, NUM_COMBOS))
+        both_playable = np.zeros((NUM_COMBOS, NUM_COMBOS))
+        playable = np.zeros(NUM_COMBOS)
+        for chunk_wins, chunk_both, chunk_playable in _iter_parsed_files(_equity_table_chunk, chunks, workers):
+            wins += chunk_wins
+            both_playable += chunk_both
+            playable += chunk_playable
+        wins -= playable[:, None] - both_playable # i だけが使えたボードの「勝ち」を除く
+        # 同じ形 (スートを入れ替えただけ) の組み合わせの結果をまとめて、ばらつきを小さくする
+        pooled_wins = np.zeros_like(wins)
+        pooled_boards = np.zeros_like(both_playable)
+        for moved in _suit_permutation_indexes():
+            pooled_wins += wins[np.ix_(moved, moved)]
+            pooled_boards += both_playable[np.ix_(moved, moved)]
+        # 引き分けは半分ずつ: (勝ち + (ボード数 - 勝ち - 負け) / 2) / ボード数
+        equity = np.divide(pooled_wins - pooled_wins.T, 2 * pooled_boards, out=np.zeros_like(pooled_wins),
+                           where=pooled_boards > 0)
+        equity[pooled_boards > 0] += 0.5
+        return cls(equity)
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.save(path, self.equity)
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path))
+
+    def range_vs_range(self, hero_weights, villain_weights):
+        """Hero's all-in equity against the villain's range, with card-blocked combos removed.
+
+        Weights are 169 per-class frequencies (as from RangeMatrix.range_weights)
+        or 1326 per-combo weights. Returns (range equity, per-class equity):
+        the second is every hand class against the villain range regardless
+        of the hero weights, NaN where the villain range is empty.
+        """
+        hero_weights = _combo_weights(hero_weights)
+        villain_weights = _combo_weights(villain_weights)
+        share = self.equity @ villain_weights # 各コンボの (勝率 x 相手の重み) の合計
+        matched = self.compatible @ villain_weights # カードが重ならない相手の重みの合計
+        total = hero_weights @ matched
+        range_equity = float(hero_weights @ share / total) if total > 0 else float("nan")
+        class_share = np.bincount(COMBO_CLASS_BY_INDEX, share, minlength=NUM_HAND_CLASSES)
+        class_matched = np.bincount(COMBO_CLASS_BY_INDEX, matched, minlength=NUM_HAND_CLASSES)
+        class_equity = np.divide(class_share, class_matched, out=np.full(NUM_HAND_CLASSES, np.nan),
+                                 where=class_matched > 0)
+        return range_equity, class_equity
+
+
+def _combo_weights(weights):
+    weights = np.asarray(weights, dtype=np.float32)
+    if weights.shape == (NUM_HAND_CLASSES,):
+        return weights[COMBO_CLASS_BY_INDEX]
+    if weights.shape == (NUM_COMBOS,):
+        return weights
+    raise ValueError(f"range weights must have {NUM_HAND_CLASSES} classes or {NUM_COMBOS} combos, "
+                     f"got shape {weights.shape}")
+
+
+_preflop_equity_table = None
+_preflop_equity_lock = threading.Lock()
+
+
+def load_preflop_equity_table(workers=1, path=PREFLOP_EQUITY_PATH):
+    """The PreflopEquityTable, read from path or built (and saved there) on first use."""
+    global _preflop_equity_table
+    with _preflop_equity_lock:
+        if _preflop_equity_table is None:
+            try:
+                _preflop_equity_table = PreflopEquityTable.load(path)
+            except (OSError, ValueError):
+                _preflop_equity_table = PreflopEquityTable.build(workers)
+                try:
+                    _preflop_equity_table.save(path)
+                except OSError:
+                    pass # 保存できなければ次回も作り直す
+        return _preflop_equity_table
+
+
+# --- 参照チャートとの差 (リーク) ---
+# プリフロップのチャート (スポットごとのハンド別頻度) を読み込み、全スポットの差を一度に配列で計算する。
+# チャートの JSON:
+#   {"spots": [{"kind": "open", "position": "BTN", "raise": {"AA": 1, "K9o": 0.5, ...}},
+#              {"kind": "bb_defense", "position": "BB", "vs_position": "BTN", "call": {...}, "raise": {...}}]}
+# 頻度は 0〜1。書かれていないハンドは 0、fold は 1 - raise - call。ハンドの辞書の代わりに 169 個のリストも可。
+
+CHART_ACTIONS = RANGE_ACTIONS[1:] # RangeMatrix.frequencies の並び (raise, call, fold)
+LEAK_MIN_Z = 1.96 # これ以上ずれていなければ (標本が少なければ) リークとして挙げない
+LEAK_MIN_HANDS = 5 # 配られた回数がこれより少ないセルは z を出さない
+LEAK_FREQUENCY_FLOOR = 0.05 # 標準誤差に使うチャートの頻度を [0.05, 0.95] に収める (0% / 100% の手にも誤差を持たせる)
+
+
+class ReferenceChart:
+    """Reference frequencies for some spots, shaped like RangeMatrix.frequencies().
+
+    defined marks the (kind, position, vs-position) spots the chart covers;
+    every action of a covered spot has a frequency.
+    """
+
+    def __init__(self, frequencies, defined, name=""):
+        self.frequencies = frequencies
+        self.defined = defined
+        self.name = name
+
+    @classmethod
+    def from_json(cls, chart, name=""):
+        frequencies = np.zeros(RANGE_MATRIX_SHAPE[:3] + (len(CHART_ACTIONS), NUM_HAND_CLASSES))
+        defined = np.zeros(RANGE_MATRIX_SHAPE[:3], dtype=bool)
+        for spot in chart.get("spots", []):
+            try:
+                index = (SPOT_KIND_INDEX[spot["kind"]], POSITION_INDEX[spot["position"]],
+                         _vs_index(spot.get("vs_position")))
+            except KeyError as e:
+                raise ValueError(f"chart spot {spot!r}: unknown or missing {e}") from None
+            for action in ("raise", "call"):
+                frequencies[index + (CHART_ACTIONS.index(action),)] = _chart_grid(spot.get(action, {}), spot)
+            frequencies[index + (CHART_ACTIONS.index("fold"),)] = 1 - frequencies[index][:2].sum(axis=0)
+            if (frequencies[index] < -1e-9).any():
+                raise ValueError(f"chart spot {spot['kind']} {spot['position']}: raise + call exceeds 1")
+            defined[index] = True
+        return cls(np.clip(frequencies, 0, 1), defined, name or chart.get("name", ""))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_json(json.load(f), os.path.splitext(os.path.basename(path))[0])
+
+
+def _chart_grid(hands, spot):
+    if isinstance(hands, list):
+        if len(hands) != NUM_HAND_CLASSES:
+            raise ValueError(f"chart spot {spot['kind']} {spot['position']}: expected {NUM_HAND_CLASSES} values")
+        return np.asarray(hands, dtype=float)
+    grid = np.zeros(NUM_HAND_CLASSES)
+    for hand, frequency in hands.items():
+        if hand not in HAND_CLASS_INDEX:
+            raise ValueError(f"chart spot {spot['kind']} {spot['position']}: unknown hand {hand!r}")
+        grid[HAND_CLASS_INDEX[hand]] = frequency
+    return grid
+
+
+class DeviationReport:
+    """How a RangeMatrix differs from a ReferenceChart, for every covered spot at once.
+
+    Arrays are shaped like RangeMatrix.frequencies() (kind x position x
+    vs-position x [raise, call, fold] x 169) and are NaN where the chart does
+    not cover the spot or the hand was never dealt there. diff is played
+    minus chart frequency; z is that difference in binomial standard errors
+    for the number of hands (NaN below LEAK_MIN_HANDS), so a few hands are
+    never significant.
+    misplayed (per spot and hand) is hands x half the summed |diff|: the
+    decisions that went against the chart. spot_error is misplayed over
+    hands for each spot.
+    """
+
+    def __init__(self, data, chart):
+        self.chart = chart
+        opportunities = data.counts[:, :, :, 0, :].astype(float)
+        scored = chart.defined[:, :, :, None] & (opportunities > 0)
+        self.hands = np.where(scored, opportunities, 0)
+        self.played = data.frequencies()
+        self.diff = np.where(scored[:, :, :, None, :], self.played - chart.frequencies, np.nan)
+        expected = np.clip(chart.frequencies, LEAK_FREQUENCY_FLOOR, 1 - LEAK_FREQUENCY_FLOOR)
+        hands = np.where(self.hands >= LEAK_MIN_HANDS, self.hands, np.nan)[:, :, :, None, :]
+        self.z = self.diff / np.sqrt(expected * (1 - expected) / hands)
+        self.misplayed = np.nansum(np.abs(self.diff), axis=3) / 2 * self.hands
+        hands_per_spot = self.hands.sum(axis=-1)
+        self.spot_error = np.divide(self.misplayed.sum(axis=-1), hands_per_spot,
+                                    out=np.full(hands_per_spot.shape, np.nan), where=hands_per_spot > 0)
+
+    def covers(self, kind, position, vs_position=None):
+        return bool(self.chart.defined[SPOT_KIND_INDEX[kind], POSITION_INDEX[position], _vs_index(vs_position)])
+
+    def grid(self, kind, position, vs_position=None, actions=("raise",)):
+        """169 differences in the summed frequency of actions for one spot (NaN = not scored)."""
+        diff = self.diff[SPOT_KIND_INDEX[kind], POSITION_INDEX[position], _vs_index(vs_position)]
+        return sum(diff[CHART_ACTIONS.index(action)] for action in actions)
+
+    def leaks(self, limit=50, min_z=LEAK_MIN_Z):
+        """Significant deviations, most misplayed decisions first.
+
+        Returns [(kind, position, vs_position, action, hand class name, hands,
+        played frequency, chart frequency, z, misplayed), ...] for raise and
+        call (fold mirrors them); misplayed is hands x |diff| for that action.
+        """
+        diff = self.diff[:, :, :, :2]
+        significant = np.abs(np.nan_to_num(self.z[:, :, :, :2])) >= min_z
+        misplayed = np.where(significant, np.abs(np.nan_to_num(diff)) * self.hands[:, :, :, None, :], 0)
+        order = np.argsort(misplayed, axis=None, kind='stable')[::-1]
+        order = order[misplayed.flat[order] > 0][:limit]
+        leaks = []
+        for cell in zip(*np.unravel_index(order, misplayed.shape)):
+            kind, position, vs, action, hand_class = cell
+            leaks.append((SPOT_KINDS[kind], POSITIONS[position], None if vs == VS_NONE else POSITIONS[vs],
+                          CHART_ACTIONS[action], HAND_CLASS_NAMES[hand_class],
+                          int(self.hands[kind, position, vs, hand_class]), float(self.played[cell]),
+                          float(self.chart.frequencies[cell]), float(self.z[cell]), float(misplayed[cell])))
+        return leaks
+
+
+def score_deviations(data, chart):
+    """DeviationReport of data (a RangeMatrix) against chart."""
+    return DeviationReport(data, chart)
+
+
+# --- マトリクス表示用のセル計算 ---
+
+# display_mode ごとの (バーに使う action_counts のキー, セルの文字表示のラベルとキー)
+# バーの並びと色は matrix_cell_bars が freq1, freq2, freq3 から決める
+MATRIX_MODE_LAYOUTS = {
+    "open_freq": (("raise", "limp", "fold"), (("R", "raise"), ("L", "limp"), ("F", "fold"))),
+    "bb_defense_freq": (("call", "raise", "fold"), (("R", "raise"), ("C", "call"), ("F", "fold"))),
+    "threeway_freq": (("raise", "call", "fold"), (("R", "raise"), ("C", "call"), ("F", "fold"))),
+}
+
+
+def compute_matrix_cells(opportunity_counts=None, action_counts=None, display_mode="count"):
+    """Compute bar fractions and cell texts for all 169 cells at once.
+
+    Returns (freqs, texts, redraw_mode): freqs is a (169, 3) array of the
+    freq1..freq3 values passed to matrix_cell_bars, texts the cell labels
+    in hand-class order.
+    """
+    action_counts = action_counts or {}
+    zeros = np.zeros(NUM_HAND_CLASSES, dtype=np.int64)
+    opportunities = np.asarray(opportunity_counts) if opportunity_counts is not None else zeros
+    freqs = np.zeros((NUM_HAND_CLASSES, 3))
+
+    if display_mode == "count":
+        counts = np.asarray(action_counts.get('main', zeros))
+        return freqs, [str(int(count)) for count in counts], "count"
+
+    if display_mode == "equity":
+        # action_counts['equity'] は 169 個の勝率 (NaN = 相手のレンジが空)。freq1 = 勝率, freq2 = 値の有無
+        equity = np.asarray(action_counts.get('equity', np.full(NUM_HAND_CLASSES, np.nan)), dtype=float)
+        known = ~np.isnan(equity)
+        freqs[known, 0] = equity[known]
+        freqs[known, 1] = 1.0
+        return freqs, [f"{value:.0%}" if ok else "N/A" for value, ok in zip(equity, known)], "equity"
+
+    if display_mode == "diff":
+        # action_counts['diff'] は 169 個の (実際の頻度 - チャートの頻度)。NaN = 比べられない
+        diff = np.asarray(action_counts.get('diff', np.full(NUM_HAND_CLASSES, np.nan)), dtype=float)
+        known = ~np.isnan(diff)
+        freqs[known, 0] = diff[known]
+        freqs[known, 1] = 1.0
+        return freqs, [f"{value:+.0%}" if ok else "N/A" for value, ok in zip(diff, known)], "diff"
+
+    if display_mode == "single_freq":
+        # Use whichever key is present in action_counts
+        key = next(iter(action_counts.keys()), None)
+        bar_keys, label_keys = (key,), ()
+    elif display_mode in MATRIX_MODE_LAYOUTS:
+        bar_keys, label_keys = MATRIX_MODE_LAYOUTS[display_mode]
+    else:
+        return freqs, [""] * NUM_HAND_CLASSES, "count"
+
+    counts = np.stack([np.asarray(action_counts.get(key, zeros)) for key in bar_keys])
+    has_opportunity = opportunities > 0
+    # Vectorized frequency for the whole grid: count / opportunity where opportunity > 0
+    action_freqs = np.divide(counts, opportunities, out=np.zeros(counts.shape), where=has_opportunity)
+    freqs[:, :len(bar_keys)] = action_freqs.T
+    has_actions = counts.any(axis=0)
+    # Opportunity missing but actions recorded: indicate error with a full bar
+    error_cells = ~has_opportunity & has_actions
+    freqs[error_cells] = (1.0, 0.0, 0.0)
+
+    freq_by_key = dict(zip(bar_keys, action_freqs))
+    texts = []
+    for cell in range(NUM_HAND_CLASSES):
+        if error_cells[cell]:
+            texts.append("Err")
+        elif not has_opportunity[cell]:
+            texts.append("N/A")
+        elif not action_freqs[:, cell].any():
+            texts.append("0%")
+        elif display_mode == "single_freq":
+            texts.append(f"{action_freqs[0, cell]:.0%}")
+        else:
+            texts.append("\n".join(f"{label}:{freq_by_key[key][cell]:.0%}" for label, key in label_keys))
+    return freqs, texts, display_mode
+
+
+MATRIX_BG_COLOR = '#F0F0F0'
+RAISE_COLOR = "#FF0058" # Red
+LIMP_COLOR = "#FFFF99" # Light Yellow
+CALL_COLOR = "#62E45A" # Green
+FOLD_COLOR = "#0A92CF" # Blue
+EQUITY_COLOR_RANGE = (0.3, 0.7) # ヒートマップでこの勝率以下は青、以上は赤 (0.5 が白)
+DIFF_COLOR_LIMIT = 0.5 # チャートとの差のヒートマップはこの差で色が最も濃くなる
+
+
+def _diverging_color(amount):
+    # -1 (FOLD_COLOR の青) から 0 (白) を経て 1 (RAISE_COLOR の赤) まで
+    target = RAISE_COLOR if amount >= 0 else FOLD_COLOR
+    amount = min(1.0, abs(amount))
+    channels = [round(255 + (int(target[i:i + 2], 16) - 255) * amount) for i in (1, 3, 5)]
+    return "#" + "".join(f"{channel:02X}" for channel in channels)
+
+
+def equity_heat_color(equity):
+    """Blue (FOLD_COLOR) below 50% equity through white to red (RAISE_COLOR) above."""
+    low, high = EQUITY_COLOR_RANGE
+    return _diverging_color((equity - 0.5) / ((high - low) / 2))
+
+
+def matrix_cell_bars(freq1, freq2, freq3, mode):
+    """Return the stacked bars of one cell as [(fraction, color), ...] in drawing order."""
+    if mode == "open_freq":
+        # freq1: raise, freq2: limp, freq3: fold
+        return [(freq1, RAISE_COLOR), (freq2, LIMP_COLOR), (freq3, FOLD_COLOR)]
+    if mode == "bb_defense_freq":
+        # freq1 is Call Freq, freq2 is Raise Freq, freq3 is Fold Freq; drawn Raise, Call, Fold
+        return [(freq2, RAISE_COLOR), (freq1, CALL_COLOR), (freq3, FOLD_COLOR)]
+    if mode == "single_freq":
+        return [(freq1, RAISE_COLOR)]
+    if mode == "threeway_freq":
+        # freq1: raise (red), freq2: call (green), freq3: fold (blue)
+        return [(freq1, RAISE_COLOR), (freq2, CALL_COLOR), (freq3, FOLD_COLOR)]
+    if mode == "equity":
+        # freq1: equity, freq2: 1 if the cell has a value; the whole cell is colored
+        return [(1.0, equity_heat_color(freq1))] if freq2 else []
+    if mode == "diff":
+        # freq1: played minus chart frequency, freq2: 1 if the cell has a value
+        return [(1.0, _diverging_color(freq1 / DIFF_COLOR_LIMIT))] if freq2 else []
+    return [] # Count mode or unknown - just background
+
+
+# --- 表示するマトリクスの一覧 (GUI のタブとエクスポート共通) ---
+
+MATRIX_ACTION_TYPES = ("Open", "BB Defense", "3bet")
+# Action Type ごとに Position で選べるポジション (BB はオープンしない。BB Defense では相手のポジション)
+MATRIX_POSITIONS = {
+    "Open": ["UTG", "HJ", "CO", "BTN", "SB"],
+    "BB Defense": ["UTG", "HJ", "CO", "BTN", "SB"],
+    "3bet": ["UTG", "HJ", "CO", "BTN", "SB", "BB"],
+}
+
+
+def _freq_view(title, data, spot, display_mode, action_keys):
+    # action_keys: {action_counts のキー: RANGE_ACTIONS の名前}
+    return (title, lambda: dict(
+        opportunity_counts=data.grid(*spot, "opportunity"),
+        action_counts={key: data.grid(*spot, action) for key, action in action_keys.items()},
+        display_mode=display_mode,
+    ), ("opportunity",))
+
+
+def _count_view(title, data, spot, actions):
+    return (title, lambda: dict(
+        action_counts={'main': sum(data.grid(*spot, action) for action in actions)},
+        display_mode="count",
+    ), actions)
+
+
+def iter_matrix_views(data, action_type, position="ALL"):
+    """Yield (spot, views) for every spot of one Action Type that has data, in tab order.
+
+    spot is (kind, position, vs_position) and views a list of (title,
+    make_tab_args, drill_actions): make_tab_args() returns the
+    create_matrix_tab / render_matrix_svg keyword arguments from the current
+    counts of data, and drill_actions the actions a clicked cell lists.
+    """
+    positions = MATRIX_POSITIONS[action_type] if position == "ALL" else [position]
+    if action_type == "Open":
+        for pos in positions:
+            spot = ("open", pos, None)
+            if data.has_data(*spot):
+                yield spot, [
+                    _freq_view(f"{pos} Raise Freq %", data, spot, "open_freq",
+                               {'raise': "raise", 'limp': "call", 'fold': "fold"}),
+                    _count_view(f"{pos} Raise Opp. ALL (Counts)", data, spot, ("opportunity",)),
+                    _count_view(f"{pos} Raise Actual (Counts)", data, spot, ("raise",)),
+                ]
+    elif action_type == "BB Defense":
+        for vs_pos in positions:
+            spot = ("bb_defense", "BB", vs_pos)
+            if data.has_data(*spot):
+                yield spot, [
+                    _freq_view(f"BB Def Freq (vs {vs_pos})", data, spot, "bb_defense_freq",
+                               {'call': "call", 'raise': "raise", 'fold': "fold"}),
+                    _count_view(f"BB Def Opp ALL (Counts vs {vs_pos})", data, spot, ("opportunity",)),
+                    _count_view(f"BB Def Actual (Counts vs {vs_pos})", data, spot, ("call", "raise")),
+                    _count_view(f"BB Fold (Counts vs {vs_pos})", data, spot, ("fold",)),
+                ]
+    elif action_type == "3bet":
+        threeway = {'raise': "raise", 'call': "call", 'fold': "fold"}
+        for pos in positions:
+            vs_positions = data.vs_positions_with_opportunities("threebet", pos)
+            if vs_positions:
+                for vs_pos in [p for p in MATRIX_POSITIONS["3bet"] if p != pos and p in vs_positions]:
+                    spot = ("threebet", pos, vs_pos)
+                    yield spot, [
+                        _freq_view(f"{pos} vs {vs_pos} 3bet spot Freq %", data, spot, "threeway_freq", threeway),
+                        _count_view(f"{pos} vs {vs_pos} Opp count", data, spot, ("opportunity",)),
+                        _count_view(f"{pos} vs {vs_pos} 3bet Actual count", data, spot, ("raise",)),
+                        _count_view(f"{pos} vs {vs_pos} cold call Actual count", data, spot, ("call",)),
+                        _count_view(f"{pos} vs {vs_pos} fold Actual count", data, spot, ("fold",)),
+                    ]
+            # 相手別の内訳が無ければ全体を出す
+            elif data.has_data("threebet", pos):
+                spot = ("threebet", pos, None)
+                yield spot, [_freq_view(f"{pos} 3bet spot Freq %", data, spot, "threeway_freq", threeway)]
+
+
+# --- エクスポート (Tk を使わずに SVG / PNG / HTML) ---
+# セルの値と色は GUI と同じ compute_matrix_cells / matrix_cell_bars で決める。
+# マトリクスごとに別プロセスで描く (PNG は Pillow があるときだけ)。
+
+EXPORT_FORMATS = ("svg", "png", "html")
+EXPORT_CELL_WIDTH = 60 # 頻度表示の3行が収まる大きさ (GUI の最小セルより大きい)
+EXPORT_CELL_HEIGHT = 48
+EXPORT_HEADER_SIZE = 24 # 行・列見出しの幅/高さ (GUI の MATRIX_HEADER_SIZE と同じ)
+EXPORT_TITLE_HEIGHT = 28
+EXPORT_REPORT_NAME = "report.html"
+
+
+def _matrix_layout(display_mode, opportunity_counts, action_counts):
+    # [(x0, y0, x1, y1, fill, outline)] の矩形と [(x, y, text)] の文字 (画像の左上が原点)
+    freqs, texts, mode = compute_matrix_cells(opportunity_counts, action_counts, display_mode)
+    top = EXPORT_TITLE_HEIGHT
+    rects, labels = [], []
+    for i, rank in enumerate(RANKS):
+        x0 = EXPORT_HEADER_SIZE + i * EXPORT_CELL_WIDTH
+        rects.append((x0, top, x0 + EXPORT_CELL_WIDTH, top + EXPORT_HEADER_SIZE, None, "black"))
+        labels.append((x0 + EXPORT_CELL_WIDTH / 2, top + EXPORT_HEADER_SIZE / 2, rank))
+        y0 = top + EXPORT_HEADER_SIZE + i * EXPORT_CELL_HEIGHT
+        rects.append((0, y0, EXPORT_HEADER_SIZE, y0 + EXPORT_CELL_HEIGHT, None, "black"))
+        labels.append((EXPORT_HEADER_SIZE / 2, y0 + EXPORT_CELL_HEIGHT / 2, rank))
+    for cell in range(NUM_HAND_CLASSES):
+        r, c = divmod(cell, len(RANKS))
+        x0 = EXPORT_HEADER_SIZE + c * EXPORT_CELL_WIDTH
+        y0 = top + EXPORT_HEADER_SIZE + r * EXPORT_CELL_HEIGHT
+        current_x = x0
+        for fraction, color in matrix_cell_bars(*freqs[cell], mode):
+            bar_width = EXPORT_CELL_WIDTH * fraction
+            if bar_width > 0:
+                rects.append((current_x, y0, current_x + bar_width, y0 + EXPORT_CELL_HEIGHT, color, None))
+            current_x += bar_width
+        if current_x < x0 + EXPORT_CELL_WIDTH:
+            rects.append((current_x, y0, x0 + EXPORT_CELL_WIDTH, y0 + EXPORT_CELL_HEIGHT, MATRIX_BG_COLOR, None))
+        rects.append((x0, y0, x0 + EXPORT_CELL_WIDTH, y0 + EXPORT_CELL_HEIGHT, None, "lightgrey"))
+        labels.append((x0 + EXPORT_CELL_WIDTH / 2, y0 + EXPORT_CELL_HEIGHT / 2, texts[cell]))
+    return rects, labels
+
+
+def _export_size():
+    return (EXPORT_HEADER_SIZE + len(RANKS) * EXPORT_CELL_WIDTH,
+            EXPORT_TITLE_HEIGHT + EXPORT_HEADER_SIZE + len(RANKS) * EXPORT_CELL_HEIGHT)
+
+
+def render_matrix_svg(title, opportunity_counts=None, action_counts=None, display_mode="count"):
+    """One matrix as a standalone SVG document (str), drawn like the GUI tab."""
+    width, height = _export_size()
+    rects, labels = _matrix_layout(display_mode, opportunity_counts, action_counts)
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="11">',
+             f'<rect width="{width}" height="{height}" fill="{MATRIX_BG_COLOR}"/>',
+             f'<text x="4" y="{EXPORT_TITLE_HEIGHT / 2}" dominant-baseline="central" font-size="14" '
+             f'font-weight="bold">{html.escape(title)}</text>']
+    for x0, y0, x1, y1, fill, outline in rects:
+        paint = f'fill="{fill}"' if fill else 'fill="none"'
+        if outline:
+            paint += f' stroke="{outline}"'
+        parts.append(f'<rect x="{x0:g}" y="{y0:g}" width="{x1 - x0:g}" height="{y1 - y0:g}" {paint}/>')
+    for x, y, text in labels:
+        lines = text.split("\n")
+        first_dy = -(len(lines) - 1) / 2 # 複数行は中央揃え (em 単位)
+        spans = "".join(f'<tspan x="{x:g}" dy="{first_dy if i == 0 else 1:g}em">{html.escape(line)}</tspan>'
+                        for i, line in enumerate(lines))
+        parts.append(f'<text text-anchor="middle" dominant-baseline="central" y="{y:g}">{spans}</text>')
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+_PNG_TEXT_MASKS = {} # 行の文字列 -> (マスク, 中心からの左上のずれ)。ラベルはほとんど同じ文字列の繰り返し
+
+
+def _png_text_mask(font, line):
+    from PIL import Image, ImageDraw
+    cached = _PNG_TEXT_MASKS.get(line)
+    if cached is None:
+        left, top, right, bottom = font.getbbox(line, anchor="mm")
+        mask = Image.new("L", (max(1, right - left), max(1, bottom - top)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), line, fill=255, font=font, anchor="mm")
+        cached = _PNG_TEXT_MASKS[line] = (mask, left, top)
+    return cached
+
+
+def render_matrix_png(title, opportunity_counts=None, action_counts=None, display_mode="count"):
+    """One matrix as PNG bytes (needs Pillow)."""
+    from PIL import Image, ImageDraw, ImageFont
+    import io
+    width, height = _export_size()
+    image = Image.new("RGB", (width, height), MATRIX_BG_COLOR)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    draw.text((4, EXPORT_TITLE_HEIGHT / 2), title, fill="black", anchor="lm", font=font)
+    rects, labels = _matrix_layout(display_mode, opportunity_counts, action_counts)
+    for x0, y0, x1, y1, fill, outline in rects:
+        left, right = round(x0), round(x1)
+        if fill and not outline:
+            right -= 1 # 塗りだけの帯は右端を含めない (隣の帯と重ならないように)
+        if right >= left:
+            draw.rectangle((left, round(y0), right, round(y1)), fill=fill, outline=outline)
+    line_height = font.getbbox("Ag")[3] + 2
+    for x, y, text in labels:
+        lines = text.split("\n")
+        for i, line in enumerate(lines):
+            if not line:
+                continue
+            mask, left, top = _png_text_mask(font, line)
+            line_y = y + (i - (len(lines) - 1) / 2) * line_height
+            box = (round(x + left), round(line_y + top))
+            image.paste("black", box + (box[0] + mask.width, box[1] + mask.height), mask)
+    output = io.BytesIO()
+    image.save(output, format="PNG", compress_level=1) # 速さ優先 (単色の塗りが多いので大きさはあまり変わらない)
+    return output.getvalue()
+
+
+def _export_filename(title):
+    return re.sub(r"[^\w.-]+", "_", title.replace("%", "pct")).strip("_")
+
+
+def _render_matrix_files(title, tab_args, formats, base_path):
+    # 1つのマトリクスを formats のファイルに書き、HTML 用に SVG の文字列を返す (ワーカープロセスで実行される)
+    svg = None
+    if "svg" in formats or "html" in formats:
+        svg = render_matrix_svg(title, **tab_args)
+    if "svg" in formats:
+        with open(base_path + ".svg", "w", encoding="utf-8") as f:
+            f.write(svg)
+    if "png" in formats:
+        with open(base_path + ".png", "wb") as f:
+            f.write(render_matrix_png(title, **tab_args))
+    return svg if "html" in formats else None
+
+
+def export_matrices(data, output_dir, formats=("svg",), workers=1, title="Ranges"):
+    """Render every matrix the GUI can show for data into output_dir.
+
+    Writes one file per matrix and format ("svg", "png") and/or one
+    EXPORT_REPORT_NAME page ("html") with all of them inline, grouped by
+    Action Type. Matrices are rendered on a process pool. Returns the
+    number of matrices.
+    """
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"unknown export format(s): {', '.join(sorted(unknown))}")
+    if "png" in formats:
+        try:
+            import PIL # noqa: F401 (ワーカーで使う前に、無ければここで止める)
+        except ImportError:
+            raise ImportError("PNG export needs Pillow (pip install pillow)") from None
+    os.makedirs(output_dir, exist_ok=True)
+    sections = []
+    tasks = []
+    for action_type in MATRIX_ACTION_TYPES:
+        titles = []
+        for _, views in iter_matrix_views(data, action_type):
+            for view_title, make_tab_args, _ in views:
+                base_path = os.path.join(output_dir, _export_filename(f"{action_type} {view_title}"))
+                tasks.append((view_title, make_tab_args(), tuple(formats), base_path))
+                titles.append(view_title)
+        sections.append((action_type, titles))
+    svgs = iter(list(_iter_parsed_files(_render_matrix_files, tasks, workers)))
+    if "html" in formats:
+        with open(os.path.join(output_dir, EXPORT_REPORT_NAME), "w", encoding="utf-8") as f:
+            f.write(_report_html(title, [(action_type, [next(svgs) for _ in titles])
+                                         for action_type, titles in sections]))
+    return len(tasks)
+
+
+def _report_html(title, sections):
+    body = [f"<h1>{html.escape(title)}</h1>"]
+    for action_type, svgs in sections:
+        if not svgs:
+            continue
+        body.append(f"<h2>{html.escape(action_type)}</h2>")
+        body.append('<div class="matrices">' + "".join(f"<figure>{svg}</figure>" for svg in svgs) + "</div>")
+    return ("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+            f"<title>{html.escape(title)}</title><style>body{{font-family:sans-serif}}"
+            ".matrices{display:flex;flex-wrap:wrap;gap:12px}figure{margin:0}</style></head>\n<body>\n"
+            + "\n".join(body) + "\n</body></html>\n")
+
+
+# --- バッチ解析 (ヘッドレス) ---
+
+def process_directory(history_dir, hero_name, workers=1, cache=None, profile=None, dedup_index=None,
+                      hand_store=None):
+    """Analyze every hand-history file in history_dir for hero_name.
+
+    Returns (RangeMatrix, hand_count). This is the same pipeline the GUI runs,
+    so it can be used on servers without a display. With a HandStore, every
+    counted spot is also added to it as a row.
+    """
+    data = RangeMatrix()
+    hand_count = 0
+    for partial, partial_hand_count in iter_file_aggregates(
+            list_hand_history_files(history_dir), hero_name, workers, cache=cache, profile=profile,
+            dedup_index=dedup_index, hand_store=hand_store):
+        data.merge(partial)
+        hand_count += partial_hand_count
+    return data, hand_count
+
+
+RESULT_FILE_EXTENSION = SNAPSHOT_FILE_EXTENSION
+POPULATION_FILE_EXTENSION = ".pps"
+
+
+def _result_filename(history_dir, hero_name, extension=RESULT_FILE_EXTENSION):
+    # ファイル名に使えない文字は "_" に置き換える
+    dir_name = os.path.basename(os.path.normpath(history_dir)) or "history"
+    name = f"{dir_name}__{hero_name}"
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", name) + extension
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze hand-history directories without the GUI and write one "
+                    "range snapshot (" + RESULT_FILE_EXTENSION + ") per directory and hero.")
+    parser.add_argument("directories", nargs="+",
+                        help="hand-history directories (snapshot files with --merge)")
+    parser.add_argument("--hero", action="append", dest="heroes", metavar="NAME",
+                        help="hero name (repeatable). Auto-detected per directory when omitted.")
+    parser.add_argument("--output-dir", default=".", help="where result files are written (default: .)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="parser processes (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the analysis cache")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="count a hand every time it appears instead of once per hand ID")
+    parser.add_argument("--hand-store", action="store_true",
+                        help="also write the hero's spots as a " + HAND_STORE_FILE_EXTENSION
+                             + " row file (HandStore.load) per directory and hero")
+    parser.add_argument("--export-dir", metavar="DIR",
+                        help="also render every matrix of each result into DIR/<result name>/ without Tk")
+    parser.add_argument("--export-formats", default="html",
+                        help="comma-separated subset of " + ", ".join(EXPORT_FORMATS) + " (default: html; png needs Pillow)")
+    parser.add_argument("--chart", metavar="PATH",
+                        help="reference chart (JSON) to compare each result with; prints the biggest leaks")
+    parser.add_argument("--population", action="store_true",
+                        help="count spots for every seated player instead of one hero and write one "
+                             + POPULATION_FILE_EXTENSION + " file per directory (--hero is ignored)")
+    parser.add_argument("--profile-json", metavar="PATH",
+                        help="time each pipeline stage and write the totals to PATH as JSON")
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="run under cProfile and write pstats output to PATH (implies --workers 1)")
+    parser.add_argument("--merge", metavar="OUT",
+                        help="merge the given snapshot files into OUT instead of analyzing directories")
+    args = parser.parse_args(argv)
+
+    if args.merge:
+        return _main_merge(args)
+    if args.population:
+        return _main_population(args)
+    if args.cprofile:
+        import cProfile
+        args.workers = 1 # cProfile はこのプロセスしか見えない
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(_main_heroes, args)
+        finally:
+            profiler.dump_stats(args.cprofile)
+            print(f"cProfile stats written to {args.cprofile}", file=sys.stderr)
+    return _main_heroes(args)
+
+
+def _main_heroes(args):
+    profile = StageProfile() if args.profile_json else None
+    chart = None
+    if args.chart:
+        try:
+            chart = ReferenceChart.load(args.chart)
+        except (OSError, ValueError) as e:
+            print(f"error: could not load chart: {e}", file=sys.stderr)
+            return 1
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = AnalysisCache()
+        except (OSError, sqlite3.Error) as e:
+            print(f"warning: analysis cache unavailable ({e})", file=sys.stderr)
+    export_formats = [name.strip() for name in args.export_formats.split(",") if name.strip()]
+    unknown_formats = set(export_formats) - set(EXPORT_FORMATS)
+    if unknown_formats:
+        print(f"error: unknown export format(s): {', '.join(sorted(unknown_formats))}", file=sys.stderr)
+        return 1
+    dedup_index = _open_dedup_index(args)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    exit_code = 0
+    try:
+        for history_dir in args.directories:
+            if not os.path.isdir(history_dir):
+                print(f"error: not a directory: {history_dir}", file=sys.stderr)
+                exit_code = 1
+                continue
+            heroes = args.heroes or [detect_hero_from_files(history_dir)]
+            for hero_name in heroes:
+                if not hero_name:
+                    print(f"error: could not auto-detect hero in {history_dir}", file=sys.stderr)
+                    exit_code = 1
+                    continue
+                hand_store = HandStore() if args.hand_store else None
+                data, hand_count = process_directory(history_dir, hero_name, max(1, args.workers),
+                                                     cache=cache, profile=profile, dedup_index=dedup_index,
+                                                     hand_store=hand_store)
+                _report_duplicates(history_dir, dedup_index)
+                output_path = os.path.join(args.output_dir, _result_filename(history_dir, hero_name))
+                snapshot = RangeSnapshot(data, hand_count, len(list_hand_history_files(history_dir)),
+                                         [hero_name], [os.path.abspath(history_dir)])
+                snapshot.save(output_path)
+                if hand_store is not None:
+                    hand_store.save(os.path.join(args.output_dir, _result_filename(
+                        history_dir, hero_name, HAND_STORE_FILE_EXTENSION)))
+                print(f"{history_dir}\t{hero_name}\t{hand_count} hands\t{output_path}")
+                if chart is not None:
+                    _print_leaks(score_deviations(data, chart))
+                if args.export_dir:
+                    export_dir = os.path.join(args.export_dir, os.path.splitext(os.path.basename(output_path))[0])
+                    try:
+                        matrix_count = export_matrices(data, export_dir, export_formats, max(1, args.workers),
+                                                       title=f"{hero_name} - {history_dir} ({hand_count} hands)")
+                    except (ImportError, OSError) as e:
+                        print(f"error: export failed: {e}", file=sys.stderr)
+                        exit_code = 1
+                    else:
+                        print(f"  exported {matrix_count} matrices to {export_dir}")
+    finally:
+        if cache is not None:
+            cache.close()
+        if dedup_index is not None:
+            dedup_index.close()
+    if profile is not None:
+        profile.dump_json(args.profile_json, directories=args.directories, workers=args.workers)
+        print(f"profile: {profile.summary_line()} (written to {args.profile_json})", file=sys.stderr)
+    return exit_code
+
+
+def _print_leaks(report, limit=20):
+    for kind, position, vs_position, action, hand, hands, played, expected, z, misplayed in report.leaks(limit):
+        spot = f"{position} vs {vs_position}" if vs_position else position
+        print(f"  leak\t{kind} {spot}\t{action}\t{hand}\t{hands} hands\t{played:.0%} (chart {expected:.0%})"
+              f"\tz={z:+.1f}\t{misplayed:.0f} misplayed")
+
+
+def _open_dedup_index(args):
+    if args.no_dedup:
+        return None
+    try:
+        return HandIdIndex()
+    except (OSError, sqlite3.Error) as e:
+        print(f"warning: hand-ID index unavailable, duplicates are counted ({e})", file=sys.stderr)
+        return None
+
+
+def _report_duplicates(history_dir, dedup_index):
+    if dedup_index is not None and dedup_index.duplicate_count:
+        print(f"{history_dir}: skipped {dedup_index.duplicate_count} duplicate hands", file=sys.stderr)
+
+
+def _main_merge(args):
+    try:
+        merged = merge_snapshots(RangeSnapshot.load(path) for path in args.directories)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    merged.save(args.merge)
+    print(f"{args.merge}\t{len(args.directories)} snapshots\t{merged.hand_count} hands\t"
+          f"{', '.join(sorted(merged.hero_names)) or '-'}")
+    return 0
+
+
+def _main_population(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    dedup_index = _open_dedup_index(args)
+    exit_code = 0
+    try:
+        for history_dir in args.directories:
+            if not os.path.isdir(history_dir):
+                print(f"error: not a directory: {history_dir}", file=sys.stderr)
+                exit_code = 1
+                continue
+            population, hand_count = process_directory_population(history_dir, max(1, args.workers), dedup_index)
+            _report_duplicates(history_dir, dedup_index)
+            output_path = os.path.join(args.output_dir,
+                                       _result_filename(history_dir, "population", POPULATION_FILE_EXTENSION))
+            with open(output_path, "wb") as f:
+                f.write(population.to_bytes())
+            print(f"{history_dir}\t{len(population)} players\t{hand_count} hands\t{output_path}")
+    finally:
+        if dedup_index is not None:
+            dedup_index.close()
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# テスト共通の設定とデータ
+# range_analyzer.py は utils_judge.py (このリポジトリには含まれない) を必要とするので、
+# 各テストモジュールは先頭で pytest.importorskip("utils_judge") してからインポートする。
+import bz2
+import gzip
+import os
+import re
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hand_generator  # noqa: E402
+
+HERO_NAME = "Hero"
+
+# hand_generator で作る履歴の種類: 名前 -> write_hand_histories の引数
+GENERATED_HISTORIES = {
+    "pokerstars": dict(hand_format="pokerstars", table_size=6, seed=1),
+    "zoom": dict(hand_format="zoom", table_size=6, seed=2),
+    "poker_hand": dict(hand_format="poker_hand", table_size=6, seed=3),
+    "heads_up": dict(hand_format="pokerstars", table_size=2, seed=4),
+}
+GENERATED_HANDS = 600
+GENERATED_HANDS_PER_FILE = 200
+
+
+@pytest.fixture(scope="session")
+def history_dirs(tmp_path_factory):
+    """{name: directory} of deterministic hand histories, one directory per GENERATED_HISTORIES entry."""
+    root = tmp_path_factory.mktemp("histories")
+    dirs = {}
+    for name, options in GENERATED_HISTORIES.items():
+        dirs[name] = str(root / name)
+        hand_generator.write_hand_histories(dirs[name], GENERATED_HANDS, GENERATED_HANDS_PER_FILE,
+                                            hero_name=HERO_NAME, num_opponents=40, **options)
+    return dirs
+
+
+@pytest.fixture(scope="session")
+def mixed_history_dir(tmp_path_factory, history_dirs):
+    """One directory of hands that differ in day, stakes and table size.
+
+    The 6-max $0.02/$0.05 hands of 2023/01/01, the heads-up hands moved to
+    2023/01/02 and 200 6-max $0.05/$0.10 hands moved to 2023/01/04.
+    """
+    target = tmp_path_factory.mktemp("mixed")
+    for name, date in (("pokerstars", b"2023/01/01"), ("heads_up", b"2023/01/02")):
+        for filename in sorted(os.listdir(history_dirs[name])):
+            with open(os.path.join(history_dirs[name], filename), "rb") as f:
+                (target / f"{name} {filename}").write_bytes(f.read().replace(b"2023/01/01", date))
+    for filepath in hand_generator.write_hand_histories(str(tmp_path_factory.mktemp("high_stakes")), 200, 200,
+                                                        hero_name=HERO_NAME, num_opponents=40, seed=5,
+                                                        stakes=(5, 10), start_hand_id=300000000000):
+        with open(filepath, "rb") as f:
+            (target / f"high_stakes {os.path.basename(filepath)}").write_bytes(
+                f.read().replace(b"2023/01/01", b"2023/01/04"))
+    return str(target)
+
+
+@pytest.fixture(params=sorted(GENERATED_HISTORIES))
+def history_dir(request, history_dirs):
+    """Each generated history directory in turn."""
+    return history_dirs[request.param]
+
+
+def write_compressed_copy(history_dir, target_dir, kind):
+    """Copy the *.txt files of history_dir into target_dir as .gz or .bz2 files, or one .zip archive."""
+    os.makedirs(target_dir, exist_ok=True)
+    names = sorted(name for name in os.listdir(history_dir) if name.endswith(".txt"))
+    if kind == "zip":
+        with zipfile.ZipFile(os.path.join(target_dir, "hands.zip"), "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("exports/", "")
+            archive.writestr("exports/readme.md", "not a hand history")
+            for name in names:
+                archive.write(os.path.join(history_dir, name), "exports/" + name)
+        return target_dir
+    opener = {"gz": gzip.open, "bz2": bz2.open}[kind]
+    for name in names:
+        with open(os.path.join(history_dir, name), "rb") as source, \
+                opener(os.path.join(target_dir, f"{name}.{kind}"), "wb") as target:
+            target.write(source.read())
+    return target_dir
+
+
+_HAND_START = re.compile(rb"^(?=(?:PokerStars (?:Zoom )?Hand|Poker Hand) #)", re.MULTILINE)
+
+
+def split_hands(filepath):
+    """Return the hands of a generated history file as a list of bytes (each with its trailing blank lines)."""
+    with open(filepath, "rb") as f:
+        return [hand for hand in _HAND_START.split(f.read()) if hand.strip()]
+
+
+def write_overlapping_copy(history_dir, target_dir):
+    """Copy history_dir into target_dir plus re-exports of hands it already holds.
+
+    "zz repeat.txt" is the first file again and "zz overlap.txt" the last five
+    hands of the first file followed by the first five of the second, so with
+    duplicates skipped target_dir counts exactly what history_dir does.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    names = sorted(name for name in os.listdir(history_dir) if name.endswith(".txt"))
+    for name in names:
+        with open(os.path.join(history_dir, name), "rb") as source, \
+                open(os.path.join(target_dir, name), "wb") as target:
+            target.write(source.read())
+    first, second = (split_hands(os.path.join(history_dir, name)) for name in names[:2])
+    with open(os.path.join(target_dir, "zz repeat.txt"), "wb") as f:
+        f.write(b"".join(first))
+    with open(os.path.join(target_dir, "zz overlap.txt"), "wb") as f:
+        f.write(b"".join(first[-5:] + second[:5]))
+    return target_dir
@@ -0,0 +1,84 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+
+@pytest.fixture
+def history_copy(tmp_path, history_dirs):
+    # キャッシュはファイルの mtime を見るので、書き換えてよいコピーで試す
+    target = tmp_path / "hh"
+    shutil.copytree(history_dirs["pokerstars"], target)
+    return str(target)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ra.AnalysisCache(str(tmp_path / "cache.sqlite3"))
+    yield cache
+    cache.close()
+
+
+def test_warm_run_is_served_from_cache(history_copy, cache):
+    cold = ra.process_directory(history_copy, HERO_NAME, cache=cache)
+    assert cache.hits == 0
+    warm = ra.process_directory(history_copy, HERO_NAME, cache=cache)
+    assert cache.hits == len(ra.list_hand_history_files(history_copy))
+    assert warm == cold
+
+
+def test_changed_file_is_parsed_again(history_copy, cache):
+    filepaths = ra.list_hand_history_files(history_copy)
+    ra.process_directory(history_copy, HERO_NAME, cache=cache)
+    with open(filepaths[0], "rb") as f:
+        first_hand = next(ra.iter_hand_bytes_from_stream(f))
+    with open(filepaths[0], "ab") as f:
+        f.write(first_hand)
+
+    cache.hits = 0
+    data, hand_count = ra.process_directory(history_copy, HERO_NAME, cache=cache)
+    assert cache.hits == len(filepaths) - 1
+    assert (data, hand_count) == ra.process_directory(history_copy, HERO_NAME)
+
+
+def test_entries_are_per_hero_and_extras(history_copy, cache):
+    filepath = ra.list_hand_history_files(history_copy)[0]
+    partial, hand_count = ra.parse_file_aggregates(filepath, HERO_NAME)
+    assert cache.get(filepath, HERO_NAME) is None
+    cache.put(filepath, HERO_NAME, partial, hand_count)
+
+    assert cache.get(filepath, HERO_NAME) == (partial, hand_count)
+    assert cache.get(filepath, "Player000001") is None
+    assert cache.get(filepath, HERO_NAME, dedup_key="dedup:0") is None
+    assert cache.get(filepath, HERO_NAME, extras=("rows",)) is None # 行なしで保存したので外れ
+
+
+def test_removed_file_is_a_miss(history_copy, cache):
+    filepath = ra.list_hand_history_files(history_copy)[0]
+    cache.get(filepath, HERO_NAME)
+    cache.put(filepath, HERO_NAME, *ra.parse_file_aggregates(filepath, HERO_NAME))
+    os.remove(filepath)
+    assert cache.get(filepath, HERO_NAME) is None
+
+
+def test_other_cache_version_is_discarded(tmp_path, history_copy):
+    path = str(tmp_path / "cache.sqlite3")
+    filepath = ra.list_hand_history_files(history_copy)[0]
+    cache = ra.AnalysisCache(path)
+    cache.get(filepath, HERO_NAME)
+    cache.put(filepath, HERO_NAME, *ra.parse_file_aggregates(filepath, HERO_NAME))
+    cache.close()
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (str(ra.ANALYSIS_CACHE_VERSION - 1),))
+
+    cache = ra.AnalysisCache(path)
+    try:
+        assert cache.get(filepath, HERO_NAME) is None
+    finally:
+        cache.close()
@@ -0,0 +1,78 @@
+# 解析パイプラインが元の GUI の analyze_data と同じ回数を数えることの確認
+# fixtures/golden/histories は 3 つの形式の手書きのハンド履歴で、expected.json はそれを
+# analyze_data の規則 (オープン・BB ディフェンス・3bet の判定) で手で数えた結果。
+# 期待値は utils_judge に依存しないが、解析自体が utils_judge を使うので無い環境では飛ばす。
+import json
+import os
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import write_compressed_copy, write_overlapping_copy  # noqa: E402
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "golden")
+GOLDEN_HISTORIES = os.path.join(GOLDEN_DIR, "histories")
+
+
+@pytest.fixture(scope="module")
+def golden():
+    """Return (hero name, RangeMatrix, hand_count) of expected.json."""
+    with open(os.path.join(GOLDEN_DIR, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    data = ra.RangeMatrix()
+    for kind, position, vs_position, action, hand, n in expected["counts"]:
+        data.add(kind, position, vs_position, action, ra.HAND_CLASS_INDEX[hand], n)
+    return expected["hero"], data, expected["hand_count"]
+
+
+def test_golden_expectations_are_not_empty(golden):
+    _, data, hand_count = golden
+    assert hand_count == 11 # ヒーローが座っていないハンドは数えない
+    assert data.total_hands() > 0
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_process_directory_matches_golden_counts(golden, workers):
+    hero_name, data, hand_count = golden
+    assert ra.process_directory(GOLDEN_HISTORIES, hero_name, workers) == (data, hand_count)
+
+
+def test_parallel_partials_arrive_in_file_order(golden):
+    hero_name = golden[0]
+    filepaths = ra.list_hand_history_files(GOLDEN_HISTORIES)
+    serial = list(ra.iter_file_aggregates(filepaths, hero_name, workers=1))
+    parallel = list(ra.iter_file_aggregates(filepaths, hero_name, workers=2))
+    assert [hand_count for _, hand_count in serial] == [5, 3, 3]
+    assert [hand_count for _, hand_count in parallel] == [5, 3, 3]
+    assert all(a == b for (a, _), (b, _) in zip(serial, parallel))
+
+
+def test_warm_cache_matches_golden_counts(golden, tmp_path):
+    hero_name, data, hand_count = golden
+    cache = ra.AnalysisCache(str(tmp_path / "cache.sqlite3"))
+    try:
+        assert ra.process_directory(GOLDEN_HISTORIES, hero_name, 2, cache=cache) == (data, hand_count)
+        assert ra.process_directory(GOLDEN_HISTORIES, hero_name, 2, cache=cache) == (data, hand_count)
+        assert cache.hits == len(ra.list_hand_history_files(GOLDEN_HISTORIES))
+    finally:
+        cache.close()
+
+
+@pytest.mark.parametrize("kind", ["gz", "bz2", "zip"])
+def test_compressed_histories_match_golden_counts(golden, tmp_path, kind):
+    hero_name, data, hand_count = golden
+    compressed = write_compressed_copy(GOLDEN_HISTORIES, str(tmp_path / kind), kind)
+    assert ra.process_directory(compressed, hero_name, 2) == (data, hand_count)
+
+
+def test_deduplicated_reexports_match_golden_counts(golden, tmp_path):
+    hero_name, data, hand_count = golden
+    overlapping = write_overlapping_copy(GOLDEN_HISTORIES, str(tmp_path / "overlap"))
+    index = ra.HandIdIndex(str(tmp_path / "hand_ids.sqlite3"))
+    try:
+        assert ra.process_directory(overlapping, hero_name, 2, dedup_index=index) == (data, hand_count)
+        assert index.duplicate_count > 0
+    finally:
+        index.close()
@@ -0,0 +1,62 @@
+# GUI のキャンセルは iter_file_aggregates に cancel_event を渡し、ジェネレータを途中で止める
+import threading
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_closing_early_keeps_the_partial_results(history_dirs, workers):
+    filepaths = ra.list_hand_history_files(history_dirs["zoom"])
+    file_results = ra.iter_file_aggregates(filepaths, HERO_NAME, workers)
+    partial, hand_count = next(file_results)
+    file_results.close() # キャンセル: 残りのファイルは解析しない
+    assert (partial, hand_count) == ra.parse_file_aggregates(filepaths[0], HERO_NAME)
+    with pytest.raises(StopIteration):
+        next(file_results)
+
+
+def test_cancelled_files_are_cached_and_resumed(tmp_path, history_dirs):
+    history_dir = history_dirs["poker_hand"]
+    filepaths = ra.list_hand_history_files(history_dir)
+    cache = ra.AnalysisCache(str(tmp_path / "cache.sqlite3"))
+    try:
+        file_results = ra.iter_file_aggregates(filepaths, HERO_NAME, cache=cache)
+        next(file_results)
+        file_results.close()
+        assert ra.process_directory(history_dir, HERO_NAME, cache=cache) == ra.process_directory(history_dir, HERO_NAME)
+        assert cache.hits == 1 # キャンセル前に解析したファイルだけキャッシュにある
+    finally:
+        cache.close()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("cached", [False, True])
+def test_cancel_event_keeps_the_indexes_in_step(tmp_path, history_dirs, workers, cached):
+    # キャンセル後も位置索引と HandStore には受け取ったファイルの分だけが入っている
+    filepaths = ra.list_hand_history_files(history_dirs["zoom"])
+    cache = ra.AnalysisCache(str(tmp_path / "cache.sqlite3")) if cached else None
+    try:
+        if cached:
+            for _ in ra.iter_file_aggregates(filepaths, HERO_NAME, cache=cache, location_index=ra.HandLocationIndex(),
+                                             hand_store=ra.HandStore()):
+                pass
+        location_index, hand_store, cancel_event = ra.HandLocationIndex(), ra.HandStore(), threading.Event()
+        data, hand_count = ra.RangeMatrix(), 0
+        for partial, partial_hand_count in ra.iter_file_aggregates(
+                filepaths, HERO_NAME, workers, cache=cache, location_index=location_index,
+                hand_store=hand_store, cancel_event=cancel_event):
+            data.merge(partial)
+            hand_count += partial_hand_count
+            cancel_event.set()
+    finally:
+        if cache is not None:
+            cache.close()
+    assert len(filepaths) > 1
+    assert (data, hand_count) == ra.parse_file_aggregates(filepaths[0], HERO_NAME)
+    assert (hand_store.range_matrix(), hand_store.hand_count()) == (data, hand_count)
+    assert location_index.filepaths == filepaths[:1]
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+# ~/.poker_range_maker のキャッシュと索引には触れない
+OFFLINE = ["--no-cache", "--no-dedup", "--workers", "1"]
+
+
+def test_writes_one_snapshot_per_directory_and_hero(tmp_path, history_dirs, capsys):
+    out = tmp_path / "out"
+    directories = [history_dirs["pokerstars"], history_dirs["zoom"]]
+    assert ra.main(directories + ["--hero", HERO_NAME, "--output-dir", str(out)] + OFFLINE) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    for history_dir, line in zip(directories, lines):
+        path = out / ra._result_filename(history_dir, HERO_NAME)
+        snapshot = ra.RangeSnapshot.load(str(path))
+        data, hand_count = ra.process_directory(history_dir, HERO_NAME)
+        assert snapshot.matrix == data and snapshot.hand_count == hand_count
+        assert snapshot.file_count == len(ra.list_hand_history_files(history_dir))
+        assert snapshot.hero_names == {HERO_NAME} and snapshot.sources == {os.path.abspath(history_dir)}
+        assert line == f"{history_dir}\t{HERO_NAME}\t{hand_count} hands\t{path}"
+
+
+def test_hero_is_detected_when_omitted(tmp_path, history_dirs):
+    assert ra.main([history_dirs["poker_hand"], "--output-dir", str(tmp_path)] + OFFLINE) == 0
+    assert os.listdir(tmp_path) == [ra._result_filename(history_dirs["poker_hand"], HERO_NAME)]
+
+
+def test_missing_directory_fails_without_stopping_the_rest(tmp_path, history_dirs, capsys):
+    missing = str(tmp_path / "missing")
+    exit_code = ra.main([missing, history_dirs["heads_up"], "--hero", HERO_NAME,
+                         "--output-dir", str(tmp_path / "out")] + OFFLINE)
+    assert exit_code == 1
+    assert f"not a directory: {missing}" in capsys.readouterr().err
+    assert os.listdir(tmp_path / "out") == [ra._result_filename(history_dirs["heads_up"], HERO_NAME)]
+
+
+def test_result_filenames_are_safe():
+    assert ra._result_filename("/data/hh 2023/", 'a:b"c') == "hh_2023__a_b_c.prs"
+    assert ra._result_filename("/", "Hero", ".pps") == "history__Hero.pps"
+
+
+def test_engine_imports_without_tkinter():
+    # tkinter の無いサーバーでも使える (import をブロックしても読み込める)
+    code = "import sys; sys.modules['tkinter'] = None; import range_analyzer"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
@@ -0,0 +1,40 @@
+import gzip
+import os
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME, write_compressed_copy  # noqa: E402
+
+
+@pytest.mark.parametrize("kind", ["gz", "bz2", "zip"])
+def test_compressed_folder_matches_plain_text(tmp_path, history_dirs, kind):
+    history_dir = history_dirs["zoom"]
+    compressed = write_compressed_copy(history_dir, str(tmp_path / kind), kind)
+    assert all(not name.endswith(".txt") for name in os.listdir(compressed))
+    assert ra.process_directory(compressed, HERO_NAME, 2) == ra.process_directory(history_dir, HERO_NAME)
+
+
+def test_zip_members_are_the_txt_files_only(tmp_path, history_dirs):
+    history_dir = history_dirs["poker_hand"]
+    compressed = write_compressed_copy(history_dir, str(tmp_path / "zip"), "zip")
+    streams = [stream.read() for stream in ra.iter_hand_history_streams(os.path.join(compressed, "hands.zip"))]
+    plain = [Path(path).read_bytes() for path in ra.list_hand_history_files(history_dir)]
+    assert streams == plain
+
+
+def test_truncated_archive_counts_what_could_be_read(tmp_path, history_dirs):
+    source = ra.list_hand_history_files(history_dirs["pokerstars"])[0]
+    whole = gzip.compress(Path(source).read_bytes())
+    path = tmp_path / "cut.txt.gz"
+    path.write_bytes(whole[:len(whole) // 2])
+
+    _, hand_count = ra.parse_file_aggregates(str(path), HERO_NAME)
+    _, full_count = ra.parse_file_aggregates(source, HERO_NAME)
+    assert 0 < hand_count < full_count
+    assert len(ra.scan_hand_ids(str(path))) >= hand_count
+    (tmp_path / "broken.zip").write_bytes(b"PK\x03\x04 not really a zip")
+    assert ra.parse_file_aggregates(str(tmp_path / "broken.zip"), HERO_NAME)[1] == 0
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME, split_hands, write_overlapping_copy  # noqa: E402
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = ra.HandIdIndex(str(tmp_path / "hand_ids.sqlite3"))
+    yield index
+    index.close()
+
+
+def test_hand_id_keys():
+    assert ra.hand_id_key(b"PokerStars Hand #123: Hold'em") == 123
+    assert ra.hand_id_key(b"PokerStars Zoom Hand #123: Hold'em") == 123 # 通常卓と Zoom は同じ番号空間
+    rc, hd = ra.hand_id_key(b"Poker Hand #RC123: Hold'em"), ra.hand_id_key(b"Poker Hand #HD123: Hold'em")
+    assert rc != hd and rc != 123
+    assert rc & ra._HAND_ID_HASHED and hd & ra._HAND_ID_HASHED
+    assert ra.hand_id_key(b"Poker Hand #RC123: other text") == rc
+    assert ra.hand_id_key(b"PokerStars Hand #%d:" % (1 << 63)) & ra._HAND_ID_HASHED
+    assert ra.hand_id_key(b"Table 'Pallas' 6-max Seat #1 is the button") is None
+
+
+def test_dedup_cache_key():
+    assert ra.dedup_cache_key(None) == ""
+    skip = np.array([1, 5], dtype=np.uint64)
+    assert ra.dedup_cache_key(skip).startswith("dedup:")
+    assert ra.dedup_cache_key(skip) == ra.dedup_cache_key([1, 5])
+    assert ra.dedup_cache_key(skip) != ra.dedup_cache_key(np.empty(0, dtype=np.uint64))
+
+
+def test_first_file_keeps_each_hand(history_dirs, tmp_path, index):
+    history_dir = write_overlapping_copy(history_dirs["pokerstars"], str(tmp_path / "overlap"))
+    filepaths = ra.list_hand_history_files(history_dir)
+    first, second = (split_hands(path) for path in filepaths[:2])
+    skip_ids_by_file, duplicate_count = index.duplicate_ids_by_file(filepaths)
+    assert duplicate_count == len(first) + 10
+    assert all(skip_ids_by_file[path] is None for path in filepaths[:-2])
+    overlap, repeat = filepaths[-2:]
+    assert skip_ids_by_file[overlap].tolist() == sorted(ra.hand_id_key(h) for h in first[-5:] + second[:5])
+    assert skip_ids_by_file[repeat].tolist() == sorted(ra.hand_id_key(h) for h in first)
+
+    # 順番を変えると先に来たファイルが持ち主になる
+    skip_ids_by_file, _ = index.duplicate_ids_by_file([repeat] + filepaths[:-2] + [overlap])
+    assert skip_ids_by_file[repeat] is None
+    assert len(skip_ids_by_file[filepaths[0]]) == len(first)
+
+
+def test_repeats_inside_one_file_are_counted_once(history_dirs, tmp_path, index):
+    hands = split_hands(ra.list_hand_history_files(history_dirs["zoom"])[0])
+    history_dir = tmp_path / "twice"
+    history_dir.mkdir()
+    (history_dir / "a.txt").write_bytes(b"".join(hands[:10]))
+    (history_dir / "b.txt").write_bytes(b"".join(hands[:10] + hands[:10]))
+    assert ra.process_directory(str(history_dir), HERO_NAME)[1] == 30
+    assert ra.process_directory(str(history_dir), HERO_NAME, dedup_index=index)[1] == 10
+    assert index.duplicate_count == 20 # b.txt の中の重複 10 + a.txt との重複 10
+
+
+def test_deleted_files_leave_the_index(history_dirs, tmp_path, index):
+    history_dir = write_overlapping_copy(history_dirs["zoom"], str(tmp_path / "overlap"))
+    filepaths = ra.list_hand_history_files(history_dir)
+    index.file_ids(filepaths)
+    os.remove(filepaths[-1])
+    ids_by_file = index.file_ids(filepaths[:-1])
+    assert [len(ids) for ids in ids_by_file] == [len(split_hands(path)) for path in filepaths[:-1]]
+    stored = [path for path, in index.conn.execute("SELECT path FROM files")]
+    assert sorted(stored) == sorted(os.path.abspath(path) for path in filepaths[:-1])
+    _, duplicate_count = index.duplicate_ids_by_file(filepaths[:-1])
+    assert duplicate_count == 10
+
+
+def test_dedup_keeps_cached_results_apart(history_dirs, tmp_path, index):
+    history_dir = write_overlapping_copy(history_dirs["poker_hand"], str(tmp_path / "overlap"))
+    cache = ra.AnalysisCache(str(tmp_path / "cache.sqlite3"))
+    try:
+        counted_twice = ra.process_directory(history_dir, HERO_NAME, cache=cache)
+        deduplicated = ra.process_directory(history_dir, HERO_NAME, cache=cache, dedup_index=index)
+        assert deduplicated == ra.process_directory(history_dirs["poker_hand"], HERO_NAME)
+        assert counted_twice[1] == deduplicated[1] + index.duplicate_count
+        assert ra.process_directory(history_dir, HERO_NAME, cache=cache, dedup_index=index) == deduplicated
+    finally:
+        cache.close()
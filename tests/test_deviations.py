@@ -0,0 +1,94 @@
+import json
+
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+BTN_CHART = {"name": "test", "spots": [{"kind": "open", "position": "BTN", "raise": {"AA": 1, "A5s": 0.5}}]}
+
+
+def _played(hand, dealt, raised, position="BTN"):
+    data = ra.RangeMatrix()
+    hand_class = ra.HAND_CLASS_INDEX[hand]
+    data.add("open", position, None, "opportunity", hand_class, dealt)
+    data.add("open", position, None, "raise", hand_class, raised)
+    data.add("open", position, None, "fold", hand_class, dealt - raised)
+    return data
+
+
+@pytest.mark.parametrize("spot", [
+    {"kind": "squeeze", "position": "BTN"},
+    {"kind": "open"},
+    {"kind": "open", "position": "BTN", "raise": {"AKx": 1}},
+    {"kind": "open", "position": "BTN", "raise": [1] * 13},
+    {"kind": "open", "position": "BTN", "raise": {"AA": 0.7}, "call": {"AA": 0.5}},
+])
+def test_invalid_charts_are_rejected(spot):
+    with pytest.raises(ValueError):
+        ra.ReferenceChart.from_json({"spots": [spot]})
+
+
+def test_chart_frequencies(tmp_path):
+    chart = ra.ReferenceChart.from_json(BTN_CHART)
+    spot = chart.frequencies[ra.SPOT_KIND_INDEX["open"], ra.POSITION_INDEX["BTN"], ra.VS_NONE]
+    a5s = ra.HAND_CLASS_INDEX["A5s"]
+    assert spot[:, a5s].tolist() == [0.5, 0, 0.5] # raise, call, fold (書かれていない頻度は 0、fold は残り)
+    assert spot[2].sum() == ra.NUM_HAND_CLASSES - 1.5
+    assert chart.defined.sum() == 1 and chart.name == "test"
+
+    as_list = {"spots": [{"kind": "open", "position": "BTN", "raise": spot[0].tolist()}]}
+    assert np.array_equal(ra.ReferenceChart.from_json(as_list).frequencies, chart.frequencies)
+    path = tmp_path / "btn_open.json"
+    path.write_text(json.dumps(as_list), encoding="utf-8")
+    assert ra.ReferenceChart.load(str(path)).name == "btn_open"
+
+
+def test_small_samples_are_not_scored_as_leaks():
+    chart = ra.ReferenceChart.from_json(BTN_CHART)
+    data = _played("72o", 20, 20) + _played("K9o", ra.LEAK_MIN_HANDS - 1, ra.LEAK_MIN_HANDS - 1) + \
+        _played("AA", 10, 10) + _played("QQ", 10, 10, position="CO")
+    report = ra.score_deviations(data, chart)
+    btn = (ra.SPOT_KIND_INDEX["open"], ra.POSITION_INDEX["BTN"], ra.VS_NONE)
+    raise_index = ra.CHART_ACTIONS.index("raise")
+    z = report.z[btn + (raise_index,)]
+    assert np.isnan(z[ra.HAND_CLASS_INDEX["K9o"]]) # 配られた回数が LEAK_MIN_HANDS 未満
+    assert z[ra.HAND_CLASS_INDEX["AA"]] == 0
+    assert z[ra.HAND_CLASS_INDEX["72o"]] > ra.LEAK_MIN_Z
+    assert np.isnan(z[ra.HAND_CLASS_INDEX["T2o"]]) # 配られていない
+    assert report.covers("open", "BTN") and not report.covers("open", "CO")
+    assert np.isnan(report.grid("open", "CO")).all()
+    assert report.grid("open", "BTN", actions=("raise", "call"))[ra.HAND_CLASS_INDEX["K9o"]] == 1
+
+    assert [leak[4] for leak in report.leaks()] == ["72o"]
+    kind, position, vs_position, action, hand, hands, played, expected, leak_z, misplayed = report.leaks()[0]
+    assert (kind, position, vs_position, action, hands, played, expected) == ("open", "BTN", None, "raise", 20, 1, 0)
+    assert misplayed == 20 and leak_z == z[ra.HAND_CLASS_INDEX["72o"]]
+    assert report.misplayed[btn].sum() == 20 + ra.LEAK_MIN_HANDS - 1
+    assert report.spot_error[btn] == pytest.approx((20 + ra.LEAK_MIN_HANDS - 1) / (30 + ra.LEAK_MIN_HANDS - 1))
+
+
+def test_leaks_are_sorted_by_misplayed_hands():
+    chart = ra.ReferenceChart.from_json(BTN_CHART)
+    data = _played("72o", 20, 20) + _played("AA", 40, 0) + _played("A5s", 60, 60) + _played("T2o", 10, 10)
+    leaks = ra.score_deviations(data, chart).leaks()
+    assert [(leak[4], leak[-1]) for leak in leaks] == [("AA", 40), ("A5s", 30), ("72o", 20), ("T2o", 10)]
+    assert len(ra.score_deviations(data, chart).leaks(limit=2)) == 2
+
+
+def test_matching_chart_has_no_leaks(history_dirs):
+    data, _ = ra.process_directory(history_dirs["pokerstars"], HERO_NAME)
+    frequencies = data.frequencies()
+    spots = []
+    for position in ("UTG", "HJ", "CO", "BTN", "SB"):
+        played = frequencies[ra.SPOT_KIND_INDEX["open"], ra.POSITION_INDEX[position], ra.VS_NONE]
+        spots.append({"kind": "open", "position": position,
+                      "raise": played[ra.CHART_ACTIONS.index("raise")].tolist(),
+                      "call": played[ra.CHART_ACTIONS.index("call")].tolist()})
+    report = ra.score_deviations(data, ra.ReferenceChart.from_json({"spots": spots}))
+    assert report.leaks(min_z=0.01) == []
+    assert np.nanmax(np.abs(report.diff)) < 1e-9
+    assert np.nansum(report.spot_error) < 1e-9
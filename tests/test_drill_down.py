@@ -0,0 +1,96 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME, write_compressed_copy  # noqa: E402
+
+
+def _located(history_dir, workers=1):
+    index = ra.HandLocationIndex()
+    data = ra.RangeMatrix()
+    for partial, _ in ra.iter_file_aggregates(ra.list_hand_history_files(history_dir), HERO_NAME, workers,
+                                              location_index=index):
+        data.merge(partial)
+    return data, index
+
+
+def _cells(data):
+    # 0 でない (kind, position, vs_position, action, hand_class) を名前で返す
+    for k, p, v, a, h in np.argwhere(data.counts):
+        yield (ra.SPOT_KINDS[k], ra.POSITIONS[p], None if v == ra.VS_NONE else ra.POSITIONS[v],
+               ra.RANGE_ACTIONS[a], int(h))
+
+
+def test_every_cell_locates_its_count(history_dir):
+    data, index = _located(history_dir)
+    cells = list(_cells(data))
+    assert cells
+    for kind, position, vs_position, action, hand_class in cells:
+        locations = index.locate(kind, position, vs_position, [action], hand_class)
+        assert len(locations) == data.counts[ra.SPOT_KIND_INDEX[kind], ra.POSITION_INDEX[position],
+                                             ra._vs_index(vs_position), ra.RANGE_ACTION_INDEX[action], hand_class]
+
+
+def test_located_hands_are_the_clicked_spot(history_dirs):
+    data, index = _located(history_dirs["zoom"], workers=2)
+    for kind, position, vs_position, action, hand_class in _cells(data):
+        if action == "opportunity":
+            continue
+        locations = index.locate(kind, position, vs_position, [action], hand_class)
+        for _, text in ra.read_located_hand_texts(locations):
+            parsed = ra.parse_hand(text, HERO_NAME)
+            assert parsed["hand"] == hand_class
+            assert (kind, position, vs_position, action) in parsed["spots"]
+
+
+def test_opportunity_covers_every_action(history_dirs):
+    data, index = _located(history_dirs["pokerstars"])
+    kind, position, vs_position, _, hand_class = next(cell for cell in _cells(data) if cell[0] == "open")
+    everything = index.locate(kind, position, vs_position, ["opportunity"], hand_class)
+    by_action = sorted(loc for action in ra.RANGE_ACTIONS[1:]
+                       for loc in index.locate(kind, position, vs_position, [action], hand_class))
+    assert set(by_action) <= set(everything)
+    assert len(everything) == data.counts[ra.SPOT_KIND_INDEX[kind], ra.POSITION_INDEX[position], ra.VS_NONE, 0,
+                                          hand_class]
+    assert index.locate(kind, position, vs_position, ["raise", "call", "fold"], hand_class) == by_action
+
+
+def test_hands_are_read_back_from_archives(history_dirs, tmp_path):
+    plain_data, plain_index = _located(history_dirs["poker_hand"])
+    archive_dir = write_compressed_copy(history_dirs["poker_hand"], str(tmp_path / "zip"), "zip")
+    data, index = _located(archive_dir)
+    assert data == plain_data
+    kind, position, vs_position, action, hand_class = max(
+        _cells(data), key=lambda cell: data.counts[ra.SPOT_KIND_INDEX[cell[0]], ra.POSITION_INDEX[cell[1]],
+                                                   ra._vs_index(cell[2]), ra.RANGE_ACTION_INDEX[cell[3]], cell[4]])
+    texts = [text for _, text in ra.read_located_hand_texts(index.locate(kind, position, vs_position, [action],
+                                                                         hand_class))]
+    plain_texts = [text for _, text in ra.read_located_hand_texts(
+        plain_index.locate(kind, position, vs_position, [action], hand_class))]
+    assert texts == plain_texts
+    assert all(text.startswith("Poker Hand #") for text in texts)
+
+
+def test_removed_file_reads_as_none(history_dirs, tmp_path):
+    history_dir = tmp_path / "copy"
+    history_dir.mkdir()
+    filepath = history_dir / "hands.txt"
+    shutil.copy(ra.list_hand_history_files(history_dirs["pokerstars"])[0], filepath)
+    data, index = _located(str(history_dir))
+    kind, position, vs_position, action, hand_class = next(_cells(data))
+    locations = index.locate(kind, position, vs_position, [action], hand_class)
+    os.remove(filepath)
+    assert [text for _, text in ra.read_located_hand_texts(locations)] == [None] * len(locations)
+
+
+def test_location_blob_is_checked():
+    with pytest.raises(ValueError):
+        ra.HandLocationIndex().add_file("x.txt", b"XYZ\x01\x00\x00\x00\x00")
+    index = ra.HandLocationIndex()
+    index.add_file("empty.txt", ra.HandLocations().to_bytes())
+    assert index.filepaths == []
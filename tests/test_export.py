@@ -0,0 +1,113 @@
+import os
+import xml.etree.ElementTree as ET
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+SVG = "{http://www.w3.org/2000/svg}"
+
+
+@pytest.fixture(scope="module")
+def data(history_dirs):
+    return ra.process_directory(history_dirs["pokerstars"], HERO_NAME)[0]
+
+
+def _views(data):
+    return [view for action_type in ra.MATRIX_ACTION_TYPES
+            for _, views in ra.iter_matrix_views(data, action_type) for view in views]
+
+
+def _cell_labels(svg):
+    # タイトル、13 + 13 個の見出しのあとに 169 個のセルの文字が並ぶ
+    texts = ET.fromstring(svg).findall(f"{SVG}text")
+    return ["\n".join(span.text or "" for span in text.findall(f"{SVG}tspan")) for text in texts[27:]]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_every_view_is_exported(tmp_path, data, workers):
+    output_dir = str(tmp_path / "export")
+    matrix_count = ra.export_matrices(data, output_dir, ("svg", "html"), workers, title="Hero <6-max>")
+    assert matrix_count == len(_views(data)) > 0
+    svg_files = sorted(name for name in os.listdir(output_dir) if name.endswith(".svg"))
+    assert len(svg_files) == matrix_count
+    for name in svg_files:
+        root = ET.parse(os.path.join(output_dir, name)).getroot()
+        assert root.tag == f"{SVG}svg"
+        assert (int(root.get("width")), int(root.get("height"))) == ra._export_size()
+
+    with open(os.path.join(output_dir, ra.EXPORT_REPORT_NAME), encoding="utf-8") as f:
+        report = f.read()
+    assert report.count("<svg ") == matrix_count
+    assert "<title>Hero &lt;6-max&gt;</title>" in report
+    assert [line for line in report.splitlines() if line.startswith("<h2>")] == [
+        f"<h2>{action_type}</h2>" for action_type in ra.MATRIX_ACTION_TYPES
+        if any(True for _ in ra.iter_matrix_views(data, action_type))]
+
+
+def test_svg_cells_show_the_counts(data):
+    title, make_tab_args, _ = next(view for view in _views(data) if view[0] == "BTN Raise Opp. ALL (Counts)")
+    svg = ra.render_matrix_svg(title, **make_tab_args())
+    assert _cell_labels(svg) == [str(int(n)) for n in data.grid("open", "BTN", None, "opportunity")]
+
+    title, make_tab_args, _ = next(view for view in _views(data) if view[0] == "BTN Raise Freq %")
+    tab_args = make_tab_args()
+    _, texts, _ = ra.compute_matrix_cells(**tab_args)
+    assert _cell_labels(ra.render_matrix_svg(title, **tab_args)) == texts
+    assert ET.fromstring(ra.render_matrix_svg("a & <b>")).find(f"{SVG}text").text == "a & <b>"
+
+
+def test_png_export(tmp_path, data):
+    pytest.importorskip("PIL")
+    from PIL import Image
+    title, make_tab_args, _ = _views(data)[0]
+    png = ra.render_matrix_png(title, **make_tab_args())
+    path = tmp_path / "matrix.png"
+    path.write_bytes(png)
+    with Image.open(path) as image:
+        assert image.format == "PNG" and image.size == ra._export_size()
+        assert image.getpixel((1, 1)) == (0xF0, 0xF0, 0xF0) # MATRIX_BG_COLOR
+    output_dir = tmp_path / "export"
+    assert ra.export_matrices(data, str(output_dir), ("png",)) == len(_views(data))
+    assert len(list(output_dir.glob("*.png"))) == len(_views(data))
+    assert not list(output_dir.glob("*.svg")) and not (output_dir / ra.EXPORT_REPORT_NAME).exists()
+
+
+def test_unknown_format_is_rejected(tmp_path, data):
+    with pytest.raises(ValueError):
+        ra.export_matrices(data, str(tmp_path / "export"), ("svg", "pdf"))
+    assert not (tmp_path / "export").exists()
+
+
+def test_cli_exports_each_result(tmp_path, history_dirs, capsys):
+    assert ra.main([history_dirs["zoom"], "--hero", HERO_NAME, "--output-dir", str(tmp_path / "out"),
+                    "--no-cache", "--no-dedup", "--export-dir", str(tmp_path / "export")]) == 0
+    [export_dir] = os.listdir(tmp_path / "export")
+    assert os.listdir(tmp_path / "export" / export_dir) == [ra.EXPORT_REPORT_NAME]
+    assert ra.main([history_dirs["zoom"], "--hero", HERO_NAME, "--output-dir", str(tmp_path / "out"),
+                    "--no-cache", "--no-dedup", "--export-dir", str(tmp_path / "export"),
+                    "--export-formats", "svg,gif"]) == 1
+
+
+def test_cell_bars():
+    assert ra.matrix_cell_bars(0.5, 0.2, 0.3, "open_freq") == [
+        (0.5, ra.RAISE_COLOR), (0.2, ra.LIMP_COLOR), (0.3, ra.FOLD_COLOR)]
+    # BB Defense は freq1 = コール、freq2 = レイズだが、描く順は レイズ、コール、フォールド
+    assert ra.matrix_cell_bars(0.5, 0.2, 0.3, "bb_defense_freq") == [
+        (0.2, ra.RAISE_COLOR), (0.5, ra.CALL_COLOR), (0.3, ra.FOLD_COLOR)]
+    assert ra.matrix_cell_bars(0.4, 0, 0, "single_freq") == [(0.4, ra.RAISE_COLOR)]
+    assert [color for _, color in ra.matrix_cell_bars(0.1, 0.2, 0.7, "threeway_freq")] == [
+        ra.RAISE_COLOR, ra.CALL_COLOR, ra.FOLD_COLOR]
+    assert ra.matrix_cell_bars(0.6, 1, 0, "equity") == [(1.0, ra.equity_heat_color(0.6))]
+    assert ra.matrix_cell_bars(0.6, 0, 0, "equity") == [] # 値が無いセル
+    assert ra.matrix_cell_bars(0.2, 1, 0, "diff")[0][0] == 1.0
+    assert ra.matrix_cell_bars(1, 1, 1, "count") == []
+
+
+def test_export_filenames():
+    assert ra._export_filename("Open BTN Raise Freq %") == "Open_BTN_Raise_Freq_pct"
+    assert ra._export_filename("3bet BB vs SB Opp count") == "3bet_BB_vs_SB_Opp_count"
+    assert ra._export_filename("BB Def Freq (vs CO)") == "BB_Def_Freq_vs_CO"
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+from utils_judge import normalize_hole_cards  # noqa: E402
+
+import range_analyzer as ra  # noqa: E402
+
+
+def test_class_layout_matches_the_13x13_chart():
+    assert ra.NUM_HAND_CLASSES == 169
+    assert [ra.HAND_CLASS_NAMES[i] for i in (0, 1, 13, 14, 168)] == ["AA", "AKs", "AKo", "KK", "22"]
+    assert all(ra.HAND_CLASS_INDEX[name] == i for i, name in enumerate(ra.HAND_CLASS_NAMES))
+
+
+def test_combo_table_covers_every_combo():
+    table = ra.COMBO_HAND_CLASS
+    assert table.shape == (52, 52)
+    assert (np.diag(table) == -1).all()
+    assert np.array_equal(table, table.T)
+    upper = table[np.triu_indices(52, k=1)]
+    combos_per_class = np.bincount(upper, minlength=ra.NUM_HAND_CLASSES)
+    for i, name in enumerate(ra.HAND_CLASS_NAMES):
+        assert combos_per_class[i] == (6 if len(name) == 2 else 4 if name.endswith("s") else 12), name
+
+
+def test_hole_card_lookup_matches_normalize_hole_cards():
+    assert len(ra.HOLE_CARDS_HAND_CLASS) == 52 * 51
+    for cards, hand_class in ra.HOLE_CARDS_HAND_CLASS.items():
+        assert ra.HAND_CLASS_NAMES[hand_class] == normalize_hole_cards(cards.decode("ascii"))
+    assert ra.HOLE_CARDS_HAND_CLASS[b"7c 2d"] == ra.HAND_CLASS_INDEX["72o"]
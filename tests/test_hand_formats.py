@@ -0,0 +1,88 @@
+import pytest
+
+pytest.importorskip("utils_judge")
+
+from utils_judge import (  # noqa: E402
+    determine_position,
+    extract_hero_cards,
+    extract_preflop_actions,
+    normalize_hole_cards,
+)
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME, split_hands  # noqa: E402
+
+
+def _record_fields(record):
+    return record.seats, record.button_seat, record.hero_hand_class, record.preflop_actions, record.positions
+
+
+def _first_hand(history_dirs, name):
+    return split_hands(ra.list_hand_history_files(history_dirs[name])[0])[0]
+
+
+def test_format_is_sniffed_from_the_header():
+    assert ra.sniff_hand_format(b"PokerStars Hand #1: Hold'em") is ra.POKERSTARS_FORMAT
+    assert ra.sniff_hand_format(b"PokerStars Zoom Hand #1: Hold'em") is ra.POKERSTARS_FORMAT
+    assert ra.sniff_hand_format(b"Poker Hand #HD1: Hold'em") is ra.GGPOKER_FORMAT
+    assert ra.sniff_hand_format(b"Seat 1: Hero ($5 in chips)") is ra.POKERSTARS_FORMAT # 不明なら PokerStars
+
+
+@pytest.mark.parametrize("name", ["pokerstars", "zoom", "poker_hand"])
+def test_tokenizer_agrees_with_the_text_functions(history_dirs, name):
+    # 元の解析はハンド全体をデコードして utils_judge の関数で読んでいた
+    for filepath in ra.list_hand_history_files(history_dirs[name]):
+        for hand_bytes in split_hands(filepath):
+            text = hand_bytes.decode("utf-8")
+            record = ra.tokenize_hand(hand_bytes, HERO_NAME)
+            lines = text.splitlines()
+            assert ra.HAND_CLASS_NAMES[record.hero_hand_class] == normalize_hole_cards(
+                extract_hero_cards(lines, HERO_NAME))
+            assert record.position_of(HERO_NAME) == determine_position(HERO_NAME, text)
+            preflop = lines[lines.index("*** HOLE CARDS ***") + 1:]
+            preflop = preflop[:next(i for i, line in enumerate(preflop) if line.startswith("*** "))]
+            assert record.preflop_actions == extract_preflop_actions([line for line in preflop if line.strip()])
+            assert _record_fields(ra.tokenize_hand(text, HERO_NAME)) == _record_fields(record)
+
+
+def test_crlf_hands_read_like_lf_hands(history_dirs):
+    hand_bytes = _first_hand(history_dirs, "poker_hand")
+    expected = _record_fields(ra.tokenize_hand(hand_bytes, HERO_NAME))
+    assert _record_fields(ra.tokenize_hand(hand_bytes.replace(b"\n", b"\r\n"), HERO_NAME)) == expected
+    assert _record_fields(ra.tokenize_hand(hand_bytes.replace(b"\n", b"\r"), HERO_NAME)) == expected
+
+
+def test_legacy_encoded_names_are_decoded_per_hand(history_dirs, tmp_path):
+    hands = split_hands(ra.list_hand_history_files(history_dirs["pokerstars"])[0])[:10]
+    villain = next(name for name in ra.tokenize_hand(hands[0], HERO_NAME).seats.values() if name != HERO_NAME)
+    renamed = [hand.replace(villain.encode("utf-8"), "José".encode(encoding))
+               for hand, encoding in zip(hands, ["cp1252", "utf-8"] * 5)]
+    record = ra.tokenize_hand(renamed[0], HERO_NAME)
+    assert "José" in record.seats.values() and villain not in record.seats.values()
+    assert record.hero_hand_class == ra.tokenize_hand(hands[0], HERO_NAME).hero_hand_class
+
+    # UTF-8 と cp1252 のハンドが混ざったファイルでもハンドを捨てない
+    for folder, folder_hands in (("mixed", renamed), ("clean", hands)):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "hands.txt").write_bytes(b"".join(folder_hands))
+    assert ra.process_directory(str(tmp_path / "mixed"), HERO_NAME) == \
+        ra.process_directory(str(tmp_path / "clean"), HERO_NAME)
+
+
+def test_hero_name_in_a_legacy_encoding(history_dirs):
+    hand_bytes = _first_hand(history_dirs, "zoom")
+    renamed = hand_bytes.replace(HERO_NAME.encode("utf-8"), "Zoë".encode("cp1252"))
+    expected = ra.tokenize_hand(hand_bytes, HERO_NAME)
+    record = ra.tokenize_hand(renamed, "Zoë")
+    assert record.hero_hand_class == expected.hero_hand_class
+    assert record.position_of("Zoë") == expected.position_of(HERO_NAME)
+    assert ra.tokenize_hand(renamed, HERO_NAME).hero_hand_class is None
+
+
+def test_poker_hand_headers(history_dirs):
+    hand_bytes = _first_hand(history_dirs, "poker_hand")
+    assert hand_bytes.startswith(b"Poker Hand #HD")
+    record = ra.tokenize_hand(hand_bytes, HERO_NAME)
+    assert len(record.seats) == 6 and record.button_seat in record.seats
+    assert ra.parse_hand(hand_bytes, HERO_NAME) == ra.parse_hand(
+        hand_bytes.replace(b"Poker Hand #HD", b"PokerStars Hand #", 1), HERO_NAME)
@@ -0,0 +1,57 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import benchmark
+import hand_generator
+from conftest import GENERATED_HANDS, GENERATED_HANDS_PER_FILE, HERO_NAME
+
+
+def _read_all(filepaths):
+    return [Path(path).read_bytes() for path in filepaths]
+
+
+def test_same_seed_gives_the_same_files(tmp_path):
+    first = hand_generator.write_hand_histories(str(tmp_path / "a"), 50, 20, "zoom", seed=7)
+    second = hand_generator.write_hand_histories(str(tmp_path / "b"), 50, 20, "zoom", seed=7)
+    other = hand_generator.write_hand_histories(str(tmp_path / "c"), 50, 20, "zoom", seed=8)
+    assert [os.path.basename(p) for p in first] == [os.path.basename(p) for p in second]
+    assert _read_all(first) == _read_all(second)
+    assert _read_all(first) != _read_all(other)
+
+
+def test_files_hold_the_requested_hands(history_dirs):
+    for history_dir in history_dirs.values():
+        filepaths = sorted(os.listdir(history_dir))
+        assert len(filepaths) == GENERATED_HANDS // GENERATED_HANDS_PER_FILE
+        text = "".join(Path(history_dir, path).read_text(encoding="utf-8") for path in filepaths)
+        assert text.count("*** SUMMARY ***") == GENERATED_HANDS
+        assert text.count(f"Dealt to {HERO_NAME} [") == GENERATED_HANDS
+
+
+def test_every_generated_hand_is_analyzed(history_dir):
+    pytest.importorskip("utils_judge")
+    import range_analyzer
+    _, hand_count = range_analyzer.process_directory(history_dir, HERO_NAME)
+    assert hand_count == GENERATED_HANDS
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        hand_generator.write_hand_histories(str(tmp_path), 10, hand_format="omaha")
+    with pytest.raises(ValueError):
+        hand_generator.write_hand_histories(str(tmp_path), 10, table_size=10)
+    with pytest.raises(ValueError):
+        hand_generator._parse_profile_overrides(["open_raize=0.3"])
+    assert hand_generator._parse_profile_overrides(["open_raise=0.3"]) == {"open_raise": 0.3}
+
+
+def test_benchmark_sizes_and_regressions():
+    assert [benchmark.parse_size(text) for text in ("500", "1.5k", "10M")] == [500, 1500, 10000000]
+    assert [benchmark.format_size(n) for n in (500, 1500, 10000, 10000000)] == ["500", "1500", "10k", "10M"]
+    default_sizes = [benchmark.parse_size(size) for size in benchmark.DEFAULT_SIZES.split(",")]
+    assert max(default_sizes) == 100000
+    baseline = {"10k/parse": {"hands_per_sec": 1000.0}}
+    assert benchmark.compare_with_baseline({"10k/parse": {"hands_per_sec": 850.0}}, baseline, 0.2) == []
+    assert len(benchmark.compare_with_baseline({"10k/parse": {"hands_per_sec": 700.0}}, baseline, 0.2)) == 1
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+
+# sitting out の席・少人数のテーブル・ヘッズアップのハンドと、手で求めたポジションとスポット
+SHORT_TABLES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "golden", "short_tables")
+
+SIX_MAX_SEATS = {1: "Ann", 2: "Bob", 3: "Hero", 4: "Dan", 5: "Eve", 6: "Fay"}
+
+
+def _hand(actions, seats=SIX_MAX_SEATS, button=6, hero_cards="Ah Kd", sitting_out=()):
+    # button=6 なら Ann が SB、Bob が BB、Hero が UTG、Dan が HJ、Eve が CO、Fay が BTN
+    lines = ["PokerStars Hand #1:  Hold'em No Limit ($0.02/$0.05) - 2023/07/13 12:00:00 ET",
+             f"Table 'T' {len(seats)}-max Seat #{button} is the button"]
+    for seat, name in sorted(seats.items()):
+        lines.append(f"Seat {seat}: {name} ($5 in chips)" + (" is sitting out" if name in sitting_out else ""))
+    lines += ["*** HOLE CARDS ***", f"Dealt to Hero [{hero_cards}]"]
+    lines += actions
+    lines += ["*** FLOP *** [2c 3d 4h]", "*** SUMMARY ***", "Total pot $1", "", ""]
+    return "\n".join(lines)
+
+
+def test_six_max_positions():
+    assert ra.assign_positions(SIX_MAX_SEATS, 6) == {
+        "Ann": "SB", "Bob": "BB", "Hero": "UTG", "Dan": "HJ", "Eve": "CO", "Fay": "BTN"}
+
+
+def test_short_handed_and_heads_up_positions():
+    assert ra.assign_positions({1: "A", 4: "B", 6: "C"}, 4) == {"C": "SB", "A": "BB", "B": "BTN"}
+    # ヘッズアップではボタンがスモールブラインド
+    assert ra.assign_positions({2: "A", 5: "B"}, 5) == {"B": "SB", "A": "BB"}
+    assert ra.assign_positions({2: "A", 5: "B"}, 2) == {"A": "SB", "B": "BB"}
+
+
+def test_empty_button_seat_and_full_ring():
+    # ボタンの席が空いていれば BTN はいない
+    assert "BTN" not in ra.assign_positions({1: "A", 2: "B", 3: "C", 5: "E"}, 4).values()
+    seats = {seat: f"P{seat}" for seat in range(1, 10)}
+    positions = ra.assign_positions(seats, 9)
+    assert sorted(positions.values()) == sorted(ra.POSITIONS)
+    record = ra.HandRecord(seats, 9, None, [])
+    assert [record.position_of(f"P{seat}") for seat in (3, 4, 5)] == ["Other"] * 3
+
+
+def test_open_spot_actions():
+    record = ra.tokenize_hand(_hand(["Hero: raises $0.10 to $0.15", "Dan: folds"]), "Hero")
+    assert record.hero_hand_class == ra.HAND_CLASS_INDEX["AKo"]
+    assert record.spot_actions("Hero") == [("open", "UTG", None, "raise")]
+    limp = ra.tokenize_hand(_hand(["Hero: calls $0.05", "Dan: folds"]), "Hero")
+    assert limp.spot_actions("Hero") == [("open", "UTG", None, "call")]
+
+
+def test_bb_defense_and_threebet_spots():
+    actions = ["Hero: folds", "Dan: folds", "Eve: raises $0.10 to $0.15", "Fay: folds", "Ann: folds",
+               "Bob: calls $0.10"]
+    record = ra.tokenize_hand(_hand(actions), "Hero")
+    assert record.bb_defense("Bob") == ("call", "CO")
+    assert record.spot_actions("Bob") == [
+        ("bb_defense", "BB", "CO", "call"), ("threebet", "BB", None, "call"), ("threebet", "BB", "CO", "call")]
+    assert record.bb_defense("Hero") == (None, None)
+    assert record.spot_actions("Fay") == [("threebet", "BTN", None, "fold"), ("threebet", "BTN", "CO", "fold")]
+
+
+def test_sitting_out_players_take_no_position():
+    record = ra.tokenize_hand(_hand(["Hero: folds"], sitting_out=("Eve",)), "Hero")
+    assert "Eve" not in record.positions
+    assert record.position_of("Dan") == "CO"
+
+
+def test_parse_hand_needs_hero_cards_position_and_actions():
+    assert ra.parse_hand(_hand(["Hero: folds"]), "Nobody") is None
+    assert ra.parse_hand(_hand([]), "Hero") is None
+    assert ra.parse_hand(_hand(["Hero: folds"]), "Hero") == {
+        "hand": ra.HAND_CLASS_INDEX["AKo"], "position": "UTG", "spots": [("open", "UTG", None, "fold")]}
+
+
+def test_short_tables_match_golden_positions_and_spots():
+    with open(SHORT_TABLES_DIR + ".json", encoding="utf-8") as f:
+        expected = json.load(f)
+    hero_name = expected["hero"]
+    hands = []
+    for filepath in ra.list_hand_history_files(SHORT_TABLES_DIR):
+        with open(filepath, "rb") as f:
+            hands.extend(ra.iter_hand_bytes_from_stream(f))
+    assert len(hands) == len(expected["hands"])
+    data = ra.RangeMatrix()
+    for hand_bytes, golden in zip(hands, expected["hands"]):
+        record = ra.tokenize_hand(hand_bytes, hero_name)
+        assert record.positions == golden["positions"]
+        assert record.hero_hand_class == ra.HAND_CLASS_INDEX[golden["hand"]]
+        assert record.spot_actions(hero_name) == [tuple(spot) for spot in golden["spots"]]
+        for kind, position, vs_position, action in golden["spots"]:
+            data.add(kind, position, vs_position, "opportunity", ra.HAND_CLASS_INDEX[golden["hand"]])
+            data.add(kind, position, vs_position, action, ra.HAND_CLASS_INDEX[golden["hand"]])
+    assert ra.process_directory(SHORT_TABLES_DIR, hero_name) == (data, len(hands))
@@ -0,0 +1,82 @@
+import io
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+
+
+def _naive_split(content, delimiter):
+    parts = content.split(delimiter)
+    return [delimiter + part for part in parts[1:]]
+
+
+@pytest.fixture
+def history_bytes(history_dirs):
+    with open(ra.list_hand_history_files(history_dirs["zoom"])[0], "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("chunk_bytes", [7, 1000, ra.READ_CHUNK_BYTES])
+def test_hands_split_across_chunk_boundaries(monkeypatch, history_bytes, chunk_bytes):
+    assert len(history_bytes) > ra.HEADER_SNIFF_BYTES # 先頭の読み込みのあとも続くファイル
+    monkeypatch.setattr(ra, "READ_CHUNK_BYTES", chunk_bytes)
+    spans = list(ra.iter_hand_spans_from_stream(io.BytesIO(history_bytes)))
+    assert [hand for _, hand in spans] == _naive_split(history_bytes, b"PokerStars Zoom Hand #")
+    assert all(history_bytes[offset:offset + len(hand)] == hand for offset, hand in spans)
+
+
+def test_bytes_before_the_first_hand_are_skipped(history_bytes):
+    content = b"\xef\xbb\xbfexported by some tracker\n\n" + history_bytes
+    hands = list(ra.iter_hand_bytes_from_stream(io.BytesIO(content)))
+    assert hands == _naive_split(history_bytes, b"PokerStars Zoom Hand #")
+
+
+def test_content_without_delimiter_is_one_hand():
+    content = b"Table 'T' 6-max Seat #1 is the button\n" * 3
+    assert list(ra.iter_hand_spans_from_stream(io.BytesIO(content))) == [(0, content)]
+
+
+class _CountingStream(io.RawIOBase):
+    # 読んだバイト数を数える、区切りの無い大きいストリーム
+    def __init__(self, size):
+        self.remaining = size
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self.remaining)
+        buffer[:n] = b"x" * n
+        self.remaining -= n
+        self.bytes_read += n
+        return n
+
+
+def test_large_content_without_delimiter_is_skipped_unread():
+    stream = _CountingStream(1 << 30)
+    assert list(ra.iter_hand_spans_from_stream(stream)) == []
+    assert stream.bytes_read <= ra.HEADER_SNIFF_BYTES + 1
+
+
+def test_delimiter_only_fragments_are_not_hands(tmp_path, history_bytes):
+    path = tmp_path / "h.txt"
+    path.write_bytes(history_bytes + b"PokerStars Zoom Hand #  \n\n")
+    located = list(ra.iter_located_hands(str(path)))
+    assert len(located) == len(_naive_split(history_bytes, b"PokerStars Zoom Hand #"))
+
+
+def test_hands_are_decoded_one_at_a_time():
+    assert ra._decode_hand_bytes("Seat 1: José ($5)\r\n".encode("utf-8")) == "Seat 1: José ($5)\n"
+    assert ra._decode_hand_bytes("Seat 1: José ($5)\r".encode("cp1252")) == "Seat 1: José ($5)\n"
+    assert ra._decode_hand_bytes(b"Seat 1: \x81\x8d ($5)") == "Seat 1: \x81\x8d ($5)" # latin-1 で必ず読める
+
+
+def test_file_texts_match_a_whole_file_split(tmp_path, history_bytes):
+    path = tmp_path / "crlf.txt"
+    path.write_bytes(history_bytes.replace(b"\n", b"\r\n"))
+    expected = [text.replace("\r\n", "\n") for text in
+                _naive_split(history_bytes.decode("utf-8"), "PokerStars Zoom Hand #")]
+    assert list(ra.iter_hand_texts_from_file(str(path))) == expected
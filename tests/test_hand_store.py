@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import GENERATED_HANDS, HERO_NAME, split_hands  # noqa: E402
+
+DAY_2 = 1672617600 # 2023/01/02 00:00:00 (read_hand_header は UTC として読む)
+DAY_3 = DAY_2 + ra.SECONDS_PER_DAY
+
+
+@pytest.fixture(scope="module")
+def stored(mixed_history_dir):
+    hand_store = ra.HandStore()
+    data, hand_count = ra.process_directory(mixed_history_dir, HERO_NAME, 2, hand_store=hand_store)
+    return hand_store, data, hand_count
+
+
+def _naive_matrix(history_dir, keep_hand, keep_spot=lambda spot: True):
+    # ハンドをテキストから読み直して、条件に合うスポットだけを数える
+    data = ra.RangeMatrix()
+    hand_count = 0
+    for filepath in ra.list_hand_history_files(history_dir):
+        for hand_bytes in split_hands(filepath):
+            parsed = ra.parse_hand(hand_bytes, HERO_NAME)
+            if parsed is None or not keep_hand(ra.read_hand_header(hand_bytes)):
+                continue
+            spots = [spot for spot in parsed["spots"] if keep_spot(spot)]
+            hand_count += bool(spots) or (not parsed["spots"] and keep_spot(None))
+            for kind, position, vs_position, action in spots:
+                data.add(kind, position, vs_position, "opportunity", parsed["hand"])
+                if action:
+                    data.add(kind, position, vs_position, action, parsed["hand"])
+    return data, hand_count
+
+
+def test_unfiltered_store_matches_the_analysis(stored):
+    hand_store, data, hand_count = stored
+    assert hand_store.range_matrix() == data
+    assert hand_store.hand_count() == hand_count == 2 * GENERATED_HANDS + 200
+    assert hand_store.hand_count(hand_store.mask()) == hand_count
+    assert hand_store.distinct("table_size") == [2, 6]
+    assert hand_store.distinct("big_blind") == [5, 10]
+
+
+@pytest.mark.parametrize("filters, keep_hand", [
+    (dict(since=DAY_2, until=DAY_3), lambda header: DAY_2 <= header[0] < DAY_3),
+    (dict(table_sizes=[6]), lambda header: header[2] == 6),
+    (dict(big_blinds=[10], since=DAY_2), lambda header: header[1] == 10 and header[0] >= DAY_2),
+    (dict(until=DAY_2, table_sizes=[2]), lambda header: False),
+])
+def test_header_filters_match_a_naive_filter(mixed_history_dir, stored, filters, keep_hand):
+    hand_store, _, _ = stored
+    mask = hand_store.mask(**filters)
+    assert (hand_store.range_matrix(mask), hand_store.hand_count(mask)) == \
+        _naive_matrix(mixed_history_dir, keep_hand)
+
+
+@pytest.mark.parametrize("positions, actions", [
+    (["BTN", "CO"], None),
+    (None, ["raise"]),
+    (["BB"], ["call", "fold"]),
+    (["SB"], ["opportunity"]),
+])
+def test_spot_filters_match_a_naive_filter(mixed_history_dir, stored, positions, actions):
+    hand_store, _, _ = stored
+
+    def keep_spot(spot):
+        if spot is None: # スポットの無いハンドはアクションの条件があれば選ばれない
+            return actions is None and positions is None
+        _, position, _, action = spot
+        return ((positions is None or position in positions)
+                and (actions is None or (action or "opportunity") in actions))
+
+    mask = hand_store.mask(positions=positions, actions=actions)
+    expected_matrix, expected_count = _naive_matrix(mixed_history_dir, lambda header: True, keep_spot)
+    assert hand_store.range_matrix(mask) == expected_matrix
+    if positions is None or actions is not None:
+        assert hand_store.hand_count(mask) == expected_count
+
+
+def test_store_saves_and_memory_maps(tmp_path, stored):
+    hand_store, data, hand_count = stored
+    path = str(tmp_path / "hands.npy")
+    hand_store.save(path)
+    for mmap in (True, False):
+        loaded = ra.HandStore.load(path, mmap=mmap)
+        assert isinstance(loaded.rows, np.memmap) == mmap
+        assert (loaded.range_matrix(), loaded.hand_count()) == (data, hand_count)
+        mask = loaded.mask(positions=["BTN"], big_blinds=[5])
+        assert loaded.range_matrix(mask) == hand_store.range_matrix(hand_store.mask(positions=["BTN"], big_blinds=[5]))
+    np.save(str(tmp_path / "other.npy"), np.zeros(3))
+    with pytest.raises(ValueError):
+        ra.HandStore.load(str(tmp_path / "other.npy"))
+
+
+def test_rows_blob_is_checked():
+    rows = ra.HandRows()
+    assert len(ra.HandRows.rows_from_bytes(rows.to_bytes())) == 0
+    with pytest.raises(ValueError):
+        ra.HandRows.rows_from_bytes(b"XYZ" + rows.to_bytes()[3:])
+
+
+def test_read_hand_header():
+    assert ra.read_hand_header(
+        b"PokerStars Hand #1:  Hold'em No Limit ($0.02/$0.05 USD) - 2023/01/02 00:00:30 ET\n"
+        b"Table 'T' 6-max Seat #1 is the button\nSeat 1: Hero ($5 in chips)\n") == (DAY_2 + 30, 5, 6)
+    assert ra.read_hand_header(
+        "Poker Hand #HD1: Hold'em No Limit (€1,000/€2,000) - 2023/01/02 09:05:00\n"
+        "Table 'T' 9-max Seat #1 is the button\n".encode("utf-8")) == (DAY_2 + 9 * 3600 + 300, 200000, 9)
+    assert ra.read_hand_header(b"PokerStars Hand #1: no header fields\nSeat 1: Hero ($5)\n") == (0, 0, 0)
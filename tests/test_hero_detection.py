@@ -0,0 +1,37 @@
+from collections import Counter
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+
+def _dealt_lines(*names):
+    return "".join(f"Dealt to {name} [Ah Kd]\n" for name in names).encode("utf-8")
+
+
+def test_generated_histories(history_dir):
+    assert ra.detect_hero_from_files(history_dir) == HERO_NAME
+
+
+def test_head_sample_only_reads_whole_lines(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(_dealt_lines("Alice") * 3 + _dealt_lines("Bob (observer)") * 2)
+    line_bytes = len(_dealt_lines("Alice"))
+    assert ra._count_dealt_to_names(str(path), max_bytes=line_bytes * 3 + 5) == Counter({"Alice": 3})
+    assert ra._count_dealt_to_names(str(path)) == Counter({"Alice": 3, "Bob": 2})
+
+
+def test_unclear_sample_falls_back_to_every_line(tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_bytes(_dealt_lines("Bob") * 3 + _dealt_lines("Alice") * 30)
+    monkeypatch.setattr(ra, "HERO_SAMPLE_BYTES", len(_dealt_lines("Bob")) * 3)
+    assert ra.detect_hero_from_files(str(tmp_path)) == "Alice"
+
+
+def test_hero_named_hero_is_preferred_and_empty_folder_has_none(tmp_path):
+    assert ra._pick_hero_name(Counter({"HERO": 5, "hero": 4, "Alice": 1})) == "HERO"
+    assert ra._hero_is_clear(Counter({"Alice": 30, "Bob": 2}))
+    assert not ra._hero_is_clear(Counter({"Alice": 12, "Bob": 8}))
+    assert ra.detect_hero_from_files(str(tmp_path)) is None
@@ -0,0 +1,105 @@
+import gzip
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+
+@pytest.fixture
+def tail_setup(tmp_path, history_dirs):
+    """(watched directory, the file that grows in it, hands to append) from the generated PokerStars histories."""
+    source_files = ra.list_hand_history_files(history_dirs["pokerstars"])
+    watched = tmp_path / "hh"
+    watched.mkdir()
+    growing = str(watched / os.path.basename(source_files[0]))
+    shutil.copy(source_files[0], growing)
+    with open(source_files[1], "rb") as f:
+        new_hands = list(ra.iter_hand_bytes_from_stream(f))[:6]
+    return str(watched), growing, new_hands
+
+
+def _append(filepath, *hands):
+    with open(filepath, "ab") as f:
+        f.write(b"".join(hands))
+
+
+def _hand_ids(hand_texts):
+    return [ra.hand_id_key(text.encode("utf-8")) for text in hand_texts]
+
+
+def test_only_hands_appended_after_the_mark_are_read(tail_setup):
+    watched, growing, new_hands = tail_setup
+    tailer = ra.HandHistoryTailer(watched)
+    tailer.mark_current_positions()
+    assert tailer.read_new_hand_texts() == []
+
+    _append(growing, new_hands[0], new_hands[1])
+    assert _hand_ids(tailer.read_new_hand_texts()) == _hand_ids([h.decode() for h in new_hands[:2]])
+    assert tailer.read_new_hand_texts() == []
+
+
+def test_hand_being_written_is_read_when_complete(tail_setup):
+    watched, growing, new_hands = tail_setup
+    tailer = ra.HandHistoryTailer(watched)
+    tailer.mark_current_positions()
+    half = len(new_hands[0]) // 2
+    _append(growing, new_hands[0][:half])
+    assert tailer.read_new_hand_texts() == []
+    _append(growing, new_hands[0][half:])
+    assert tailer.read_new_hand_texts() == [new_hands[0].decode("utf-8")]
+
+
+def test_hands_counted_by_the_analysis_are_not_counted_again(tail_setup):
+    watched, growing, new_hands = tail_setup
+    tailer = ra.HandHistoryTailer(watched)
+    tailer.mark_current_positions() # 解析を始めたとき
+    _append(growing, new_hands[0]) # 解析中に追記 (解析が読む)
+    hand_store = ra.HandStore()
+    ra.process_directory(watched, HERO_NAME, hand_store=hand_store)
+    hand_ids = np.unique(hand_store.rows["hand_id"])
+    tailer.counted_ids = hand_ids[hand_ids != 0]
+    _append(growing, new_hands[1]) # 解析のあとに追記
+
+    new_hand_texts = tailer.read_new_hand_texts()
+    assert _hand_ids(new_hand_texts) == [ra.hand_id_key(new_hands[1])]
+    assert tailer.duplicate_count == 1
+
+
+def test_skip_duplicates_drops_hands_repeated_within_the_tail(tail_setup):
+    watched, growing, new_hands = tail_setup
+    other = os.path.join(watched, "other.txt")
+    for skip_duplicates, expected in ((False, 2), (True, 1)):
+        shutil.copy(growing, other)
+        tailer = ra.HandHistoryTailer(watched, skip_duplicates=skip_duplicates)
+        tailer.mark_current_positions()
+        _append(growing, new_hands[2])
+        _append(other, new_hands[2])
+        assert len(tailer.read_new_hand_texts()) == expected
+
+
+def test_archive_that_appears_later_is_read_once(tail_setup):
+    watched, _, new_hands = tail_setup
+    tailer = ra.HandHistoryTailer(watched)
+    tailer.mark_current_positions()
+    with gzip.open(os.path.join(watched, "late.txt.gz"), "wb") as f:
+        f.write(b"".join(new_hands[3:6]))
+    with open(os.path.join(watched, "notes.log"), "wb") as f: # 解析の対象外のファイルは見ない
+        f.write(new_hands[0])
+
+    assert _hand_ids(tailer.read_new_hand_texts()) == [ra.hand_id_key(h) for h in new_hands[3:6]]
+    assert tailer.read_new_hand_texts() == []
+
+
+def test_replaced_file_is_read_from_the_start(tail_setup):
+    watched, growing, new_hands = tail_setup
+    tailer = ra.HandHistoryTailer(watched)
+    tailer.mark_current_positions()
+    with open(growing, "wb") as f:
+        f.write(new_hands[4])
+    assert _hand_ids(tailer.read_new_hand_texts()) == [ra.hand_id_key(new_hands[4])]
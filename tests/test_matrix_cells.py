@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+
+def _grid(**cells):
+    # {"AA": 3, "AKs": 1} -> 169 個の回数
+    grid = np.zeros(ra.NUM_HAND_CLASSES, dtype=np.int64)
+    for name, count in cells.items():
+        grid[ra.HAND_CLASS_INDEX[name]] = count
+    return grid
+
+
+def _cell(values, name):
+    return values[ra.HAND_CLASS_INDEX[name]]
+
+
+def test_count_mode():
+    freqs, texts, mode = ra.compute_matrix_cells(action_counts={"main": _grid(AA=7)})
+    assert mode == "count" and not freqs.any()
+    assert _cell(texts, "AA") == "7" and texts.count("0") == ra.NUM_HAND_CLASSES - 1
+    assert ra.compute_matrix_cells()[1] == ["0"] * ra.NUM_HAND_CLASSES
+
+
+def test_open_frequencies():
+    opportunities = _grid(AA=4, AKs=2, KK=3, QQ=0, JJ=0)
+    action_counts = {"raise": _grid(AA=3, AKs=0, JJ=1), "limp": _grid(AA=1), "fold": _grid(AKs=2)}
+    freqs, texts, mode = ra.compute_matrix_cells(opportunities, action_counts, "open_freq")
+    assert mode == "open_freq"
+    assert _cell(freqs, "AA").tolist() == [0.75, 0.25, 0]
+    assert _cell(texts, "AA") == "R:75%\nL:25%\nF:0%"
+    assert _cell(freqs, "AKs").tolist() == [0, 0, 1]
+    assert _cell(texts, "KK") == "0%" # 機会はあったが行動の記録なし
+    assert _cell(texts, "QQ") == "N/A"
+    assert _cell(texts, "JJ") == "Err" and _cell(freqs, "JJ").tolist() == [1, 0, 0] # 機会なしで行動あり
+
+
+def test_bb_defense_and_threeway_layouts():
+    opportunities = _grid(AA=10)
+    freqs, texts, _ = ra.compute_matrix_cells(
+        opportunities, {"call": _grid(AA=5), "raise": _grid(AA=3), "fold": _grid(AA=2)}, "bb_defense_freq")
+    assert _cell(freqs, "AA").tolist() == [0.5, 0.3, 0.2] # freq1 = コール、freq2 = レイズ
+    assert _cell(texts, "AA") == "R:30%\nC:50%\nF:20%"
+    freqs, texts, _ = ra.compute_matrix_cells(
+        opportunities, {"raise": _grid(AA=5), "call": _grid(AA=3), "fold": _grid(AA=2)}, "threeway_freq")
+    assert _cell(freqs, "AA").tolist() == [0.5, 0.3, 0.2]
+    assert _cell(texts, "AA") == "R:50%\nC:30%\nF:20%"
+
+
+def test_single_frequency_uses_the_given_key():
+    freqs, texts, mode = ra.compute_matrix_cells(_grid(AA=4), {"call": _grid(AA=1)}, "single_freq")
+    assert mode == "single_freq"
+    assert _cell(freqs, "AA").tolist() == [0.25, 0, 0] and _cell(texts, "AA") == "25%"
+
+
+def test_equity_and_diff_modes():
+    equity = np.full(ra.NUM_HAND_CLASSES, np.nan)
+    equity[ra.HAND_CLASS_INDEX["AA"]] = 0.82
+    freqs, texts, mode = ra.compute_matrix_cells(action_counts={"equity": equity}, display_mode="equity")
+    assert mode == "equity"
+    assert _cell(freqs, "AA").tolist() == [0.82, 1, 0] and _cell(texts, "AA") == "82%"
+    assert _cell(freqs, "KK").tolist() == [0, 0, 0] and _cell(texts, "KK") == "N/A"
+    diff = np.where(np.isnan(equity), np.nan, -0.25)
+    freqs, texts, mode = ra.compute_matrix_cells(action_counts={"diff": diff}, display_mode="diff")
+    assert mode == "diff" and _cell(texts, "AA") == "-25%" and _cell(freqs, "AA")[1] == 1
+
+
+def test_unknown_mode_draws_nothing():
+    freqs, texts, mode = ra.compute_matrix_cells(_grid(AA=1), {"raise": _grid(AA=1)}, "nonsense")
+    assert (mode, texts, freqs.any()) == ("count", [""] * ra.NUM_HAND_CLASSES, False)
+    assert ra.matrix_cell_bars(*freqs[0], mode) == []
+
+
+def test_bars_fill_each_cell_with_known_counts(history_dirs):
+    data, _ = ra.process_directory(history_dirs["pokerstars"], HERO_NAME)
+    for _, views in ra.iter_matrix_views(data, "Open"):
+        title, make_tab_args, _ = views[0]
+        freqs, _, mode = ra.compute_matrix_cells(**make_tab_args())
+        opportunities = make_tab_args()["opportunity_counts"]
+        widths = np.array([sum(fraction for fraction, _ in ra.matrix_cell_bars(*cell, mode)) for cell in freqs])
+        # 機会のあるセルはバーの合計が 1 以下 (行動の記録が無い分は背景)
+        assert (widths[opportunities > 0] <= 1 + 1e-9).all(), title
+        assert not widths[opportunities == 0].any(), title
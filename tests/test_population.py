@@ -0,0 +1,56 @@
+import pickle
+
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def population(history_dirs):
+    return ra.process_directory_population(history_dirs["pokerstars"])
+
+
+def test_hero_spots_match_the_hero_analysis(history_dirs, population):
+    store, _ = population
+    data, _ = ra.process_directory(history_dirs["pokerstars"], HERO_NAME)
+    assert np.array_equal(store.spot_counts(HERO_NAME), data.counts.sum(axis=-1))
+
+
+def test_shown_hands_are_counted_by_class(history_dirs, population):
+    store, _ = population
+    expected = ra.RangeMatrix()
+    for filepath in ra.list_hand_history_files(history_dirs["pokerstars"]):
+        for _, hand_bytes in ra.iter_located_hands(filepath):
+            record = ra.tokenize_hand(hand_bytes, HERO_NAME, collect_showdowns=True)
+            if HERO_NAME in record.shown_hand_classes:
+                assert record.shown_hand_classes[HERO_NAME] == record.hero_hand_class
+                ra.add_parsed_hand_to_aggregates(
+                    expected, {"hand": record.hero_hand_class, "spots": record.spot_actions(HERO_NAME)}, HERO_NAME)
+    assert expected.total_hands() > 0
+    assert store.shown_range_matrix(HERO_NAME) == expected
+
+
+def test_workers_and_merge_give_the_same_store(history_dirs, population):
+    history_dir = history_dirs["pokerstars"]
+    store, hand_count = population
+    assert ra.process_directory_population(history_dir, workers=2) == (store, hand_count)
+
+    merged = ra.PopulationStore()
+    for filepath in reversed(ra.list_hand_history_files(history_dir)):
+        partial, _ = ra.parse_file_population(filepath)
+        merged.merge(partial)
+    assert merged == store
+
+
+def test_serialization_and_ranking(population):
+    store, _ = population
+    assert ra.PopulationStore.from_bytes(store.to_bytes()) == store
+    assert pickle.loads(pickle.dumps(store)) == store
+    ranking = store.players_by_opportunities()
+    assert len(ranking) == len(store)
+    assert [total for _, total in ranking] == sorted((total for _, total in ranking), reverse=True)
+    assert store.spot_counts("Nobody").sum() == 0
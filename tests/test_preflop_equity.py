@@ -0,0 +1,129 @@
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+
+TABLE_BOARDS = 300 # 表の正確さではなく作り方を確かめるので少ないボードで作る
+
+
+@pytest.fixture(scope="module")
+def table():
+    return ra.PreflopEquityTable.build(boards=TABLE_BOARDS)
+
+
+def _class_weights(*names):
+    weights = np.zeros(ra.NUM_HAND_CLASSES)
+    for name in names:
+        weights[ra.HAND_CLASS_INDEX[name]] = 1
+    return weights
+
+
+def _brute_force_rank(cards):
+    # 7枚から作れる 5 枚の役をすべて比べる素朴な評価 (カード番号は CARD_NAMES の順)
+    best = None
+    for five in itertools.combinations(cards, 5):
+        values = sorted((12 - card // 4 for card in five), reverse=True) # A = 12, 2 = 0
+        counts = sorted(((values.count(v), v) for v in set(values)), reverse=True)
+        flush = len({card % 4 for card in five}) == 1
+        straight_top = None
+        if len(set(values)) == 5:
+            if values[0] - values[4] == 4:
+                straight_top = values[0]
+            elif values == [12, 3, 2, 1, 0]:
+                straight_top = 3 # A-5
+        shape = [count for count, _ in counts]
+        kickers = [v for _, v in counts]
+        if straight_top is not None and flush:
+            rank = (8, [straight_top])
+        elif shape == [4, 1]:
+            rank = (7, kickers)
+        elif shape == [3, 2]:
+            rank = (6, kickers)
+        elif flush:
+            rank = (5, values)
+        elif straight_top is not None:
+            rank = (4, [straight_top])
+        elif shape == [3, 1, 1]:
+            rank = (3, kickers)
+        elif shape == [2, 2, 1]:
+            rank = (2, kickers)
+        elif shape == [2, 1, 1, 1]:
+            rank = (1, kickers)
+        else:
+            rank = (0, values)
+        best = rank if best is None or rank > best else best
+    return best
+
+
+def _hand_bits(cards):
+    return int(ra.CARD_BITS[list(cards)].sum())
+
+
+def test_evaluator_orders_hands_like_brute_force():
+    rng = random.Random(0)
+    hands = [rng.sample(range(52), 7) for _ in range(600)]
+    # 役ごとの典型例も混ぜる (A-5 のストレート、ストレートフラッシュ、フルハウス同士など)
+    named = [["As", "2d", "3c", "4h", "5s", "Kd", "Kc"], ["2s", "3s", "4s", "5s", "6s", "Ah", "Ad"],
+             ["As", "2s", "3s", "4s", "5s", "Kh", "Qd"], ["Kh", "Kd", "Kc", "2s", "2d", "2h", "9c"],
+             ["2h", "2d", "2c", "Ks", "Kd", "Kh", "9c"], ["Ah", "Ad", "Ac", "As", "Kh", "Kd", "Kc"],
+             ["6h", "7d", "8c", "9s", "Th", "Jd", "Ac"], ["Ah", "Kh", "Qh", "Jh", "9h", "8h", "2d"]]
+    hands += [[ra.CARD_NAMES.index(card) for card in hand] for hand in named]
+    scores = ra.evaluate_hands(np.array([_hand_bits(hand) for hand in hands], dtype=np.int64))
+    ranks = [_brute_force_rank(hand) for hand in hands]
+    for i, j in zip(range(len(hands)), itertools.chain(range(1, len(hands)), [0])):
+        assert (scores[i] > scores[j]) == (ranks[i] > ranks[j])
+        assert (scores[i] == scores[j]) == (ranks[i] == ranks[j])
+    assert scores.shape == (len(hands),)
+    assert ra.evaluate_hands(np.array([[_hand_bits(hands[0])]])).shape == (1, 1) # 形はそのまま
+
+
+def test_table_is_zero_sum(table):
+    compatible = table.compatible.astype(bool)
+    assert np.allclose((table.equity + table.equity.T)[compatible], 1, atol=1e-5)
+    assert not table.equity[~compatible].any()
+    assert table.equity.shape == (ra.NUM_COMBOS, ra.NUM_COMBOS)
+
+
+def test_known_matchups(table):
+    assert table.range_vs_range(_class_weights("AA"), _class_weights("KK"))[0] == pytest.approx(0.82, abs=0.03)
+    assert table.range_vs_range(_class_weights("AKo"), _class_weights("QQ"))[0] == pytest.approx(0.43, abs=0.03)
+    everything = np.ones(ra.NUM_HAND_CLASSES)
+    assert table.range_vs_range(everything, everything)[0] == pytest.approx(0.5, abs=1e-5)
+
+
+def test_range_vs_range_weights(table):
+    hero, villain = _class_weights("AA", "AKs"), _class_weights("KK", "AKo")
+    range_equity, class_equity = table.range_vs_range(hero, villain)
+    assert table.range_vs_range(ra._combo_weights(hero), ra._combo_weights(villain))[0] == \
+        pytest.approx(range_equity)
+    assert class_equity.shape == (ra.NUM_HAND_CLASSES,)
+    assert class_equity[ra.HAND_CLASS_INDEX["AA"]] > range_equity > class_equity[ra.HAND_CLASS_INDEX["AKs"]]
+    # AA 対 AA だけならカードが重ならない組み合わせしか数えない
+    assert table.range_vs_range(_class_weights("AA"), _class_weights("AA"))[0] == pytest.approx(0.5, abs=1e-5)
+    empty_equity, empty_classes = table.range_vs_range(hero, np.zeros(ra.NUM_HAND_CLASSES))
+    assert np.isnan(empty_equity) and np.isnan(empty_classes).all()
+
+
+def test_combo_weights_shapes():
+    assert ra._combo_weights(_class_weights("AA")).sum() == 6
+    assert ra._combo_weights(_class_weights("AKo")).sum() == 12
+    assert ra.COMBO_CLASS_BY_INDEX.shape == (ra.NUM_COMBOS,)
+    assert np.bincount(ra.COMBO_CLASS_BY_INDEX).sum() == 1326
+    with pytest.raises(ValueError):
+        ra._combo_weights(np.ones(13))
+    with pytest.raises(ValueError):
+        ra.PreflopEquityTable(np.zeros((169, 169)))
+
+
+def test_build_is_deterministic_across_workers(monkeypatch, tmp_path, table):
+    monkeypatch.setattr(ra, "EQUITY_TABLE_CHUNK_BOARDS", TABLE_BOARDS // 2)
+    split = ra.PreflopEquityTable.build(workers=2, boards=TABLE_BOARDS)
+    assert np.array_equal(split.equity, ra.PreflopEquityTable.build(workers=1, boards=TABLE_BOARDS).equity)
+    path = str(tmp_path / "equity" / "table.npy")
+    table.save(path)
+    assert np.array_equal(ra.PreflopEquityTable.load(path).equity, table.equity)
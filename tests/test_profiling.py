@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+
+def test_profiled_parse_gives_the_same_result(history_dirs):
+    filepath = ra.list_hand_history_files(history_dirs["zoom"])[0]
+    *result, profile = ra.parse_file_aggregates_profiled(filepath, HERO_NAME, None, ("rows",))
+    assert tuple(result) == ra.parse_file_aggregates(filepath, HERO_NAME, None, ("rows",))
+    hand_count = sum(1 for _ in ra.iter_located_hands(filepath))
+    assert profile.calls["tokenize"] == profile.calls["classify"] == hand_count
+    assert {"read", "split", "positions", "aggregate", "total", "utils_judge.extract_preflop_actions"} <= set(
+        profile.seconds)
+    assert profile.seconds["total"] >= profile.seconds["tokenize"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_profiled_pipeline_collects_every_worker(history_dirs, workers):
+    history_dir = history_dirs["pokerstars"]
+    profile = ra.StageProfile()
+    assert ra.process_directory(history_dir, HERO_NAME, workers, profile=profile) == \
+        ra.process_directory(history_dir, HERO_NAME)
+    assert profile.calls["total"] == len(ra.list_hand_history_files(history_dir))
+    assert profile.calls["tokenize"] == sum(1 for path in ra.list_hand_history_files(history_dir)
+                                            for _ in ra.iter_located_hands(path))
+
+
+def test_stage_profile_totals(tmp_path):
+    profile = ra.StageProfile()
+    profile.add("split", 0.5)
+    profile.add("tokenize", 2.0, calls=10)
+    other = ra.StageProfile()
+    other.add("tokenize", 1.0, calls=5)
+    profile.merge(other)
+    assert profile.summary_line() == "tokenize 3.00s, split 0.50s"
+    assert profile.to_dict() == {"tokenize": {"seconds": 3.0, "calls": 15}, "split": {"seconds": 0.5, "calls": 1}}
+    path = tmp_path / "profile.json"
+    profile.dump_json(str(path), workers=4)
+    assert json.loads(path.read_text()) == {"workers": 4, "stages": profile.to_dict()}
+
+
+def test_unprofiled_calls_are_not_timed():
+    assert ra._call_timed(None, "stage", max, 1, 2) == 2
+    profile = ra.StageProfile()
+    with pytest.raises(ZeroDivisionError):
+        ra._call_timed(profile, "fails", lambda: 1 / 0)
+    assert profile.calls == {"fails": 1} # 例外でも時間は残す
+
+
+def test_cli_writes_the_profile(tmp_path, history_dirs):
+    path = tmp_path / "profile.json"
+    assert ra.main([history_dirs["heads_up"], "--hero", HERO_NAME, "--output-dir", str(tmp_path),
+                    "--no-cache", "--no-dedup", "--workers", "1", "--profile-json", str(path)]) == 0
+    profile = json.loads(path.read_text())
+    assert profile["directories"] == [history_dirs["heads_up"]]
+    assert profile["stages"]["total"]["calls"] == len(ra.list_hand_history_files(history_dirs["heads_up"]))
@@ -0,0 +1,76 @@
+import pickle
+
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+
+AKS = ra.HAND_CLASS_INDEX["AKs"]
+SEVEN_TWO = ra.HAND_CLASS_INDEX["72o"]
+
+
+@pytest.fixture
+def matrix():
+    data = ra.RangeMatrix()
+    for action in ("raise", "raise", "fold", None):
+        data.add("open", "BTN", None, "opportunity", AKS)
+        if action:
+            data.add("open", "BTN", None, action, AKS)
+    data.add("threebet", "BB", "BTN", "opportunity", SEVEN_TWO, n=3)
+    data.add("threebet", "BB", "BTN", "fold", SEVEN_TWO, n=3)
+    return data
+
+
+def test_grid_and_totals(matrix):
+    assert matrix.grid("open", "BTN", action="raise")[AKS] == 2
+    assert matrix.grid("open", "BTN")[AKS] == 4
+    assert matrix.total_hands() == 7
+    assert matrix.has_data("threebet", "BB", "BTN") and not matrix.has_data("threebet", "BB")
+    assert matrix.vs_positions_with_opportunities("threebet", "BB") == ["BTN"]
+
+
+def test_frequencies_and_range_weights(matrix):
+    frequencies = matrix.frequencies()
+    open_btn = frequencies[ra.SPOT_KIND_INDEX["open"], ra.POSITION_INDEX["BTN"], ra.VS_NONE]
+    assert open_btn[:, AKS].tolist() == [0.5, 0.0, 0.25]
+    assert not open_btn[:, SEVEN_TWO].any() # 機会の無いセルは 0
+    weights = matrix.range_weights("open", "BTN", actions=("raise", "fold"))
+    assert weights[AKS] == 0.75 and weights.sum() == 0.75
+
+
+def test_merge_is_array_addition(matrix):
+    doubled = matrix + matrix
+    assert np.array_equal(doubled.counts, matrix.counts * 2)
+    assert matrix.merge(matrix) == doubled
+
+
+def test_serialization_round_trips(matrix):
+    assert ra.RangeMatrix.from_bytes(matrix.to_bytes()) == matrix
+    assert pickle.loads(pickle.dumps(matrix)) == matrix
+    with pytest.raises(ValueError):
+        ra.RangeMatrix.from_bytes(b"XXX" + matrix.to_bytes()[3:])
+    with pytest.raises(ValueError):
+        ra.RangeMatrix(np.zeros((3, 6), dtype=np.int32))
+
+
+def test_cells_for_frequency_and_count_modes(matrix):
+    spot = ("open", "BTN", None)
+    freqs, texts, mode = ra.compute_matrix_cells(
+        matrix.grid(*spot), {key: matrix.grid(*spot, action) for key, action in
+                             (("raise", "raise"), ("limp", "call"), ("fold", "fold"))}, "open_freq")
+    assert mode == "open_freq"
+    assert freqs[AKS].tolist() == [0.5, 0.0, 0.25]
+    assert texts[AKS] == "R:50%\nL:0%\nF:25%"
+    assert texts[SEVEN_TWO] == "N/A"
+
+    _, texts, _ = ra.compute_matrix_cells(None, {"main": matrix.grid(*spot)}, "count")
+    assert texts[AKS] == "4" and texts[SEVEN_TWO] == "0"
+
+
+def test_actions_without_opportunity_are_flagged():
+    actions = np.zeros(ra.NUM_HAND_CLASSES, dtype=np.int64)
+    actions[AKS] = 1
+    freqs, texts, _ = ra.compute_matrix_cells(np.zeros(ra.NUM_HAND_CLASSES), {"raise": actions}, "single_freq")
+    assert texts[AKS] == "Err" and freqs[AKS].tolist() == [1.0, 0.0, 0.0]
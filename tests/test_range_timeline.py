@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+DAY_1 = 1672531200 # 2023/01/01 00:00:00
+
+
+@pytest.fixture(scope="module")
+def hand_store(mixed_history_dir):
+    hand_store = ra.HandStore()
+    ra.process_directory(mixed_history_dir, HERO_NAME, hand_store=hand_store)
+    return hand_store
+
+
+def _stamped_store(timestamps):
+    # スポットの無いハンドを1行ずつ、指定した時刻で
+    rows = np.zeros(len(timestamps), dtype=ra.HAND_ROW_DTYPE)
+    rows["timestamp"] = timestamps
+    rows["kind"] = ra.HAND_ROW_NO_SPOT
+    rows["hand_start"] = 1
+    return ra.HandStore(rows)
+
+
+def _window_mask(hand_store, timeline, first, last, mask=None):
+    until = timeline.bucket_starts[last + 1] if last + 1 < len(timeline) else None
+    window = hand_store.mask(since=timeline.bucket_starts[first], until=until)
+    return window if mask is None else window & mask
+
+
+@pytest.mark.parametrize("bucket", ["day", "session"])
+def test_every_window_equals_a_mask(hand_store, bucket):
+    timeline = ra.RangeTimeline.from_hand_store(hand_store, bucket)
+    assert len(timeline) >= 3
+    for first in range(len(timeline)):
+        for last in range(first, len(timeline)):
+            mask = _window_mask(hand_store, timeline, first, last)
+            assert timeline.window(first, last) == hand_store.range_matrix(mask)
+            assert timeline.hand_count(first, last) == hand_store.hand_count(mask)
+    assert timeline.window(0, len(timeline) - 1) == hand_store.range_matrix()
+    assert timeline.hand_count(0, len(timeline) - 1) == hand_store.hand_count()
+
+
+def test_windows_of_a_filtered_store(hand_store):
+    mask = hand_store.mask(positions=["BB"], table_sizes=[6])
+    timeline = ra.RangeTimeline.from_hand_store(hand_store, "day", mask)
+    for first, last in ((0, 0), (1, 2), (0, 2)):
+        window = _window_mask(hand_store, timeline, first, last, mask)
+        assert timeline.window(first, last) == hand_store.range_matrix(window)
+        assert timeline.hand_count(first, last) == hand_store.hand_count(window)
+
+
+def test_day_buckets(hand_store):
+    assert hand_store.time_buckets("day").tolist() == [DAY_1, DAY_1 + ra.SECONDS_PER_DAY,
+                                                       DAY_1 + 3 * ra.SECONDS_PER_DAY]
+    timeline = ra.RangeTimeline.from_hand_store(hand_store)
+    assert timeline.bucket_at(0) == 0
+    assert timeline.bucket_at(DAY_1 + 2 * ra.SECONDS_PER_DAY) == 1 # ハンドの無い日は前の期間に入る
+    assert timeline.bucket_at(DAY_1 + 10 * ra.SECONDS_PER_DAY) == 2
+
+
+def test_sessions_split_on_gaps():
+    gap = ra.SESSION_GAP_SECONDS
+    hand_store = _stamped_store([DAY_1 + 60, DAY_1, 0, DAY_1 + 60 + gap, DAY_1 + 120 + 2 * gap + 1])
+    assert hand_store.time_buckets("session").tolist() == [DAY_1, DAY_1 + 120 + 2 * gap + 1]
+    assert hand_store.time_buckets("day").tolist() == [DAY_1]
+    timeline = ra.RangeTimeline.from_hand_store(hand_store, "session")
+    assert [timeline.hand_count(0, 0), timeline.hand_count(1, 1)] == [3, 1] # 時刻の無いハンドはどこにも入らない
+    with pytest.raises(ValueError):
+        hand_store.time_buckets("week")
+
+
+@pytest.mark.parametrize("first, last", [(-1, 0), (1, 0), (0, 3)])
+def test_windows_outside_the_buckets(hand_store, first, last):
+    timeline = ra.RangeTimeline.from_hand_store(hand_store)
+    with pytest.raises(ValueError):
+        timeline.window(first, last)
+    with pytest.raises(ValueError):
+        timeline.hand_count(first, last)
+
+
+def test_empty_store_has_no_buckets():
+    timeline = ra.RangeTimeline.from_hand_store(_stamped_store([0, 0]), "session")
+    assert len(timeline) == 0
+    with pytest.raises(ValueError):
+        timeline.window(0, 0)
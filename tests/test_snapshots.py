@@ -0,0 +1,80 @@
+import itertools
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("utils_judge")
+
+import range_analyzer as ra  # noqa: E402
+from conftest import HERO_NAME  # noqa: E402
+
+
+@pytest.fixture
+def shards(tmp_path, history_dirs):
+    """One snapshot per file of the generated PokerStars histories, as if analyzed on separate machines."""
+    snapshots = []
+    for i, filepath in enumerate(ra.list_hand_history_files(history_dirs["pokerstars"])):
+        shard_dir = tmp_path / f"shard{i}"
+        shard_dir.mkdir()
+        shutil.copy(filepath, shard_dir)
+        data, hand_count = ra.process_directory(str(shard_dir), HERO_NAME)
+        snapshots.append(ra.RangeSnapshot(data, hand_count, 1, [HERO_NAME], [str(shard_dir)]))
+    return snapshots
+
+
+def test_snapshot_round_trips(tmp_path, shards):
+    path = str(tmp_path / "a.prs")
+    shards[0].save(path)
+    assert ra.RangeSnapshot.load(path) == shards[0]
+    assert not os.path.exists(path + ".tmp")
+    bare = ra.RangeSnapshot.from_bytes(shards[0].matrix.to_bytes()) # メタデータの無い RangeMatrix
+    assert bare.matrix == shards[0].matrix and bare.hand_count == 0
+    with pytest.raises(ValueError):
+        ra.RangeSnapshot.from_bytes(b"XYZ" + shards[0].to_bytes()[3:])
+
+
+def test_merge_is_associative_and_commutative(history_dirs, shards):
+    a, b, c = shards
+    before = [shard.to_bytes() for shard in shards]
+    merged = ra.merge_snapshots(shards)
+    assert (a + b) + c == a + (b + c) == merged
+    assert all(ra.merge_snapshots(order) == merged for order in itertools.permutations(shards))
+    data, hand_count = ra.process_directory(history_dirs["pokerstars"], HERO_NAME)
+    assert (merged.matrix, merged.hand_count, merged.file_count) == (data, hand_count, 3)
+    assert merged.sources == {s for shard in shards for s in shard.sources}
+    assert [shard.to_bytes() for shard in shards] == before # + は元のスナップショットを変えない
+
+
+def test_cli_merges_snapshot_files(tmp_path, shards, capsys):
+    paths = []
+    for i, shard in enumerate(shards):
+        paths.append(str(tmp_path / f"{i}.prs"))
+        shard.save(paths[-1])
+    out = str(tmp_path / "merged.prs")
+    assert ra.main(paths + ["--merge", out]) == 0
+    assert ra.RangeSnapshot.load(out) == ra.merge_snapshots(shards)
+    assert capsys.readouterr().out.split("\t")[1:3] == ["3 snapshots", f"{ra.RangeSnapshot.load(out).hand_count} hands"]
+
+    (tmp_path / "bad.prs").write_bytes(b"nope")
+    assert ra.main([paths[0], str(tmp_path / "bad.prs"), "--merge", out]) == 1
+
+
+def test_truncated_snapshots_raise_value_error(tmp_path, shards):
+    blob = shards[0].to_bytes()
+    metadata_end = 8 + int.from_bytes(blob[4:8], "little")
+    for cut in (0, 3, 4, 6, 8, metadata_end - 1, metadata_end, metadata_end + 4, metadata_end + 20, len(blob) - 1):
+        with pytest.raises(ValueError):
+            ra.RangeSnapshot.from_bytes(blob[:cut])
+    with pytest.raises(ValueError):
+        ra.RangeSnapshot.from_bytes(shards[0].matrix.to_bytes()[:-5])
+    for metadata in (b"[1, 2]", b"{}"): # 辞書でない・項目の足りないメタデータ
+        with pytest.raises(ValueError):
+            ra.RangeSnapshot.from_bytes(blob[:4] + len(metadata).to_bytes(4, "little") + metadata + blob[metadata_end:])
+
+    # --merge は途中までしかコピーされていないシャードでもトレースバックを出さずに失敗する
+    path = tmp_path / "partial.prs"
+    path.write_bytes(blob[:metadata_end + 20])
+    good = str(tmp_path / "good.prs")
+    shards[1].save(good)
+    assert ra.main([good, str(path), "--merge", str(tmp_path / "merged.prs")]) == 1
@@ -0,0 +1,126 @@
+# タブの遅延作成と LRU キャッシュの管理 (画面の無い環境でも動くように Tk の部品を差し替える)
+import itertools
+from collections import OrderedDict
+
+import pytest
+
+pytest.importorskip("utils_judge")
+pytest.importorskip("tkinter")
+
+import gui_analyzer  # noqa: E402
+
+
+class FakeFrame:
+    _ids = itertools.count()
+
+    def __init__(self, parent=None, **options):
+        self.name = f".!notebook.!frame{next(self._ids)}"
+        self.destroyed = False
+
+    def __str__(self):
+        return self.name
+
+    def winfo_children(self):
+        return []
+
+    def destroy(self):
+        self.destroyed = True
+
+
+class FakeNotebook:
+    def __init__(self):
+        self.shown = []
+        self.selected = ""
+
+    def add(self, tab, text=""):
+        self.shown.append(str(tab))
+
+    def tabs(self):
+        return tuple(self.shown)
+
+    def select(self):
+        return self.selected
+
+
+class FakeCanvas:
+    def bind(self, sequence, callback):
+        pass
+
+
+@pytest.fixture
+def gui(monkeypatch):
+    monkeypatch.setattr(gui_analyzer, "ttk", type("ttk", (), {"Frame": FakeFrame}))
+    gui = gui_analyzer.PokerRangeGUI.__new__(gui_analyzer.PokerRangeGUI)
+    gui.notebook = FakeNotebook()
+    gui._tab_specs = {}
+    gui._tab_cache = OrderedDict()
+    gui._data_version = 0
+    gui._current_filter_key = ("3bet", "ALL")
+    gui._render_profile = None
+    frames = {}
+    gui.master = type("Master", (), {"nametowidget": staticmethod(frames.__getitem__)})()
+    gui.built = [] # _fill_matrix_frame に渡されたタブの引数
+    gui._fill_matrix_frame = lambda frame, **kwargs: gui.built.append(kwargs["title"]) or FakeCanvas()
+
+    def add_tab(title):
+        tab = gui._add_matrix_tab(title, lambda: {"title": title})
+        frames[str(tab)] = tab
+        return tab
+    gui.add_tab = add_tab
+    return gui
+
+
+def _select(gui, tab):
+    gui.notebook.selected = str(tab)
+    gui._on_tab_changed(None)
+
+
+def test_tabs_are_built_when_first_selected(gui):
+    tabs = [gui.add_tab(title) for title in ("UTG", "HJ", "CO")]
+    assert gui.built == []
+    _select(gui, tabs[1])
+    assert gui.built == ["HJ"]
+    _select(gui, tabs[0])
+    _select(gui, tabs[1]) # 作成済みのタブは作り直さない
+    assert gui.built == ["HJ", "UTG"]
+
+
+def test_built_tabs_are_rebuilt_after_the_data_changes(gui):
+    tabs = [gui.add_tab(title) for title in ("UTG", "HJ")]
+    _select(gui, tabs[0])
+    _select(gui, tabs[1])
+    gui.refresh_visible_tab() # 表示中のタブだけをすぐに作り直す
+    assert gui.built == ["UTG", "HJ", "HJ"]
+    _select(gui, tabs[0])
+    _select(gui, tabs[0])
+    assert gui.built == ["UTG", "HJ", "HJ", "UTG"]
+    assert {spec["built_version"] for spec in gui._tab_specs.values()} == {gui._data_version}
+
+
+def test_cached_tabs_are_reused_and_evicted_least_recently_used_first(gui, monkeypatch):
+    monkeypatch.setattr(gui_analyzer, "MAX_CACHED_TABS", 3)
+    first = {}
+    for position in ("UTG", "HJ", "CO"):
+        gui._current_filter_key = ("3bet", position)
+        gui.notebook.shown = []
+        first[position] = gui.add_tab("vs ALL")
+    gui._current_filter_key = ("3bet", "UTG")
+    assert gui.add_tab("vs ALL") is first["UTG"] # 同じフィルタに戻ると同じタブを使う
+    assert len(gui._tab_cache) == 3
+
+    gui._current_filter_key = ("3bet", "BTN")
+    gui.notebook.shown = []
+    shown = gui.add_tab("vs ALL")
+    gui._evict_cached_tabs()
+    assert first["HJ"].destroyed # 最も長く使われていないタブ
+    assert str(first["HJ"]) not in gui._tab_specs
+    assert not any(tab.destroyed for tab in (first["CO"], first["UTG"], shown))
+    assert list(gui._tab_cache) == [("3bet", "CO", "vs ALL"), ("3bet", "UTG", "vs ALL"), ("3bet", "BTN", "vs ALL")]
+
+
+def test_shown_tabs_are_never_evicted(gui, monkeypatch):
+    monkeypatch.setattr(gui_analyzer, "MAX_CACHED_TABS", 1)
+    tabs = [gui.add_tab(title) for title in ("UTG", "HJ", "CO")]
+    gui._evict_cached_tabs()
+    assert not any(tab.destroyed for tab in tabs)
+    assert len(gui._tab_cache) == 3